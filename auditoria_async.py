@@ -0,0 +1,169 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+from cache_veredictos import nome_do_modelo
+from rastreamento import etapa, registrar_uso
+
+# --- MOTOR DE AUDITORIA ASSÍNCRONO ---
+# Roda a checagem de regras e a de fraude de várias transações ao mesmo tempo,
+# devolvendo cada resultado assim que ele fica pronto (ordem de conclusão). Uma transação
+# que falha (erro da LLM, LLMIndisponivel, documento malformado) vira um resultado com
+# `erro` e a varredura continua; só AuditoriaCancelada interrompe tudo.
+
+CONCORRENCIA_PADRAO = 8
+
+
+@dataclass
+class Verificacao:
+    prompt: object   # ChatPromptTemplate
+    entrada: dict
+    ids_contexto: tuple = ()   # IDs dos chunks recuperados (chave do cache de vereditos)
+
+
+@dataclass
+class ResultadoAuditoria:
+    linha: object    # pd.Series da transação
+    regras: str
+    fraude: str
+    erro: str = None   # Preenchido quando a transação não pôde ser analisada
+
+
+class AuditoriaCancelada(Exception):
+    pass
+
+
+def resultado_com_erro(linha, erro):
+    texto = f"ERRO: {type(erro).__name__}: {erro}"
+    return ResultadoAuditoria(linha=linha, regras=texto, fraude=texto, erro=texto)
+
+
+class LimitadorTaxa:
+    # Token bucket: enche `taxa_por_segundo` fichas por segundo até `capacidade`.
+    # Substitui o time.sleep fixo entre linhas por um limite real de requisições.
+    def __init__(self, taxa_por_segundo, capacidade=None):
+        self.taxa = float(taxa_por_segundo)
+        self.capacidade = float(capacidade or max(1.0, self.taxa))
+        self._fichas = self.capacidade
+        self._ultimo = time.monotonic()
+        self._trava = None
+
+    async def adquirir(self, fichas=1):
+        fichas = min(fichas, self.capacidade)
+        if self._trava is None:
+            self._trava = asyncio.Lock()
+        async with self._trava:
+            while True:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._fichas >= fichas:
+                    self._fichas -= fichas
+                    return
+                await asyncio.sleep((fichas - self._fichas) / self.taxa)
+
+
+class _Falha:
+    def __init__(self, erro):
+        self.erro = erro
+
+
+_FIM = object()
+
+
+async def processar_em_paralelo(itens, funcao, concorrencia=CONCORRENCIA_PADRAO, ao_falhar=None):
+    # Um pool fixo de trabalhadores consome `itens` (iterável preguiçoso): memória constante
+    # mesmo com CSVs grandes. Os resultados de `await funcao(item)` saem na ordem de conclusão.
+    # Se `funcao` falha, sai `ao_falhar(item, erro)` no lugar e o trabalhador segue; sem
+    # `ao_falhar` (ou com AuditoriaCancelada) o erro encerra tudo.
+    itens = iter(itens)
+    fila = asyncio.Queue()
+
+    async def trabalhador():
+        try:
+            for item in itens:
+                try:
+                    resultado = await funcao(item)
+                except AuditoriaCancelada:
+                    raise
+                except Exception as e:
+                    if ao_falhar is None:
+                        raise
+                    resultado = ao_falhar(item, e)
+                await fila.put(resultado)
+        except Exception as e:
+            await fila.put(_Falha(e))
+        finally:
+            await fila.put(_FIM)
+
+    tarefas = [asyncio.create_task(trabalhador()) for _ in range(max(1, concorrencia))]
+    ativos = len(tarefas)
+    try:
+        while ativos:
+            item = await fila.get()
+            if item is _FIM:
+                ativos -= 1
+            elif isinstance(item, _Falha):
+                raise item.erro
+            else:
+                yield item
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+
+
+async def invocar_verificacao(verificacao, llm, limitador=None, cache=None):
+    chave = None
+    if cache:
+        with etapa("cache_veredictos"):
+            chave = cache.chave(verificacao.prompt, verificacao.entrada, verificacao.ids_contexto, nome_do_modelo(llm))
+            resposta = cache.obter(chave)
+        if resposta is not None:
+            return resposta
+    if limitador:
+        with etapa("espera_limite_taxa"):
+            await limitador.adquirir()
+    # Equivale a (prompt | llm).ainvoke(entrada), com a renderização medida à parte
+    with etapa("prompt"):
+        mensagens = verificacao.prompt.invoke(verificacao.entrada)
+    with etapa("llm") as atributos:
+        mensagem = await llm.ainvoke(mensagens)
+        atributos.update(registrar_uso(mensagem))
+    resposta = mensagem.content
+    if cache:
+        cache.guardar(chave, resposta)
+    return resposta
+
+
+async def _auditar_linha(linha, llm, preparar, limitador, cache):
+    # A busca vetorial é bloqueante (Chroma + embeddings na CPU), então vai para uma thread
+    verif_regras, verif_fraude = await asyncio.to_thread(preparar, linha)
+    res_regras, res_fraude = await asyncio.gather(
+        invocar_verificacao(verif_regras, llm, limitador, cache),
+        invocar_verificacao(verif_fraude, llm, limitador, cache),
+    )
+    return ResultadoAuditoria(linha=linha, regras=res_regras, fraude=res_fraude)
+
+
+async def auditar_transacoes(df, llm, preparar, concorrencia=CONCORRENCIA_PADRAO, limitador=None, cache=None):
+    # `preparar(linha)` monta as duas Verificacoes (regras e fraude) de uma transação.
+    linhas = (linha for _, linha in df.iterrows())
+
+    async def auditar(linha):
+        return await _auditar_linha(linha, llm, preparar, limitador, cache)
+
+    async for resultado in processar_em_paralelo(linhas, auditar, concorrencia, ao_falhar=resultado_com_erro):
+        yield resultado
+
+
+def rodar_auditoria(df, llm, preparar, ao_concluir, concorrencia=CONCORRENCIA_PADRAO, requisicoes_por_segundo=None,
+                    cache=None):
+    # Ponte síncrona para os scripts (CLI e Streamlit): chama `ao_concluir(resultado)`
+    # para cada transação à medida que termina.
+    async def consumir():
+        limitador = LimitadorTaxa(requisicoes_por_segundo) if requisicoes_por_segundo else None
+        async for resultado in auditar_transacoes(df, llm, preparar, concorrencia, limitador, cache):
+            ao_concluir(resultado)
+
+    asyncio.run(consumir())
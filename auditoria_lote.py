@@ -0,0 +1,252 @@
+import asyncio
+import json
+from dataclasses import dataclass
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from auditoria_async import (
+    CONCORRENCIA_PADRAO,
+    LimitadorTaxa,
+    ResultadoAuditoria,
+    Verificacao,
+    invocar_verificacao,
+    processar_em_paralelo,
+    resultado_com_erro,
+)
+from cache_veredictos import ids_dos_documentos, nome_do_modelo
+from rastreamento import etapa
+
+# --- AUDITORIA EM LOTE ---
+# Uma única chamada à LLM julga várias transações que compartilham o mesmo contexto
+# recuperado: mesma `categoria` para as regras, mesmo `funcionario` para os e-mails.
+# A resposta vem como uma linha JSON por transação; cada linha é validada sozinha e as
+# transações sem veredito válido (linha ausente, malformada ou repetida) voltam para o prompt unitário (uma chamada por linha), só com os
+# documentos da própria linha (metadata["transacoes"], quando o contexto informa).
+
+TAMANHO_LOTE_PADRAO = 15
+
+PROMPT_REGRAS_LOTE = ChatPromptTemplate.from_template("""
+    Você é um auditor financeiro rigoroso da Dunder Mifflin.
+    Analise CADA transação abaixo comparando com as regras da empresa.
+
+    Transações:
+    {transacoes}
+
+    Regras da Empresa (Contexto): {context}
+
+    Instrução:
+    - Se o valor for muito alto para a categoria, REPROVE.
+    - Se a categoria for suspeita (ex: entretenimento excessivo, itens pessoais), REPROVE.
+    - Se estiver tudo ok, diga APROVADO.
+
+    Responda APENAS com uma linha JSON por transação, sem nenhum outro texto:
+    {{"id_transacao": "<ID>", "status": "APROVADO ou REPROVADO", "motivo": "<breve explicação>"}}
+    """)
+
+PROMPT_FRAUDE_LOTE = ChatPromptTemplate.from_template("""
+    Você é um detetive investigando fraudes.
+    Verifique se há e-mails suspeitos que mencionem CADA transação abaixo ou este funcionário planejando algo errado.
+
+    Transações:
+    {transacoes}
+
+    E-mails Encontrados (Contexto): {context}
+
+    Instrução:
+    - Procure por menções diretas ao item comprado, "esquemas", "ajustes", "números mágicos" ou combinações de reembolso.
+    - Se achar evidência de má fé, marque como ALTA SUSPEITA.
+
+    Responda APENAS com uma linha JSON por transação, sem nenhum outro texto:
+    {{"id_transacao": "<ID>", "risco": "BAIXO ou ALTO", "evidencia": "<cite o e-mail ou diga Nenhuma>"}}
+    """)
+
+
+@dataclass
+class Checagem:
+    atributo: str          # campo de ResultadoAuditoria preenchido ("regras" ou "fraude")
+    agrupar_por: str       # coluna que define o contexto compartilhado
+    prompt_lote: object
+    campo: str
+    valores: tuple
+    campo_texto: str
+    formato: str           # mesmo formato da resposta do prompt unitário
+
+
+CHECAGEM_REGRAS = Checagem(
+    "regras", "categoria", PROMPT_REGRAS_LOTE,
+    "status", ("APROVADO", "REPROVADO"), "motivo", "STATUS: {}\nMOTIVO: {}",
+)
+CHECAGEM_FRAUDE = Checagem(
+    "fraude", "funcionario", PROMPT_FRAUDE_LOTE,
+    "risco", ("BAIXO", "ALTO"), "evidencia", "RISCO: {}\nEVIDÊNCIA: {}",
+)
+
+
+def _interpretar_linha(linha, ids, checagem):
+    # Validação estrita de uma linha: objeto JSON com exatamente as chaves esperadas,
+    # um ID do lote e um valor permitido. -> (id, veredito) ou ValueError
+    chaves = {"id_transacao", checagem.campo, checagem.campo_texto}
+    item = json.loads(linha)
+    if not isinstance(item, dict) or set(item) != chaves:
+        raise ValueError(f"Linha fora do formato: {linha}")
+    id_transacao = str(item["id_transacao"]).strip()
+    valor = str(item[checagem.campo]).strip().upper()
+    if id_transacao not in ids:
+        raise ValueError(f"ID inesperado: {id_transacao}")
+    if valor not in checagem.valores:
+        raise ValueError(f"Valor inválido para {checagem.campo}: {valor}")
+    return id_transacao, checagem.formato.format(valor, str(item[checagem.campo_texto]).strip())
+
+
+def interpretar_lote(texto, ids, checagem):
+    # Aproveita toda linha válida; linhas inválidas são ignoradas e um ID que aparece
+    # mais de uma vez fica sem veredito (não dá para saber qual vale). Quem não sair
+    # daqui vai para o fallback unitário.
+    vereditos, repetidos = {}, set()
+    for linha in texto.strip().splitlines():
+        linha = linha.strip()
+        if not linha or linha.startswith("```"):
+            continue
+        try:
+            id_transacao, veredito = _interpretar_linha(linha, ids, checagem)
+        except ValueError:   # json.JSONDecodeError também é ValueError
+            continue
+        if id_transacao in vereditos or id_transacao in repetidos:
+            vereditos.pop(id_transacao, None)
+            repetidos.add(id_transacao)
+            continue
+        vereditos[id_transacao] = veredito
+    return vereditos
+
+
+def _fatiar(itens, tamanho):
+    for i in range(0, len(itens), tamanho):
+        yield itens[i:i + tamanho]
+
+
+def _rotular(docs):
+    # "[T0012, T0015] texto": a LLM do lote sabe a qual transação cada evidência pertence
+    return "\n".join(
+        f"[{', '.join(d.metadata['transacoes'])}] {d.page_content}" if "transacoes" in d.metadata else d.page_content
+        for d in docs
+    )
+
+
+def _docs_da_linha(docs, id_transacao):
+    # Documentos sem dono (ex: regras da categoria) valem para todas as linhas
+    return [d for d in docs if id_transacao in d.metadata.get("transacoes", (id_transacao,))]
+
+
+async def _julgar_lote(checagem, linhas, docs, prompt_unitario, descrever, llm, limitador, cache):
+    contexto = _rotular(docs)
+    descricoes = {str(l["id_transacao"]): descrever(l) for l in linhas}
+    docs_linha = {i: _docs_da_linha(docs, i) for i in descricoes}
+    respostas = {}
+
+    # Cada transação tem sua própria chave no cache, só com a evidência dela: mudar os
+    # vizinhos de lote (outro orçamento, job retomado) não invalida o veredito
+    chaves = {}
+    if cache:
+        modelo = nome_do_modelo(llm)
+        for id_transacao, descricao in descricoes.items():
+            chaves[id_transacao] = cache.chave(
+                checagem.prompt_lote,
+                {"transacao": descricao, "context": "\n".join(d.page_content for d in docs_linha[id_transacao])},
+                ids_dos_documentos(docs_linha[id_transacao]), modelo,
+            )
+            resposta = cache.obter(chaves[id_transacao])
+            if resposta is not None:
+                respostas[id_transacao] = resposta
+    pendentes = {i: d for i, d in descricoes.items() if i not in respostas}
+
+    if pendentes:
+        entrada = {
+            "transacoes": "\n".join(f"- {d}" for d in pendentes.values()),
+            "context": contexto,
+        }
+        texto = await invocar_verificacao(Verificacao(checagem.prompt_lote, entrada), llm, limitador)
+        with etapa("interpretacao"):
+            vereditos = interpretar_lote(texto, pendentes, checagem)
+
+        # Fallback: quem ficou sem veredito válido é julgado individualmente
+        faltando = [id_transacao for id_transacao in pendentes if id_transacao not in vereditos]
+        unitarias = await asyncio.gather(*(
+            invocar_verificacao(
+                Verificacao(
+                    prompt_unitario,
+                    {"transacao": pendentes[id_transacao],
+                     "context": "\n".join(d.page_content for d in docs_linha[id_transacao])},
+                    ids_dos_documentos(docs_linha[id_transacao]),
+                ),
+                llm, limitador, cache,
+            )
+            for id_transacao in faltando
+        ))
+        vereditos.update(zip(faltando, unitarias))
+        if cache:
+            for id_transacao, resposta in vereditos.items():
+                cache.guardar(chaves[id_transacao], resposta)
+        respostas.update(vereditos)
+
+    return checagem.atributo, respostas
+
+
+async def auditar_em_lote(df, llm, prompt_regras, prompt_fraude, descrever, contexto_regras, contexto_emails,
+                          tamanho_lote=TAMANHO_LOTE_PADRAO, concorrencia=CONCORRENCIA_PADRAO, limitador=None,
+                          cache=None):
+    # `contexto_regras(categoria, linhas)` e `contexto_emails(funcionario, linhas)` devolvem os
+    # documentos das linhas de um lote (quem chama limita o tamanho); cada lote busca o seu.
+    # Os prompts unitários (fallback) usam as variáveis {transacao} e {context}.
+    linhas = {str(l["id_transacao"]): l for _, l in df.iterrows()}
+    checagens = [
+        (CHECAGEM_REGRAS, prompt_regras, contexto_regras),
+        (CHECAGEM_FRAUDE, prompt_fraude, contexto_emails),
+    ]
+
+    trabalhos = []
+    for checagem, prompt_unitario, buscar_contexto in checagens:
+        for chave, grupo in df.groupby(checagem.agrupar_por, sort=False, observed=True):
+            ids = [str(i) for i in grupo["id_transacao"]]
+            for pedaco in _fatiar(ids, max(1, tamanho_lote)):
+                trabalhos.append((checagem, prompt_unitario, buscar_contexto, chave, pedaco))
+
+    async def julgar(trabalho):
+        checagem, prompt_unitario, buscar_contexto, chave, pedaco = trabalho
+        lote = [linhas[i] for i in pedaco]
+        docs = await asyncio.to_thread(buscar_contexto, chave, lote)
+        atributo, respostas = await _julgar_lote(
+            checagem, lote, docs, prompt_unitario, descrever, llm, limitador, cache
+        )
+        return atributo, respostas, None
+
+    def falhou(trabalho, erro):
+        # O lote inteiro fica sem este veredito; as outras checagens e lotes seguem
+        checagem, pedaco = trabalho[0], trabalho[-1]
+        texto = resultado_com_erro(None, erro).erro
+        return checagem.atributo, {i: texto for i in pedaco}, texto
+
+    # Uma transação sai assim que os dois lotes dela (regras e fraude) terminam
+    parciais, erros = {}, {}
+    async for atributo, respostas, erro in processar_em_paralelo(trabalhos, julgar, concorrencia, ao_falhar=falhou):
+        for id_transacao, resposta in respostas.items():
+            parcial = parciais.setdefault(id_transacao, {})
+            parcial[atributo] = resposta
+            if erro:
+                erros[id_transacao] = erro
+            if len(parcial) == len(checagens):
+                del parciais[id_transacao]
+                yield ResultadoAuditoria(linha=linhas[id_transacao], erro=erros.pop(id_transacao, None), **parcial)
+
+
+def rodar_auditoria_lote(df, llm, prompt_regras, prompt_fraude, descrever, contexto_regras, contexto_emails,
+                         ao_concluir, tamanho_lote=TAMANHO_LOTE_PADRAO, concorrencia=CONCORRENCIA_PADRAO,
+                         requisicoes_por_segundo=None, cache=None):
+    async def consumir():
+        limitador = LimitadorTaxa(requisicoes_por_segundo) if requisicoes_por_segundo else None
+        async for resultado in auditar_em_lote(
+            df, llm, prompt_regras, prompt_fraude, descrever, contexto_regras, contexto_emails,
+            tamanho_lote, concorrencia, limitador, cache,
+        ):
+            ao_concluir(resultado)
+
+    asyncio.run(consumir())
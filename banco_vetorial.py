@@ -0,0 +1,378 @@
+import contextlib
+import json
+import os
+import uuid
+from operator import eq, ge, gt, le, lt, ne
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+try:
+    import fcntl
+except ImportError:   # Windows: sem trava entre processos (um escritor por vez, como antes)
+    fcntl = None
+
+# --- BANCO VETORIAL (backend plugável) ---
+# TOBY_VETORES escolhe onde ficam os chunks e os embeddings:
+#   chroma  -> langchain_chroma.Chroma (SQLite + HNSW), o padrão
+#   numpy   -> BancoNumpy: matriz float32 mapeada em memória; um lote de consultas é
+#              respondido com uma única multiplicação de matrizes
+#   faiss   -> o mesmo BancoNumpy, com a busca feita por um faiss.IndexFlatIP
+# Para corpora pequenos (a política e alguns milhares de e-mails) o BancoNumpy abre em
+# milissegundos e não paga o overhead do SQLite a cada consulta. Todo o resto do projeto
+# (ingestão, recuperação em lote, índice de pessoas, chat) usa só a interface comum:
+# add_documents, delete, get, similarity_search(_by_vector), as_retriever e consultar_vetores.
+
+VARIAVEL_BACKEND = "TOBY_VETORES"
+BACKEND_PADRAO = "chroma"
+BACKENDS_LOCAIS = ("numpy", "faiss")
+ARQUIVO_BANCO = "banco.json"
+ARQUIVO_TRAVA = "banco.lock"
+FRACAO_MAXIMA_REMOVIDOS = 0.5   # Acima disso (e de MIN_REMOVIDOS_COMPACTAR linhas) os arquivos são reescritos
+MIN_REMOVIDOS_COMPACTAR = 256
+
+OPERADORES = {
+    "$eq": eq, "$ne": ne, "$gt": gt, "$gte": ge, "$lt": lt, "$lte": le,
+    "$in": lambda valor, opcoes: valor in opcoes,
+    "$nin": lambda valor, opcoes: valor not in opcoes,
+}
+
+
+def backend_vetores():
+    return os.getenv(VARIAVEL_BACKEND, BACKEND_PADRAO).strip().lower() or BACKEND_PADRAO
+
+
+def diretorio_banco(diretorio, backend=None):
+    # Cada formato tem a sua pasta (e o seu manifesto): trocar de backend reindexa do zero
+    # em vez de achar que os chunks já estão lá. numpy e faiss compartilham os arquivos.
+    backend = backend or backend_vetores()
+    return diretorio if backend == "chroma" else f"{diretorio}_numpy"
+
+
+def abrir_banco(diretorio, embeddings, backend=None):
+    backend = backend or backend_vetores()
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        return Chroma(persist_directory=diretorio, embedding_function=embeddings)
+    if backend in BACKENDS_LOCAIS:
+        return BancoNumpy(diretorio, embeddings, motor=backend)
+    raise ValueError(f"{VARIAVEL_BACKEND} inválido: '{backend}' (use chroma, {', '.join(BACKENDS_LOCAIS)})")
+
+
+def consultar_vetores(vectorstore, vetores, k=4, filtro=None):
+    # Busca em massa: uma lista de [Document, ...] por vetor de consulta, na mesma ordem.
+    # `filtro` segue a sintaxe `where` do Chroma (ex: parser_emails.filtro_emails).
+    if isinstance(vectorstore, BancoNumpy):
+        return vectorstore.consultar_vetores(vetores, k=k, filtro=filtro)
+    resposta = vectorstore._collection.query(
+        query_embeddings=vetores, n_results=k, where=filtro, include=["documents", "metadatas"],
+    )
+    return [
+        [Document(page_content=texto, metadata=meta or {}, id=id_doc) for id_doc, texto, meta in zip(ids, textos, metadados)]
+        for ids, textos, metadados in zip(resposta["ids"], resposta["documents"], resposta["metadatas"])
+    ]
+
+
+def atende_filtro(metadados, filtro):
+    # Avalia um `where` do Chroma ($and, $or, $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin)
+    for chave, condicao in filtro.items():
+        if chave == "$and":
+            if not all(atende_filtro(metadados, f) for f in condicao):
+                return False
+        elif chave == "$or":
+            if not any(atende_filtro(metadados, f) for f in condicao):
+                return False
+        else:
+            valor = metadados.get(chave)
+            for operador, esperado in (condicao.items() if isinstance(condicao, dict) else [("$eq", condicao)]):
+                if valor is None:
+                    # Como no Chroma: campo ausente só passa em negações
+                    if operador not in ("$ne", "$nin"):
+                        return False
+                elif not OPERADORES[operador](valor, esperado):
+                    return False
+    return True
+
+
+def _normalizar(matriz):
+    matriz = np.asarray(matriz, dtype=np.float32)
+    return matriz / np.clip(np.linalg.norm(matriz, axis=-1, keepdims=True), 1e-12, None)
+
+
+class BancoNumpy(VectorStore):
+    # Arquivos em `diretorio`:
+    #   banco.json             -> geração atual e dimensão dos vetores
+    #   vetores-<g>.f32        -> vetores normalizados, uma linha por chunk (só cresce)
+    #   registros-<g>.jsonl    -> log: {"id", "texto", "metadados"} por linha do .f32 (upsert
+    #                             por ID) ou {"remover": id}
+    # Gravar só acrescenta no fim dos dois arquivos; linhas apagadas ou substituídas viram
+    # lixo até a próxima compactação, que escreve uma nova geração e troca o banco.json.
+    # Leitores (chat, serviço) nunca mexem nos arquivos: enxergam só o prefixo confirmado
+    # (linhas com vetor e registro completos). Quem escreve segura o banco.lock e só então
+    # conserta sobras de uma queda no meio da escrita.
+    def __init__(self, diretorio, embeddings, motor="numpy"):
+        self.diretorio = diretorio
+        self._embeddings = embeddings
+        self.motor = motor
+        self._indice_faiss = None
+        self._reparado = False
+        os.makedirs(diretorio, exist_ok=True)
+        self._carregar()
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    # --- Persistência ---
+    def _caminho(self, prefixo, extensao):
+        return os.path.join(self.diretorio, f"{prefixo}-{self.geracao}.{extensao}")
+
+    def _carregar(self, reparar=False):
+        # reparar=True só com a trava de escrita (ver _escrita)
+        caminho_banco = os.path.join(self.diretorio, ARQUIVO_BANCO)
+        estado = {"geracao": 0, "dimensao": None}
+        if os.path.exists(caminho_banco):
+            with open(caminho_banco, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+        self.geracao, self.dimensao = estado["geracao"], estado["dimensao"]
+
+        self._ids, self._textos, self._metadados = [], [], []
+        self._linha_do_id = {}
+        caminho_registros = self._caminho("registros", "jsonl")
+        caminho_vetores = self._caminho("vetores", "f32")
+        linhas_vetores = 0
+        if self.dimensao and os.path.exists(caminho_vetores):
+            linhas_vetores = os.path.getsize(caminho_vetores) // (self.dimensao * 4)
+        if os.path.exists(caminho_registros):
+            with open(caminho_registros, "rb") as f:
+                linhas_log = f.readlines()
+            if linhas_log and not linhas_log[-1].endswith(b"\n"):
+                # Última linha cortada (escrita em andamento ou queda): fica de fora
+                cortada = linhas_log.pop()
+                if reparar:
+                    os.truncate(caminho_registros, os.path.getsize(caminho_registros) - len(cortada))
+            # Um único json.loads para o log inteiro é bem mais rápido que um por linha
+            for registro in json.loads(b"[" + b",".join(linhas_log) + b"]"):
+                if "remover" in registro:
+                    self._linha_do_id.pop(registro["remover"], None)
+                    continue
+                if len(self._ids) >= linhas_vetores:
+                    break   # Registro sem vetor no .f32 (não acontece: o vetor é gravado antes)
+                self._linha_do_id[registro["id"]] = len(self._ids)
+                self._ids.append(registro["id"])
+                self._textos.append(registro["texto"])
+                self._metadados.append(registro["metadados"])
+
+        linhas = len(self._ids)
+        if reparar and linhas_vetores > linhas:
+            # Queda entre gravar o vetor e o registro: descarta a sobra no fim do .f32
+            os.truncate(caminho_vetores, linhas * self.dimensao * 4)
+        self._reparado = reparar
+        self._mapear_vetores()
+        self._vivos = np.zeros(linhas, dtype=bool)
+        self._vivos[list(self._linha_do_id.values())] = True
+        self._assinatura = self._assinatura_arquivos()
+
+    def _assinatura_arquivos(self):
+        # Muda quando outro processo (ex: etapa02.py com o chat aberto) grava ou compacta o banco
+        # (um só processo escreve por vez; os demais só releem)
+        caminho_banco = os.path.join(self.diretorio, ARQUIVO_BANCO)
+        caminho_registros = self._caminho("registros", "jsonl")
+        return (
+            os.stat(caminho_banco).st_mtime_ns if os.path.exists(caminho_banco) else None,
+            os.path.getsize(caminho_registros) if os.path.exists(caminho_registros) else None,
+        )
+
+    def _atualizar(self, reparar=False):
+        if self._assinatura_arquivos() != self._assinatura or (reparar and not self._reparado):
+            self._indice_faiss = None
+            self._carregar(reparar)
+
+    @contextlib.contextmanager
+    def _escrita(self):
+        # Um escritor por vez (entre processos): relê o que os outros gravaram e conserta sobras
+        with open(os.path.join(self.diretorio, ARQUIVO_TRAVA), "a") as trava:
+            if fcntl:
+                fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                self._atualizar(reparar=True)
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _mapear_vetores(self):
+        caminho = self._caminho("vetores", "f32")
+        if not self._ids or not os.path.exists(caminho):
+            self._vetores = np.zeros((0, self.dimensao or 0), dtype=np.float32)
+            return
+        self._vetores = np.memmap(caminho, dtype=np.float32, mode="r", shape=(len(self._ids), self.dimensao))
+
+    def _gravar_estado(self):
+        temporario = os.path.join(self.diretorio, ARQUIVO_BANCO + ".tmp")
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"geracao": self.geracao, "dimensao": self.dimensao}, f)
+        os.replace(temporario, os.path.join(self.diretorio, ARQUIVO_BANCO))
+        self._assinatura = self._assinatura_arquivos()
+
+    def _anexar_registros(self, registros):
+        with open(self._caminho("registros", "jsonl"), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in registros)
+            f.flush()
+            os.fsync(f.fileno())
+        self._assinatura = self._assinatura_arquivos()
+
+    def _compactar_se_preciso(self):
+        removidos = len(self._ids) - len(self._linha_do_id)
+        if removidos < MIN_REMOVIDOS_COMPACTAR or removidos <= FRACAO_MAXIMA_REMOVIDOS * len(self._ids):
+            return
+        linhas = sorted(self._linha_do_id.values())
+        antigos = [self._caminho("vetores", "f32"), self._caminho("registros", "jsonl")]
+        self.geracao += 1
+        np.asarray(self._vetores[linhas]).tofile(self._caminho("vetores", "f32"))
+        with open(self._caminho("registros", "jsonl"), "w", encoding="utf-8") as f:
+            for linha in linhas:
+                f.write(json.dumps({"id": self._ids[linha], "texto": self._textos[linha],
+                                    "metadados": self._metadados[linha]}, ensure_ascii=False) + "\n")
+        self._gravar_estado()   # A troca de geração é atômica: só agora a nova passa a valer
+        for caminho in antigos:
+            os.remove(caminho)
+        self._indice_faiss = None
+        self._carregar(reparar=True)
+
+    # --- Escrita ---
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        vetores = _normalizar(self._embeddings.embed_documents(texts))
+        with self._escrita():
+            return self._gravar(texts, metadatas, ids, vetores)
+
+    def _gravar(self, texts, metadatas, ids, vetores):
+        if self.dimensao is None:
+            self.dimensao = vetores.shape[1]
+            self._gravar_estado()
+        # Primeiro os vetores, depois o log: o log é quem confirma a linha
+        with open(self._caminho("vetores", "f32"), "ab") as f:
+            vetores.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._anexar_registros(
+            {"id": i, "texto": t, "metadados": m or {}} for i, t, m in zip(ids, texts, metadatas)
+        )
+
+        inicio = len(self._ids)
+        substituidas = [self._linha_do_id[i] for i in ids if i in self._linha_do_id]
+        for deslocamento, (id_doc, texto, meta) in enumerate(zip(ids, texts, metadatas)):
+            self._linha_do_id[id_doc] = inicio + deslocamento
+            self._ids.append(id_doc)
+            self._textos.append(texto)
+            self._metadados.append(meta or {})
+        self._vivos = np.concatenate([self._vivos, np.zeros(len(texts), dtype=bool)])
+        self._vivos[substituidas] = False
+        self._vivos[[self._linha_do_id[i] for i in ids]] = True
+        self._mapear_vetores()
+        if self._indice_faiss is not None:
+            self._indice_faiss.add(vetores)
+        self._compactar_se_preciso()
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        with self._escrita():
+            presentes = [i for i in (ids or []) if i in self._linha_do_id]
+            if presentes:
+                self._anexar_registros({"remover": i} for i in presentes)
+                self._vivos[[self._linha_do_id.pop(i) for i in presentes]] = False
+                self._compactar_se_preciso()
+        return True
+
+    # --- Leitura ---
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None, **kwargs):
+        # Mesmo formato do Chroma.get: {"ids", "documents", "metadatas", "embeddings"}
+        self._atualizar()
+        include = ["documents", "metadatas"] if include is None else include
+        if ids is not None:
+            linhas = [self._linha_do_id[i] for i in ([ids] if isinstance(ids, str) else ids) if i in self._linha_do_id]
+        else:
+            linhas = np.flatnonzero(self._vivos).tolist()
+        if where:
+            linhas = [linha for linha in linhas if atende_filtro(self._metadados[linha], where)]
+        linhas = linhas[offset or 0:None if limit is None else (offset or 0) + limit]
+        return {
+            "ids": [self._ids[linha] for linha in linhas],
+            "documents": [self._textos[linha] for linha in linhas] if "documents" in include else None,
+            "metadatas": [self._metadados[linha] for linha in linhas] if "metadatas" in include else None,
+            "embeddings": np.asarray(self._vetores[linhas]) if "embeddings" in include else None,
+        }
+
+    def _mascara(self, filtro):
+        if not filtro:
+            return self._vivos
+        return self._vivos & np.fromiter(
+            (atende_filtro(meta, filtro) for meta in self._metadados), dtype=bool, count=len(self._metadados)
+        )
+
+    def _melhores(self, consultas, k, mascara):
+        # -> (linhas, similaridades), cada uma (consultas, k); -1 onde faltou candidato
+        if self.motor == "faiss":
+            import faiss
+
+            if self._indice_faiss is None:
+                self._indice_faiss = faiss.IndexFlatIP(self.dimensao)
+                self._indice_faiss.add(np.ascontiguousarray(self._vetores))
+            parametros = None
+            if not mascara.all():
+                parametros = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.flatnonzero(mascara).astype(np.int64)))
+            similaridades, linhas = self._indice_faiss.search(consultas, k, params=parametros)
+            return linhas, similaridades
+
+        pontuacao = consultas @ self._vetores.T   # Uma multiplicação para o lote inteiro
+        pontuacao[:, ~mascara] = -np.inf
+        k = min(k, int(mascara.sum()))
+        linhas = np.argpartition(-pontuacao, k - 1, axis=1)[:, :k]
+        similaridades = np.take_along_axis(pontuacao, linhas, axis=1)
+        ordem = np.argsort(-similaridades, axis=1, kind="stable")
+        return np.take_along_axis(linhas, ordem, axis=1), np.take_along_axis(similaridades, ordem, axis=1)
+
+    def _consultar(self, vetores, k, filtro):
+        if not len(vetores):
+            return []
+        self._atualizar()
+        mascara = self._mascara(filtro)
+        if k <= 0 or not mascara.any():
+            return [[] for _ in vetores]
+        linhas, similaridades = self._melhores(_normalizar(vetores), k, mascara)
+        return [
+            [(self._documento(linha), 1.0 - float(similaridade)) for linha, similaridade in zip(lin, sim) if linha >= 0]
+            for lin, sim in zip(linhas, similaridades)
+        ]
+
+    def _documento(self, linha):
+        return Document(page_content=self._textos[linha], metadata=self._metadados[linha], id=self._ids[linha])
+
+    def consultar_vetores(self, vetores, k=4, filtro=None):
+        return [[doc for doc, _ in resultado] for resultado in self._consultar(vetores, k, filtro)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        # Distância de cosseno (menor = mais parecido), como o Chroma devolve distâncias
+        return self._consultar([self._embeddings.embed_query(query)], k, filter)[0]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return self.consultar_vetores([embedding], k=k, filtro=filter)[0]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k=k, filter=filter)
+
+    def _select_relevance_score_fn(self):
+        return lambda distancia: 1.0 - distancia
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory=None, **kwargs):
+        banco = cls(persist_directory, embedding, motor=kwargs.get("motor", "numpy"))
+        banco.add_texts(texts, metadatas=metadatas, ids=ids)
+        return banco
@@ -0,0 +1,73 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- BENCHMARK: Custo de importação (partida a frio) dos pontos de entrada ---
+# Roda `python -X importtime -c "import <alvo>"` em processos novos e mostra o tempo de
+# parede, o tempo de importação medido pelo próprio Python e os pacotes que mais pesam.
+# Os backends de embeddings entram como alvos próprios: "langchain_huggingface" (torch)
+# contra "onnxruntime, tokenizers, huggingface_hub" (TOBY_EMBEDDINGS=onnx).
+#   python benchmarks/bench_importacao.py
+#   python benchmarks/bench_importacao.py --alvos etapa03 servico --detalhes 10
+
+ALVOS_PADRAO = [
+    "cliente_servico",
+    "etapa01",
+    "etapa02",
+    "etapa03",
+    "servico",
+    "langchain_huggingface",
+    "onnxruntime, tokenizers, huggingface_hub",
+]
+
+LINHA_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)")
+
+
+def medir(alvo):
+    # -> (segundos de parede, {pacote: microssegundos de importação}) ou None se faltar pacote
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {alvo}"],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    parede = time.perf_counter() - inicio
+    if processo.returncode != 0:
+        return None
+
+    por_pacote = {}
+    for linha in processo.stderr.splitlines():
+        encontrado = LINHA_IMPORTTIME.match(linha)
+        # Tempo próprio (self) somado por pacote raiz: cada módulo é contado uma vez só
+        if encontrado:
+            pacote = encontrado.group(2).split(".")[0]
+            por_pacote[pacote] = por_pacote.get(pacote, 0) + int(encontrado.group(1))
+    return parede, por_pacote
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alvos", nargs="+", default=ALVOS_PADRAO)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--detalhes", type=int, default=5, help="pacotes mais pesados mostrados por alvo")
+    args = parser.parse_args()
+
+    print(f"{'alvo':<42} {'parede (s)':>11} {'imports (s)':>12}  mais pesados")
+    for alvo in args.alvos:
+        medicoes = [medir(alvo) for _ in range(args.repeticoes)]
+        if any(m is None for m in medicoes):
+            print(f"{alvo:<42} {'não instalado / erro na importação':>26}")
+            continue
+        # Melhor execução: a que menos sofreu com cache de disco frio e ruído da máquina
+        parede, por_pacote = min(medicoes, key=lambda m: m[0])
+        pesados = sorted(por_pacote.items(), key=lambda item: item[1], reverse=True)[:args.detalhes]
+        resumo = ", ".join(f"{pacote} {micro / 1e6:.2f}s" for pacote, micro in pesados)
+        print(f"{alvo:<42} {parede:>11.2f} {sum(por_pacote.values()) / 1e6:>12.2f}  {resumo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+import etapa01  # noqa: E402
+import etapa02  # noqa: E402
+import etapa03  # noqa: E402
+from auditoria_async import LimitadorTaxa  # noqa: E402
+from banco_vetorial import abrir_banco, backend_vetores  # noqa: E402
+from bench_vetores import VetoresSinteticos  # noqa: E402
+from cache_veredictos import CacheVeredictos  # noqa: E402
+from llm_fake import ChatFalso  # noqa: E402
+from modelo_embeddings import criar_embeddings  # noqa: E402
+from perfis_risco import atualizar_perfis, fila_prioridade  # noqa: E402
+from rastreamento import coletar_etapas, etapa  # noqa: E402
+from regras_compliance import ARQUIVO_POLITICA, carregar_regras  # noqa: E402
+from transacoes import atualizar_cache, carregar_transacoes  # noqa: E402
+
+# --- BENCHMARK: Pipeline completo de auditoria (etapa03) com LLM local ---
+# Replays do transacoes_bancarias.csv (e de versões sintéticas com N linhas) pelo mesmo
+# fluxo do `auditoria_inteligente`: leitura do CSV, triagem por regras, smurfing,
+# recuperação (embeddings + busca vetorial + índice de pessoas) e as chamadas à LLM,
+# feitas pelo ChatFalso com latência configurável no lugar do ChatGroq.
+# Cada cenário roda num processo novo (RSS de pico isolado) e as etapas são medidas pelos
+# spans de rastreamento.py: p50/p95/p99 por etapa, vazão e memória vão para um JSON,
+# e `--comparar` aponta regressões contra uma execução anterior.
+#   python benchmarks/bench_pipeline.py --linhas 0 100000
+#   python benchmarks/bench_pipeline.py --linhas 0 --comparar benchmarks/resultados/pipeline-base.json
+
+DIRETORIO_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+DIFERENCA_MINIMA_MS = 5.0   # Variações de p95 menores que isso são ruído, não regressão
+
+
+def escalar_transacoes(df, n, semente=42):
+    # n = 0 mantém o arquivo original; senão reamostra linhas reais (funcionário, cargo e
+    # categoria coerentes) com novos IDs e valores variados. As cópias ocupam períodos
+    # seguidos ao original, então a densidade de notas por funcionário/dia (o que o detector
+    # de smurfing enxerga) continua a mesma de um ledger real mais longo.
+    if not n:
+        return df
+    rng = np.random.default_rng(semente)
+    sintetico = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    sintetico["id_transacao"] = [f"TX_B{i:07d}" for i in range(n)]
+    sintetico["valor"] = np.round(sintetico["valor"] * rng.lognormal(0, 0.1, n), 2)
+
+    datas = pd.to_datetime(sintetico["data"])
+    periodo = (datas.max() - datas.min()).days + 1
+    copias = -(-n // len(df))
+    deslocamento = pd.to_timedelta(rng.integers(0, copias, n) * periodo, unit="D")
+    sintetico["data"] = (datas + deslocamento).dt.strftime("%Y-%m-%d")
+    return sintetico
+
+
+def criar_embeddings_benchmark(tipo):
+    # "sintetico": vetores determinísticos sem modelo (mede só o pipeline);
+    # "real": o modelo configurado em TOBY_EMBEDDINGS (torch ou ONNX)
+    return VetoresSinteticos() if tipo == "sintetico" else criar_embeddings()
+
+
+def preparar_bancos(diretorio, tipo_embeddings):
+    embeddings = criar_embeddings_benchmark(tipo_embeddings)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        etapa01.carregar_e_indexar(embeddings, os.path.join(diretorio, "politica"))
+        etapa02.indexar_emails(embeddings, os.path.join(diretorio, "emails"))
+
+
+def executar_cenario(parametros):
+    # Roda num processo novo: tudo que ocupa memória (DataFrames, bancos, modelo) é deste cenário
+    os.chdir(RAIZ)
+    diretorio = parametros["diretorio_bancos"]
+    embeddings = criar_embeddings_benchmark(parametros["embeddings"])
+    vector_rules = abrir_banco(os.path.join(diretorio, "politica"), embeddings)
+    vector_emails = abrir_banco(os.path.join(diretorio, "emails"), embeddings)
+    llm = ChatFalso(latencia=parametros["latencia"], variacao=parametros["variacao"])
+    cache = CacheVeredictos(os.path.join(diretorio, f"cache-{parametros['linhas']}.sqlite")) if parametros["cache"] else None
+
+    caminho_csv = os.path.join(diretorio, f"transacoes-{parametros['linhas']}.csv")
+    escalar_transacoes(pd.read_csv(etapa03.ARQUIVO_CSV), parametros["linhas"]).to_csv(caminho_csv, index=False)
+
+    with coletar_etapas() as coletor:
+        # Conversão CSV -> Parquet e perfis de risco são feitos uma vez por arquivo: medidos à parte, fora da vazão
+        with etapa("converter_parquet"):
+            atualizar_cache(caminho_csv)
+        with etapa("perfis_risco"):
+            atualizar_perfis(caminho_csv, os.path.join(diretorio, "emails"))
+        inicio = time.perf_counter()
+        with etapa("carregar_csv"):
+            df = carregar_transacoes(caminho_csv)
+        df, textos_clusters = etapa03.selecionar_transacoes(
+            df, carregar_regras(ARQUIVO_POLITICA), caminho=caminho_csv, diretorio_emails=os.path.join(diretorio, "emails")
+        )
+        em_analise = fila_prioridade(df, limite=parametros["max_analise"] or None)
+
+        async def consumir():
+            limitador = LimitadorTaxa(parametros["rps"]) if parametros["rps"] else None
+            concluidas = 0
+            async for _ in etapa03.fluxo_auditoria(
+                em_analise, llm, vector_rules, vector_emails, textos_clusters, limitador=limitador, cache=cache,
+                modo_lote=parametros["modo"] == "lote", diretorio_emails=os.path.join(diretorio, "emails"),
+            ):
+                concluidas += 1
+            return concluidas
+
+        inicio_auditoria = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            concluidas = asyncio.run(consumir())
+        fim = time.perf_counter()
+
+    etapas = coletor.resumo()
+    return {
+        "linhas": len(df),
+        "em_analise": len(em_analise),
+        "concluidas": concluidas,
+        "chamadas_llm": etapas.get("llm", {}).get("n", 0),
+        "total_s": round(fim - inicio, 3),
+        "auditoria_s": round(fim - inicio_auditoria, 3),
+        "vazao_linhas_s": round(len(df) / (fim - inicio), 1),
+        "vazao_analise_s": round(len(em_analise) / (fim - inicio_auditoria), 2) if len(em_analise) else None,
+        "rss_pico_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "etapas": etapas,
+        "contadores": coletor.contadores,
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def imprimir(cenarios):
+    print(f"\n{'linhas':>10} {'em análise':>11} {'chamadas LLM':>13} {'total (s)':>10} {'linhas/s':>10} "
+          f"{'análise/s':>10} {'RSS pico (MB)':>14}")
+    for c in cenarios:
+        print(f"{c['linhas']:>10,} {c['em_analise']:>11,} {c['chamadas_llm']:>13,} {c['total_s']:>10.2f} "
+              f"{c['vazao_linhas_s']:>10,.0f} {c['vazao_analise_s'] or 0:>10.2f} {c['rss_pico_mb']:>14.1f}")
+    for c in cenarios:
+        print(f"\nEtapas ({c['linhas']:,} linhas):")
+        print(f"  {'etapa':<22} {'n':>7} {'total (s)':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10}")
+        for nome, e in sorted(c["etapas"].items(), key=lambda item: -item[1]["total_s"]):
+            print(f"  {nome:<22} {e['n']:>7,} {e['total_s']:>10.3f} {e['p50_ms']:>10.2f} {e['p95_ms']:>10.2f} {e['p99_ms']:>10.2f}")
+
+
+def comparar(cenarios, caminho_base, tolerancia):
+    # Regressão: vazão caiu ou p95 de alguma etapa subiu mais que `tolerancia` (fração)
+    with open(caminho_base, "r", encoding="utf-8") as f:
+        base = {c["linhas"]: c for c in json.load(f)["cenarios"]}
+    regressoes = 0
+    print(f"\nComparação com {caminho_base} (tolerância {tolerancia:.0%}):")
+    for c in cenarios:
+        anterior = base.get(c["linhas"])
+        if not anterior:
+            print(f"  {c['linhas']:,} linhas: sem cenário equivalente na base")
+            continue
+        medidas = [("vazão linhas/s", anterior["vazao_linhas_s"], c["vazao_linhas_s"], True, 0),
+                   ("RSS pico (MB)", anterior["rss_pico_mb"], c["rss_pico_mb"], False, 0)]
+        medidas += [(f"p95 {nome}", anterior["etapas"][nome]["p95_ms"], e["p95_ms"], False, DIFERENCA_MINIMA_MS)
+                    for nome, e in c["etapas"].items() if nome in anterior["etapas"]]
+        for rotulo, antes, agora, maior_melhor, minimo in medidas:
+            if not antes:
+                continue
+            variacao = (agora - antes) / antes
+            piorou = -variacao > tolerancia if maior_melhor else variacao > tolerancia
+            piorou = piorou and abs(agora - antes) >= minimo
+            regressoes += piorou
+            print(f"  {'⚠️ ' if piorou else '  '}{c['linhas']:>9,} {rotulo:<28} {antes:>12,.2f} -> {agora:>12,.2f} ({variacao:+.1%})")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, nargs="+", default=[0, 100_000], help="0 = transacoes_bancarias.csv original")
+    parser.add_argument("--latencia", type=float, default=0.05, help="segundos por chamada do ChatFalso")
+    parser.add_argument("--variacao", type=float, default=0.02, help="jitter máximo (s) somado à latência")
+    parser.add_argument("--modo", choices=["lote", "unitario"], default="lote" if etapa03.MODO_LOTE else "unitario")
+    parser.add_argument("--rps", type=float, default=None, help="limite de chamadas/s (padrão: sem limite)")
+    parser.add_argument("--max-analise", type=int, default=None, help="orçamento: top-K da fila de prioridade enviado à LLM")
+    parser.add_argument("--embeddings", choices=["sintetico", "real"], default="sintetico")
+    parser.add_argument("--cache", action="store_true", help="usa um cache de vereditos novo por cenário")
+    parser.add_argument("--saida", default=None, help="JSON de resultados (padrão: benchmarks/resultados/)")
+    parser.add_argument("--comparar", default=None, help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.10)
+    args = parser.parse_args()
+
+    os.chdir(RAIZ)
+    diretorio_bancos = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        print(f"🧠 Indexando política e e-mails ({args.embeddings}) em {diretorio_bancos}...")
+        preparar_bancos(diretorio_bancos, args.embeddings)
+
+        cenarios = []
+        contexto = multiprocessing.get_context("spawn")
+        for linhas in args.linhas:
+            print(f"🚀 Cenário: {linhas or 'arquivo original'} linhas...")
+            parametros = {
+                "linhas": linhas, "diretorio_bancos": diretorio_bancos, "embeddings": args.embeddings,
+                "latencia": args.latencia, "variacao": args.variacao, "modo": args.modo, "rps": args.rps,
+                "max_analise": args.max_analise, "cache": args.cache,
+            }
+            with contexto.Pool(1) as pool:
+                cenarios.append(pool.apply(executar_cenario, (parametros,)))
+    finally:
+        shutil.rmtree(diretorio_bancos, ignore_errors=True)
+
+    imprimir(cenarios)
+
+    saida = args.saida or os.path.join(DIRETORIO_RESULTADOS, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump({
+            "gerado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": commit_atual(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "backend_vetores": backend_vetores(),
+            "parametros": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+            "cenarios": cenarios,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Resultados em {saida}")
+
+    if args.comparar and comparar(cenarios, args.comparar, args.tolerancia):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
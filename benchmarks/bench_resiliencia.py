@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_fake import ServidorFalso  # noqa: E402
+from llm_resiliente import MODELO_PRINCIPAL, TIMEOUT_LLM, criar_llm  # noqa: E402
+from rastreamento import coletar_etapas  # noqa: E402
+
+# --- BENCHMARK: Camada resiliente da LLM contra a API falsa da Groq ---
+# Sobe o ServidorFalso (llm_fake.py) com 429, 5xx e picos de latência injetados e dispara as
+# mesmas chamadas, em paralelo, por três clientes: o ChatGroq sem retentativas, o ChatGroq
+# com as retentativas do próprio SDK e o ChatResiliente (criar_llm). Uma fração dos prompts
+# se repete, como analistas fazendo a mesma pergunta ao mesmo tempo ("juntas" = chamadas que
+# pegaram carona numa idêntica em andamento).
+#   python benchmarks/bench_resiliencia.py --chamadas 200 --taxa-429 0.2 --taxa-500 0.05
+#   python benchmarks/bench_resiliencia.py --fora llama-3.1-8b-instant   # principal fora do ar
+
+
+def gerar_prompts(n, repetidas, semente=42):
+    gerador = random.Random(semente)
+    prompts = []
+    for i in range(n):
+        if prompts and gerador.random() < repetidas:
+            prompts.append(gerador.choice(prompts))
+        else:
+            valor = gerador.uniform(5, 900)
+            prompts.append(f"Responda com STATUS: e MOTIVO:. ID: TX_{i:05d} | Valor: ${valor:.2f} | Cat: Escritório")
+    return prompts
+
+
+async def disparar(llm, prompts, concorrencia):
+    semaforo = asyncio.Semaphore(concorrencia)
+    latencias, falhas = [], 0
+
+    async def chamar(prompt):
+        nonlocal falhas
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                await llm.ainvoke(prompt)
+                latencias.append(time.perf_counter() - inicio)
+            except Exception:
+                falhas += 1
+
+    await asyncio.gather(*(chamar(p) for p in prompts))
+    return latencias, falhas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chamadas", type=int, default=200)
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--repetidas", type=float, default=0.2, help="fração de prompts repetidos")
+    parser.add_argument("--latencia", type=float, default=0.1)
+    parser.add_argument("--taxa-429", type=float, default=0.2)
+    parser.add_argument("--taxa-500", type=float, default=0.05)
+    parser.add_argument("--taxa-pico", type=float, default=0.05)
+    parser.add_argument("--pico", type=float, default=2.0)
+    parser.add_argument("--fora", nargs="*", default=[], help="modelos que respondem 503")
+    args = parser.parse_args()
+
+    from langchain_groq import ChatGroq
+
+    os.environ.setdefault("GROQ_API_KEY", "falsa")
+    prompts = gerar_prompts(args.chamadas, args.repetidas)
+    clientes = {
+        "ChatGroq sem retentativas": lambda url: ChatGroq(
+            model_name=MODELO_PRINCIPAL, base_url=url, max_retries=0, request_timeout=TIMEOUT_LLM
+        ),
+        "ChatGroq (retentativas do SDK)": lambda url: ChatGroq(
+            model_name=MODELO_PRINCIPAL, base_url=url, request_timeout=TIMEOUT_LLM
+        ),
+        "ChatResiliente": lambda url: criar_llm(base_url=url),
+    }
+
+    print(f"{'cliente':<32} {'ok':>5} {'falhas':>7} {'HTTP':>6} {'429':>5} {'reserva':>8} {'juntas':>7} "
+          f"{'p50 (s)':>8} {'p95 (s)':>8} {'total (s)':>10}")
+    for nome, criar in clientes.items():
+        # Servidor novo por cliente: mesma semente, então as mesmas falhas nas mesmas posições
+        servidor = ServidorFalso(
+            latencia=args.latencia, taxa_429=args.taxa_429, taxa_500=args.taxa_500,
+            taxa_pico=args.taxa_pico, pico=args.pico, modelos_fora=args.fora,
+        )
+        url = servidor.iniciar()
+        try:
+            with coletar_etapas() as coletor:
+                inicio = time.perf_counter()
+                latencias, falhas = asyncio.run(disparar(criar(url), prompts, args.concorrencia))
+                total = time.perf_counter() - inicio
+        finally:
+            servidor.parar()
+        requisicoes = sum(servidor.respostas.values())
+        limitadas = sum(q for (_, status), q in servidor.respostas.items() if status == 429)
+        contadores = coletor.relatorio()["contadores"]
+        reserva = sum(v for k, v in contadores.items() if k.startswith("llm_reserva"))
+        p50, p95 = np.percentile(latencias, [50, 95]) if latencias else (float("nan"), float("nan"))
+        print(f"{nome:<32} {len(latencias):>5} {falhas:>7} {requisicoes:>6} {limitadas:>5} {reserva:>8} "
+              f"{contadores.get('llm_compartilhadas', 0):>7} {p50:>8.2f} {p95:>8.2f} {total:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
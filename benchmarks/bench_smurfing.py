@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smurfing import detectar_smurfing  # noqa: E402
+
+# --- BENCHMARK: Detector de Smurfing em dados sintéticos ---
+# Gera ledgers com N transações (mesmo formato do transacoes_bancarias.csv), injeta
+# alguns fracionamentos conhecidos e mede tempo e vazão do detector.
+#   python benchmarks/bench_smurfing.py --tamanhos 10000 100000 1000000
+
+
+def gerar_transacoes(n, funcionarios=500, categorias=12, dias=365, fraudes=50, semente=42):
+    rng = np.random.default_rng(semente)
+    inicio = np.datetime64("2008-01-01")
+    df = pd.DataFrame({
+        "id_transacao": [f"TX_{i}" for i in range(n)],
+        "data": (inicio + rng.integers(0, dias, n).astype("timedelta64[D]")).astype(str),
+        "funcionario": pd.Categorical.from_codes(rng.integers(0, funcionarios, n), [f"Func {i}" for i in range(funcionarios)]),
+        "categoria": pd.Categorical.from_codes(rng.integers(0, categorias, n), [f"Cat {i}" for i in range(categorias)]),
+        "descricao": "Despesa sintética",
+        "valor": np.round(rng.lognormal(3.3, 0.8, n).clip(2, 450), 2),
+    })
+    # Fracionamentos plantados: 3 notas de US$ 200 no mesmo dia, mesmo funcionário e categoria
+    alvos = rng.choice(n - 3, size=min(fraudes, max(0, n // 4 - 1)), replace=False)
+    for i in alvos:
+        df.loc[[i + 1, i + 2], ["data", "funcionario", "categoria"]] = df.loc[[i, i], ["data", "funcionario", "categoria"]].to_numpy()
+        df.loc[[i, i + 1, i + 2], "valor"] = 200.0
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--janela", type=int, default=1)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>12} {'melhor (s)':>12} {'linhas/s':>14} {'clusters':>10} {'notas marcadas':>15}")
+    for n in args.tamanhos:
+        df = gerar_transacoes(n)
+        tempos = []
+        for _ in range(args.repeticoes):
+            t0 = time.perf_counter()
+            resultado = detectar_smurfing(df, janela_dias=args.janela)
+            tempos.append(time.perf_counter() - t0)
+        marcadas = resultado["cluster_smurfing"] >= 0
+        melhor = min(tempos)
+        print(f"{n:>12,} {melhor:>12.3f} {n / melhor:>14,.0f} "
+              f"{resultado.loc[marcadas, 'cluster_smurfing'].nunique():>10,} {int(marcadas.sum()):>15,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from transacoes import ARQUIVO_CSV, atualizar_cache, carregar_transacoes, kpis  # noqa: E402
+
+# --- BENCHMARK: Carga das transações (CSV com pandas x cache Parquet tipado) ---
+# Gera ledgers com N linhas reamostradas do transacoes_bancarias.csv (datas espalhadas por
+# --meses meses) e compara, para cada tamanho: pd.read_csv, a conversão única para Parquet,
+# a carga tipada inteira, a de um só funcionário ou de um mês (filtros empurrados para o
+# leitor) e os KPIs do painel. Memória = memory_usage(deep=True) do DataFrame.
+#   python benchmarks/bench_transacoes.py --tamanhos 100000 1000000
+
+
+def gerar_ledger(df, n, meses=24, semente=42):
+    rng = np.random.default_rng(semente)
+    ledger = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+    ledger["id_transacao"] = [f"TX_B{i:08d}" for i in range(n)]
+    ledger["valor"] = np.round(ledger["valor"] * rng.lognormal(0, 0.1, n), 2)
+    inicio = pd.Timestamp(df["data"].min())
+    dias = (inicio + pd.DateOffset(months=meses) - inicio).days
+    ledger["data"] = (inicio + pd.to_timedelta(np.sort(rng.integers(0, dias, n)), unit="D")).strftime("%Y-%m-%d")
+    return ledger
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--meses", type=int, default=24)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    original = pd.read_csv(os.path.join(RAIZ, ARQUIVO_CSV))
+    funcionario = original["funcionario"].value_counts().index[0]
+    diretorio = tempfile.mkdtemp(prefix="bench_transacoes_")
+    try:
+        print(f"{'linhas':>12} {'operação':<28} {'melhor (s)':>11} {'linhas':>12} {'memória (MB)':>13}")
+        for n in args.tamanhos:
+            caminho = os.path.join(diretorio, f"transacoes-{n}.csv")
+            gerar_ledger(original, n, args.meses).to_csv(caminho, index=False)
+
+            inicio_mes = pd.Timestamp(original["data"].min()).replace(day=1)
+            fim_mes = inicio_mes + pd.offsets.MonthEnd(0)
+
+            t0 = time.perf_counter()
+            atualizar_cache(caminho)
+            conversao = time.perf_counter() - t0
+
+            casos = [
+                ("pd.read_csv", lambda: pd.read_csv(caminho)),
+                ("carregar_transacoes", lambda: carregar_transacoes(caminho)),
+                (f"filtro: {funcionario}", lambda: carregar_transacoes(caminho, funcionarios=[funcionario])),
+                ("filtro: 1 mês", lambda: carregar_transacoes(caminho, data_inicio=inicio_mes, data_fim=fim_mes)),
+            ]
+            print(f"{n:>12,} {'conversão para Parquet':<28} {conversao:>11.3f}")
+            for nome, funcao in casos:
+                melhor, df = medir(funcao, args.repeticoes)
+                memoria = df.memory_usage(deep=True).sum() / 1e6
+                print(f"{n:>12,} {nome:<28} {melhor:>11.3f} {len(df):>12,} {memoria:>13.1f}")
+            melhor, _ = medir(lambda: kpis(caminho), args.repeticoes)
+            print(f"{n:>12,} {'kpis (agregados)':<28} {melhor:>11.3f}")
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
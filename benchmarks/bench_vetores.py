@@ -0,0 +1,104 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from banco_vetorial import abrir_banco, consultar_vetores  # noqa: E402
+
+# --- BENCHMARK: Backends do banco vetorial (Chroma x NumPy x FAISS) ---
+# Indexa N chunks sintéticos (vetores aleatórios de 384 dimensões, como o all-MiniLM-L6-v2)
+# em cada backend e mede: tempo de indexação, abertura do banco já gravado (+ primeira
+# consulta), latência de uma consulta isolada e de um lote de consultas com e sem filtro
+# de metadados. Os embeddings das consultas são pré-calculados: só o banco entra na conta.
+#   python benchmarks/bench_vetores.py --tamanhos 1000 5000 20000 --backends chroma numpy faiss
+
+DIMENSAO = 384
+
+
+class VetoresSinteticos(Embeddings):
+    # Vetor determinístico por texto (o mesmo texto sempre gera o mesmo vetor)
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIMENSAO).tolist()
+
+
+def indexar(diretorio, backend, n, tamanho_lote=256):
+    banco = abrir_banco(diretorio, VetoresSinteticos(), backend=backend)
+    for inicio in range(0, n, tamanho_lote):
+        fim = min(n, inicio + tamanho_lote)
+        banco.add_texts(
+            [f"e-mail sintético {i}" for i in range(inicio, fim)],
+            metadatas=[{"de_nome": f"Func {i % 50}", "data_dia": 20080101 + i % 28} for i in range(inicio, fim)],
+            ids=[f"id_{i}" for i in range(inicio, fim)],
+        )
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - t0)
+    return np.median(tempos) * 1000
+
+
+def medir(backend, n, lote, repeticoes, k=4):
+    diretorio = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        t0 = time.perf_counter()
+        indexar(diretorio, backend, n)
+        indexacao = time.perf_counter() - t0
+
+        rng = np.random.default_rng(7)
+        consultas = rng.standard_normal((lote, DIMENSAO)).tolist()
+        filtro = {"$and": [{"de_nome": "Func 7"}, {"data_dia": {"$gte": 20080110}}]}
+
+        # Abertura a frio: objeto novo sobre os arquivos gravados + primeira consulta
+        t0 = time.perf_counter()
+        banco = abrir_banco(diretorio, VetoresSinteticos(), backend=backend)
+        consultar_vetores(banco, consultas[:1], k=k)
+        abertura = (time.perf_counter() - t0) * 1000
+
+        return {
+            "indexacao": indexacao,
+            "abertura": abertura,
+            "unitaria": cronometrar(lambda: banco.similarity_search_by_vector(consultas[0], k=k), repeticoes),
+            "lote": cronometrar(lambda: consultar_vetores(banco, consultas, k=k), repeticoes),
+            "lote_filtro": cronometrar(lambda: consultar_vetores(banco, consultas, k=k, filtro=filtro), repeticoes),
+        }
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1_000, 5_000, 20_000])
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy", "faiss"])
+    parser.add_argument("--lote", type=int, default=256, help="consultas por chamada em massa")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'chunks':>8} {'indexar (s)':>12} {'abrir (ms)':>11} {'1 consulta (ms)':>16} "
+          f"{f'lote {args.lote} (ms)':>15} {'lote+filtro (ms)':>17}")
+    for n in args.tamanhos:
+        for backend in args.backends:
+            try:
+                r = medir(backend, n, args.lote, args.repeticoes)
+            except ImportError as e:
+                print(f"{backend:>8} {n:>8,} não instalado ({e.name})")
+                continue
+            print(f"{backend:>8} {n:>8,} {r['indexacao']:>12.2f} {r['abertura']:>11.1f} {r['unitaria']:>16.2f} "
+                  f"{r['lote']:>15.1f} {r['lote_filtro']:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
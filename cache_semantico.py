@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from rastreamento import contar
+
+# --- CACHE SEMÂNTICO DE RESPOSTAS (Chat de RH e Investigação) ---
+# A chave é o embedding da pergunta: uma pergunta nova cuja similaridade de cosseno com
+# uma já respondida passa de LIMIAR_SIMILARIDADE reaproveita a resposta, sem busca no
+# Chroma nem chamada à LLM. Cada módulo tem seu espaço e sua versão (impressão do banco
+# vetorial + modelo); quando a versão muda, as respostas antigas daquele módulo somem.
+# Os vetores de cada módulo ficam numa matriz em memória para a busca ser um produto escalar.
+
+ARQUIVO_CACHE_SEMANTICO = "./cache_semantico.sqlite"
+LIMIAR_SIMILARIDADE = 0.92
+MAX_ENTRADAS_POR_MODULO = 1000
+
+
+def _normalizado(vetor):
+    vetor = np.asarray(vetor, dtype=np.float32)
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
+
+
+class CacheSemantico:
+    def __init__(self, caminho=ARQUIVO_CACHE_SEMANTICO, limiar=LIMIAR_SIMILARIDADE, max_entradas=MAX_ENTRADAS_POR_MODULO):
+        self.limiar = limiar
+        self.max_entradas = max_entradas
+        self.acertos = 0
+        self.falhas = 0
+        self._trava = threading.Lock()
+        self._matrizes = {}   # modulo -> (ids, matriz normalizada)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS respostas ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, modulo TEXT NOT NULL, versao TEXT NOT NULL, "
+            "pergunta TEXT NOT NULL, vetor BLOB NOT NULL, resposta TEXT NOT NULL, "
+            "criado_em REAL NOT NULL, acessado_em REAL NOT NULL)"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_modulo_acesso ON respostas (modulo, acessado_em)")
+        self._conexao.commit()
+
+    # --- INVALIDAÇÃO ---
+    def _validar_versao(self, modulo, versao):
+        # Chamado com a trava adquirida: apaga respostas geradas com outro banco/modelo
+        apagadas = self._conexao.execute(
+            "DELETE FROM respostas WHERE modulo = ? AND versao != ?", (modulo, versao)
+        ).rowcount
+        if apagadas:
+            self._conexao.commit()
+            self._matrizes.pop(modulo, None)
+
+    def _matriz(self, modulo):
+        if modulo not in self._matrizes:
+            linhas = self._conexao.execute("SELECT id, vetor FROM respostas WHERE modulo = ?", (modulo,)).fetchall()
+            ids = np.array([i for i, _ in linhas], dtype=np.int64)
+            matriz = (
+                np.stack([np.frombuffer(v, dtype=np.float32) for _, v in linhas])
+                if linhas else np.empty((0, 0), dtype=np.float32)
+            )
+            self._matrizes[modulo] = (ids, matriz)
+        return self._matrizes[modulo]
+
+    # --- LEITURA / ESCRITA ---
+    def buscar(self, modulo, versao, vetor):
+        # -> {"resposta", "pergunta", "similaridade"} da pergunta mais parecida, ou None
+        with self._trava:
+            self._validar_versao(modulo, versao)
+            ids, matriz = self._matriz(modulo)
+            if len(ids):
+                similaridades = matriz @ _normalizado(vetor)
+                melhor = int(np.argmax(similaridades))
+                if similaridades[melhor] >= self.limiar:
+                    id_resposta = int(ids[melhor])
+                    pergunta, resposta = self._conexao.execute(
+                        "SELECT pergunta, resposta FROM respostas WHERE id = ?", (id_resposta,)
+                    ).fetchone()
+                    self._conexao.execute("UPDATE respostas SET acessado_em = ? WHERE id = ?", (time.time(), id_resposta))
+                    self._conexao.commit()
+                    self.acertos += 1
+                    contar("cache_consultas", cache="semantico", resultado="acerto")
+                    return {"resposta": resposta, "pergunta": pergunta, "similaridade": float(similaridades[melhor])}
+            self.falhas += 1
+            contar("cache_consultas", cache="semantico", resultado="falha")
+            return None
+
+    def guardar(self, modulo, versao, pergunta, vetor, resposta):
+        agora = time.time()
+        with self._trava:
+            self._validar_versao(modulo, versao)
+            self._conexao.execute(
+                "INSERT INTO respostas (modulo, versao, pergunta, vetor, resposta, criado_em, acessado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (modulo, versao, pergunta, _normalizado(vetor).tobytes(), resposta, agora, agora),
+            )
+            self._despejar_lru(modulo)
+            self._conexao.commit()
+            self._matrizes.pop(modulo, None)
+
+    def _despejar_lru(self, modulo):
+        # Chamado com a trava adquirida
+        total = self._conexao.execute("SELECT COUNT(*) FROM respostas WHERE modulo = ?", (modulo,)).fetchone()[0]
+        excesso = total - self.max_entradas
+        if excesso > 0:
+            self._conexao.execute(
+                "DELETE FROM respostas WHERE id IN "
+                "(SELECT id FROM respostas WHERE modulo = ? ORDER BY acessado_em ASC LIMIT ?)",
+                (modulo, excesso),
+            )
+
+    def limpar(self, modulo=None):
+        with self._trava:
+            if modulo:
+                self._conexao.execute("DELETE FROM respostas WHERE modulo = ?", (modulo,))
+            else:
+                self._conexao.execute("DELETE FROM respostas")
+            self._conexao.commit()
+            self._matrizes.clear()
+
+    def estatisticas(self):
+        with self._trava:
+            total = self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+        consultas = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            "entradas": total,
+        }
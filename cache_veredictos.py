@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ingestao import ler_impressao
+from rastreamento import contar
+
+# --- CACHE DE VEREDITOS (SQLite, endereçado por conteúdo) ---
+# A chave é o hash de: prompt (template), entrada (transação + contexto), IDs dos chunks
+# recuperados e nome do modelo. Se nada disso mudou, o veredito da LLM é reaproveitado.
+# Quando o conteúdo de db_chroma/db_emails muda (reingestão ou reconstrução), a impressão
+# digital do manifesto de ingestão muda e o cache é esvaziado automaticamente.
+
+ARQUIVO_CACHE = "./cache_veredictos.sqlite"
+MAX_ENTRADAS = 200_000
+TTL_SEGUNDOS = 30 * 24 * 3600   # 30 dias
+
+
+def ids_dos_documentos(docs):
+    # Chroma devolve o ID de cada chunk; sem ID, usa o hash do conteúdo
+    return tuple(
+        d.id or hashlib.sha1(d.page_content.encode("utf-8")).hexdigest()
+        for d in docs
+    )
+
+
+def nome_do_modelo(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+def impressao_indice(diretorio):
+    # Hash dos (ID, hash do conteúdo) do manifesto de ingestão (ingestao.Manifesto): muda
+    # quando qualquer chunk entra, sai ou é reescrito no lugar, mesmo sem mudar o tamanho
+    # dos arquivos do banco.
+    if not os.path.exists(diretorio):
+        return "ausente"
+    return ler_impressao(diretorio) or "sem-manifesto"
+
+
+class CacheVeredictos:
+    def __init__(self, caminho=ARQUIVO_CACHE, max_entradas=MAX_ENTRADAS, ttl=TTL_SEGUNDOS, indices=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._trava = threading.Lock()
+        self._gravacoes = 0
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS veredictos ("
+            "chave TEXT PRIMARY KEY, resposta TEXT NOT NULL, criado_em REAL NOT NULL, acessado_em REAL NOT NULL)"
+        )
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_acesso ON veredictos (acessado_em)")
+        self._conexao.execute("CREATE TABLE IF NOT EXISTS indices (nome TEXT PRIMARY KEY, impressao TEXT NOT NULL)")
+        self._conexao.commit()
+        if indices:
+            self.sincronizar_indices(indices)
+        self._remover_expirados()
+
+    # --- CHAVES ---
+    def chave(self, prompt, entrada, ids_contexto, modelo):
+        material = json.dumps(
+            [prompt.pretty_repr(), entrada, list(ids_contexto or ()), modelo],
+            ensure_ascii=False, sort_keys=True, default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    # --- LEITURA / ESCRITA ---
+    def obter(self, chave):
+        agora = time.time()
+        with self._trava:
+            linha = self._conexao.execute(
+                "SELECT resposta, criado_em FROM veredictos WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha and agora - linha[1] <= self.ttl:
+                self._conexao.execute("UPDATE veredictos SET acessado_em = ? WHERE chave = ?", (agora, chave))
+                self._conexao.commit()
+                self.acertos += 1
+                contar("cache_consultas", cache="veredictos", resultado="acerto")
+                return linha[0]
+            self.falhas += 1
+            contar("cache_consultas", cache="veredictos", resultado="falha")
+            return None
+
+    def guardar(self, chave, resposta):
+        agora = time.time()
+        with self._trava:
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO veredictos (chave, resposta, criado_em, acessado_em) VALUES (?, ?, ?, ?)",
+                (chave, resposta, agora, agora),
+            )
+            self._conexao.commit()
+            self._gravacoes += 1
+            if self._gravacoes % 100 == 0:
+                self._despejar_lru()
+
+    # --- INVALIDAÇÃO E DESPEJO ---
+    def sincronizar_indices(self, indices):
+        # `indices`: {"rules": "./db_chroma", "emails": "./db_emails"}
+        with self._trava:
+            mudou = False
+            for nome, diretorio in indices.items():
+                atual = impressao_indice(diretorio)
+                linha = self._conexao.execute("SELECT impressao FROM indices WHERE nome = ?", (nome,)).fetchone()
+                if linha is None or linha[0] != atual:
+                    mudou = mudou or linha is not None
+                    self._conexao.execute("INSERT OR REPLACE INTO indices (nome, impressao) VALUES (?, ?)", (nome, atual))
+            if mudou:
+                self._conexao.execute("DELETE FROM veredictos")
+            self._conexao.commit()
+            return mudou
+
+    def _remover_expirados(self):
+        with self._trava:
+            self._conexao.execute("DELETE FROM veredictos WHERE criado_em < ?", (time.time() - self.ttl,))
+            self._conexao.commit()
+            self._despejar_lru()
+
+    def _despejar_lru(self):
+        # Chamado com a trava adquirida
+        total = self._conexao.execute("SELECT COUNT(*) FROM veredictos").fetchone()[0]
+        excesso = total - self.max_entradas
+        if excesso > 0:
+            self._conexao.execute(
+                "DELETE FROM veredictos WHERE chave IN "
+                "(SELECT chave FROM veredictos ORDER BY acessado_em ASC LIMIT ?)",
+                (excesso,),
+            )
+            self._conexao.commit()
+
+    def estatisticas(self):
+        with self._trava:
+            total = self._conexao.execute("SELECT COUNT(*) FROM veredictos").fetchone()[0]
+        consultas = self.acertos + self.falhas
+        return {
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            "entradas": total,
+        }
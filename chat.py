@@ -1,12 +1,25 @@
 import streamlit as st
 import pandas as pd
 import os
-import time
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
+from auditoria_async import ResultadoAuditoria, Verificacao, rodar_auditoria
+import cliente_servico
+from cache_veredictos import CacheVeredictos, ids_dos_documentos, impressao_indice, nome_do_modelo
+from cache_semantico import CacheSemantico
+from latencia import MedidorStream
+from banco_vetorial import abrir_banco, diretorio_banco
+from modelo_embeddings import backend_embeddings, criar_embeddings
+from recuperacao import buscar_em_lote
+from rastreamento import conteudo_com_uso, coletor_atual, etapa, serie
+from indice_pessoas import emails_por_transacao
+from jobs_auditoria import (
+    ESTADO_CANCELADO, ESTADO_CONCLUIDO, ESTADO_ERRO, ESTADO_EXECUTANDO, ESTADO_INTERROMPIDO,
+    GerenciadorJobs, JobCancelado,
+)
+from regras_compliance import ARQUIVO_POLITICA, SITUACAO_CONFORME, carregar_regras, triar_transacoes
+import perfis_risco
+import transacoes
 
 # --- CONFIGURAÇÃO INICIAL ---
 load_dotenv()
@@ -18,17 +31,26 @@ st.set_page_config(
 
 # --- ARQUIVOS E DIRETÓRIOS ---
 ARQUIVO_CSV = "transacoes_bancarias.csv"
-DB_COMPLIANCE = "./db_chroma"
-DB_EMAILS = "./db_emails"
+DB_COMPLIANCE = diretorio_banco("./db_chroma")
+DB_EMAILS = diretorio_banco("./db_emails")
+CONCORRENCIA_MAX = 8
+REQUISICOES_POR_SEGUNDO = 4
+JANELA_EMAILS_DIAS = 7
+INTERVALO_ATUALIZACAO = 2      # Segundos entre atualizações do painel enquanto o job roda
+ORCAMENTO_PADRAO = 15          # Transações mais arriscadas enviadas à IA por varredura (0 = fila toda)
 
 # --- CACHE DE RECURSOS (Para não recarregar a cada clique) ---
 @st.cache_resource
 def get_llm():
-    return ChatGroq(model_name="llama-3.1-8b-instant")
+    from llm_resiliente import criar_llm
+
+    # Uma instância para todas as sessões: retentativas, modelo reserva e perguntas idênticas
+    # em andamento compartilhadas entre os analistas (ver llm_resiliente.py)
+    return criar_llm()
 
 @st.cache_resource
 def get_embeddings():
-    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    return criar_embeddings()
 
 @st.cache_resource
 def get_vectorstore(tipo):
@@ -36,7 +58,44 @@ def get_vectorstore(tipo):
     diretorio = DB_COMPLIANCE if tipo == "rules" else DB_EMAILS
     if not os.path.exists(diretorio):
         return None
-    return Chroma(persist_directory=diretorio, embedding_function=embeddings)
+    return abrir_banco(diretorio, embeddings)
+
+@st.cache_data
+def get_regras():
+    return carregar_regras(ARQUIVO_POLITICA)
+
+@st.cache_resource
+def get_cache_veredictos():
+    return CacheVeredictos()
+
+@st.cache_resource
+def get_cache_semantico():
+    return CacheSemantico()
+
+@st.cache_resource
+def get_gerenciador_jobs():
+    # Um só executor para o servidor: os jobs sobrevivem a reruns e trocas de página
+    return GerenciadorJobs()
+
+@st.cache_data
+def get_transacoes(caminho, modificado_em):
+    # Mesma chave dos KPIs: o dataset Parquet só é relido (e o cache conferido) quando o CSV muda
+    return transacoes.carregar_transacoes(caminho)
+
+@st.cache_data
+def get_kpis(caminho, modificado_em):
+    # `modificado_em` (mtime) faz parte da chave: os agregados só são relidos quando o CSV muda
+    return transacoes.kpis(caminho)
+
+@st.cache_data
+def get_estatisticas(caminho, modificado_em):
+    # Frequências e médias do arquivo inteiro: a triagem de um funcionário só dá o mesmo resultado
+    return transacoes.estatisticas_triagem(caminho)
+
+@st.cache_data
+def get_perfis(caminho, versao, tipo):
+    # `versao` = mtime do CSV + impressão do banco de e-mails: o índice só é relido quando mudam
+    return perfis_risco.carregar_perfis(caminho, DB_EMAILS, tipo)
 
 # --- CSS CUSTOMIZADO (Estilo Dunder Mifflin) ---
 st.markdown("""
@@ -63,53 +122,164 @@ with st.sidebar:
         st.rerun()
 
 # --- FUNÇÃO: AUDITORIA INTELIGENTE ---
-def executar_auditoria(df_filtrado):
+def montar_auditoria_remota():
+    # Cliente fino: quem recupera contexto e chama a IA é o servico.py (TOBY_SERVICO_URL)
+    def auditar(df_filtrado, ao_concluir, cancelamento):
+        for evento in cliente_servico.auditar(ids=df_filtrado['id_transacao'].tolist()):
+            if cancelamento.is_set():
+                raise JobCancelado()
+            if "linha" in evento:
+                ao_concluir(ResultadoAuditoria(linha=evento["linha"], regras=evento["regras"], fraude=evento["fraude"],
+                                              erro=evento.get("erro")))
+            elif "desempenho" in evento and coletor_atual():
+                # Etapas medidas no serviço entram no relatório do job
+                coletor_atual().importar(evento["desempenho"])
+
+    return auditar
+
+def montar_auditoria():
+    if cliente_servico.servico_configurado():
+        return montar_auditoria_remota()
+
+    # Resolve os recursos aqui (thread do script) e devolve a função que o job executa
+    # em segundo plano. Nada dentro de `auditar` chama st.*: os resultados vão para o disco.
     llm = get_llm()
     v_rules = get_vectorstore("rules")
     v_emails = get_vectorstore("emails")
     
     if not v_rules or not v_emails:
         st.error("Bancos de dados não encontrados. Rode etapa 1 e 2 primeiro.")
-        return
+        return None
 
-    progress_bar = st.progress(0)
-    total = len(df_filtrado)
-    
-    for index, row in df_filtrado.iterrows():
-        # Atualiza barra
-        progress = (index + 1) / total if total > 0 else 0 # (index relativo seria melhor, mas para demo serve)
-        # Ajuste simples da barra apenas visual
-        progress_bar.progress(min(int(((list(df_filtrado.index).index(index) + 1) / total) * 100), 100))
+    cache = get_cache_veredictos()
+
+    prompt_r = ChatPromptTemplate.from_template("Analise se viola regras. Transacao: {t}. Regras: {c}. Se violar, comece com REPROVADO. Se não, APROVADO. Seja breve.")
+    prompt_f = ChatPromptTemplate.from_template("Analise risco de fraude cruzando com emails. Transacao: {t}. Emails: {c}. Se houver indicio forte, comece com ALTO RISCO. Se não, BAIXO RISCO. Seja breve.")
+
+    def auditar(df_filtrado, ao_concluir, cancelamento):
+        # Reaproveita vereditos de varreduras anteriores (esvazia se os bancos foram reconstruídos)
+        cache.sincronizar_indices({"rules": DB_COMPLIANCE, "emails": DB_EMAILS})
+
+        # Recuperação em lote: embeddings e buscas de todas as linhas de uma vez, sem consultas repetidas
+        docs_por_regra = buscar_em_lote(v_rules, "regras " + df_filtrado['categoria'].astype(str) + " limite valor", k=2)
+        # E-mails só do funcionário, em ±JANELA_EMAILS_DIAS dias da transação
+        docs_por_email = emails_por_transacao(
+            v_emails, DB_EMAILS, df_filtrado,
+            df_filtrado['funcionario'].astype(str) + " " + df_filtrado['descricao'].astype(str) + " esquema fraude",
+            k=3, janela_dias=JANELA_EMAILS_DIAS,
+        )
+
+        def preparar(row):
+            if cancelamento.is_set():
+                raise JobCancelado()
+            transacao_str = f"Func: {row['funcionario']} | Item: {row['descricao']} | Valor: ${row['valor']:.2f} | Cat: {row['categoria']}"
+
+            # 1. Checar Regras
+            docs_regras = docs_por_regra[f"regras {row['categoria']} limite valor"]
+            ctx_regras = "\n".join([d.page_content for d in docs_regras])
+
+            # 2. Checar Fraude
+            docs_emails = docs_por_email[row['id_transacao']]
+            ctx_emails = "\n".join([d.page_content for d in docs_emails])
+
+            return (
+                Verificacao(prompt_r, {"t": transacao_str, "c": ctx_regras}, ids_dos_documentos(docs_regras)),
+                Verificacao(prompt_f, {"t": transacao_str, "c": ctx_emails}, ids_dos_documentos(docs_emails)),
+            )
 
-        transacao_str = f"Func: {row['funcionario']} | Item: {row['descricao']} | Valor: ${row['valor']} | Cat: {row['categoria']}"
+        rodar_auditoria(
+            df_filtrado, llm, preparar, ao_concluir,
+            concorrencia=CONCORRENCIA_MAX,
+            requisicoes_por_segundo=REQUISICOES_POR_SEGUNDO,
+            cache=cache,
+        )
+
+    return auditar
+
+def exibir_card(registro):
+    row = registro["linha"]
+    res_regras = registro["regras"]
+    res_fraude = registro["fraude"]
+
+    if registro.get("erro"):
+        # Transação que a IA não conseguiu analisar: "Retomar varredura" tenta de novo
+        with st.expander(f"⚠️ {row['id_transacao']} | {row['funcionario']} - ${row['valor']:.2f}"):
+            st.warning(f"Não analisada: {registro['erro']}")
+        return
+
+    with st.expander(f"💰 {row['id_transacao']} | {row['funcionario']} - ${row['valor']:.2f}", expanded=("REPROVADO" in res_regras or "ALTO RISCO" in res_fraude)):
+        col1, col2 = st.columns(2)
         
-        # 1. Checar Regras
-        docs_regras = v_rules.similarity_search(f"regras {row['categoria']} limite valor", k=2)
-        ctx_regras = "\n".join([d.page_content for d in docs_regras])
-        prompt_r = ChatPromptTemplate.from_template("Analise se viola regras. Transacao: {t}. Regras: {c}. Se violar, comece com REPROVADO. Se não, APROVADO. Seja breve.")
-        res_regras = (prompt_r | llm).invoke({"t": transacao_str, "c": ctx_regras}).content
-
-        # 2. Checar Fraude
-        docs_emails = v_emails.similarity_search(f"{row['funcionario']} {row['descricao']} esquema fraude", k=3)
-        ctx_emails = "\n".join([d.page_content for d in docs_emails])
-        prompt_f = ChatPromptTemplate.from_template("Analise risco de fraude cruzando com emails. Transacao: {t}. Emails: {c}. Se houver indicio forte, comece com ALTO RISCO. Se não, BAIXO RISCO. Seja breve.")
-        res_fraude = (prompt_f | llm).invoke({"t": transacao_str, "c": ctx_emails}).content
-
-        # 3. Exibir Card
-        with st.expander(f"💰 {row['id_transacao']} | {row['funcionario']} - ${row['valor']}", expanded=("REPROVADO" in res_regras or "ALTO RISCO" in res_fraude)):
-            col1, col2 = st.columns(2)
-            
-            # Card Compliance
-            if "REPROVADO" in res_regras:
-                col1.markdown(f'<div class="status-box status-risk"><b>📜 Compliance:</b> {res_regras}</div>', unsafe_allow_html=True)
-            else:
-                col1.markdown(f'<div class="status-box status-ok"><b>📜 Compliance:</b> Aprovado</div>', unsafe_allow_html=True)
-            
-            # Card Fraude
-            if "ALTO RISCO" in res_fraude:
-                col2.markdown(f'<div class="status-box status-risk"><b>🚨 Investigação:</b> {res_fraude}</div>', unsafe_allow_html=True)
-            else:
-                col2.markdown(f'<div class="status-box status-ok"><b>🚨 Investigação:</b> Sem indícios</div>', unsafe_allow_html=True)
+        # Card Compliance
+        if "REPROVADO" in res_regras:
+            col1.markdown(f'<div class="status-box status-risk"><b>📜 Compliance:</b> {res_regras}</div>', unsafe_allow_html=True)
+        else:
+            col1.markdown(f'<div class="status-box status-ok"><b>📜 Compliance:</b> Aprovado</div>', unsafe_allow_html=True)
+        
+        # Card Fraude
+        if "ALTO RISCO" in res_fraude:
+            col2.markdown(f'<div class="status-box status-risk"><b>🚨 Investigação:</b> {res_fraude}</div>', unsafe_allow_html=True)
+        else:
+            col2.markdown(f'<div class="status-box status-ok"><b>🚨 Investigação:</b> Sem indícios</div>', unsafe_allow_html=True)
+
+def painel_desempenho(relatorio):
+    # Onde foram o tempo e os tokens da última execução do job (ver rastreamento.py)
+    contadores = relatorio["contadores"]
+    with st.expander("⚙️ Desempenho"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Chamadas à IA", contadores.get("chamadas_llm", 0))
+        col2.metric("Tokens (entrada / saída)",
+                    f"{contadores.get(serie('tokens_llm', tipo='entrada'), 0):,} / {contadores.get(serie('tokens_llm', tipo='saida'), 0):,}")
+        col3.metric("Cache de vereditos (acertos / falhas)",
+                    f"{contadores.get(serie('cache_consultas', cache='veredictos', resultado='acerto'), 0)} / "
+                    f"{contadores.get(serie('cache_consultas', cache='veredictos', resultado='falha'), 0)}")
+        col4.metric("Retentativas da API", contadores.get("llm_retentativas", 0),
+                    help=f"{sum(v for k, v in contadores.items() if k.startswith('llm_reserva'))} chamadas foram para o modelo reserva")
+
+        if relatorio["etapas"]:
+            etapas = pd.DataFrame.from_dict(relatorio["etapas"], orient="index").sort_values("total_s", ascending=False)
+            st.bar_chart(etapas["total_s"])
+            st.dataframe(etapas, use_container_width=True)
+        st.caption(f"Execução de {relatorio['duracao_s']:.1f} s. O tempo por etapa é somado entre as chamadas "
+                   "em paralelo, então pode passar da duração total.")
+
+def painel_job(job_id, atualizando):
+    # Redesenhado a partir dos resultados gravados; enquanto o job roda, o fragmento
+    # se atualiza sozinho a cada INTERVALO_ATUALIZACAO segundos sem rerodar a página
+    gerenciador = get_gerenciador_jobs()
+    status = gerenciador.status(job_id)
+    if atualizando and not gerenciador.ativo(job_id):
+        st.rerun()  # Job terminou: um rerun completo desliga a atualização automática
+
+    total = status["total"]
+    st.progress(min(status["concluidas"] / total, 1.0) if total else 1.0)
+    st.caption(f"Job `{job_id}` · {status['descricao']} · {status['estado']} · {status['concluidas']}/{total} transações")
+
+    if status["estado"] == ESTADO_EXECUTANDO:
+        if st.button("⏹️ Cancelar varredura"):
+            gerenciador.cancelar(job_id)
+    elif status["estado"] in (ESTADO_CANCELADO, ESTADO_INTERROMPIDO, ESTADO_ERRO):
+        if status["erro"]:
+            st.error(f"Erro na varredura: {status['erro']}")
+        if st.button("▶️ Retomar varredura"):
+            auditar = montar_auditoria()
+            if auditar:
+                gerenciador.iniciar(job_id, auditar)
+                st.rerun()
+    elif status["estado"] == ESTADO_CONCLUIDO:
+        st.success("Varredura Completa!")
+
+    if not cliente_servico.servico_configurado():
+        stats = get_cache_veredictos().estatisticas()
+        st.caption(f"💾 Cache de vereditos: {stats['acertos']} acertos / {stats['falhas']} falhas "
+                   f"({stats['taxa_acerto']:.0%}) · {stats['entradas']} vereditos guardados")
+
+    relatorio = gerenciador.desempenho(job_id)
+    if relatorio:
+        painel_desempenho(relatorio)
+
+    for registro in gerenciador.resultados(job_id):
+        exibir_card(registro)
 
 # --- LÓGICA DAS PÁGINAS ---
 
@@ -132,22 +302,47 @@ if modo in ["💬 Consultor de RH", "🕵️‍♂️ Investigação Forense"]:
 
         # Seleciona o DB correto
         tipo_db = "rules" if modo == "💬 Consultor de RH" else "emails"
-        vectorstore = get_vectorstore(tipo_db)
-        
-        if vectorstore:
+
+        if cliente_servico.servico_configurado():
+            # O serviço já tem modelo, bancos e cache semântico carregados: só repassa os tokens
+            with st.chat_message("assistant"):
+                medidor = MedidorStream(cliente_servico.perguntar(tipo_db, prompt), origem=f"chat-servico-{tipo_db}")
+                resposta = st.write_stream(medidor)
+                st.caption(f"⏱️ {medidor.resumo()}")
+            st.session_state.messages.append({"role": "assistant", "content": resposta})
+        elif vectorstore := get_vectorstore(tipo_db):
             with st.spinner("Processando..."):
-                docs = vectorstore.similarity_search(prompt, k=4)
-                contexto = "\n\n".join([d.page_content for d in docs])
-                
-                sys_prompt = "Você é o Toby do RH. Responda com base no contexto." if tipo_db == "rules" else "Você é um Detetive. Responda com base nos e-mails."
-                
-                template = ChatPromptTemplate.from_messages([("system", sys_prompt), ("human", "Contexto: {c}\nPergunta: {p}")])
-                chain = template | get_llm()
-                resposta = chain.invoke({"c": contexto, "p": prompt})
-                
-                with st.chat_message("assistant"):
-                    st.markdown(resposta.content)
-                st.session_state.messages.append({"role": "assistant", "content": resposta.content})
+                # Pergunta parecida já respondida com o mesmo banco e modelo: responde do cache
+                cache_semantico = get_cache_semantico()
+                versao = f"{impressao_indice(DB_COMPLIANCE if tipo_db == 'rules' else DB_EMAILS)}:{nome_do_modelo(get_llm())}:{backend_embeddings()}"
+                with etapa("embeddings"):
+                    vetor = get_embeddings().embed_query(prompt)
+                em_cache = cache_semantico.buscar(tipo_db, versao, vetor)
+
+                if not em_cache:
+                    # O embedding da pergunta é reaproveitado na busca
+                    with etapa("busca_vetorial"):
+                        docs = vectorstore.similarity_search_by_vector(vetor, k=4)
+                    contexto = "\n\n".join([d.page_content for d in docs])
+            
+            with st.chat_message("assistant"):
+                if em_cache:
+                    resposta = em_cache["resposta"]
+                    st.markdown(resposta)
+                    st.caption(f"⚡ Resposta do cache (pergunta parecida: \"{em_cache['pergunta']}\", "
+                               f"similaridade {em_cache['similaridade']:.2f})")
+                else:
+                    sys_prompt = "Você é o Toby do RH. Responda com base no contexto." if tipo_db == "rules" else "Você é um Detetive. Responda com base nos e-mails."
+                    
+                    template = ChatPromptTemplate.from_messages([("system", sys_prompt), ("human", "Contexto: {c}\nPergunta: {p}")])
+                    chain = template | get_llm()
+                    # Streaming: os tokens aparecem conforme chegam, em vez de esperar a resposta inteira
+                    # (conteudo_com_uso extrai o texto e registra os tokens gastos no fim)
+                    medidor = MedidorStream(conteudo_com_uso(chain.stream({"c": contexto, "p": prompt})), origem=f"chat-{tipo_db}")
+                    resposta = st.write_stream(medidor)
+                    st.caption(f"⏱️ {medidor.resumo()}")
+                    cache_semantico.guardar(tipo_db, versao, prompt, vetor, resposta)
+            st.session_state.messages.append({"role": "assistant", "content": resposta})
 
 # 2. MÓDULO DE AUDITORIA (O Principal)
 elif modo == "📊 Auditoria Financeira":
@@ -155,31 +350,65 @@ elif modo == "📊 Auditoria Financeira":
     st.markdown("Cruza transações bancárias com regras de compliance e dumps de e-mail.")
 
     if os.path.exists(ARQUIVO_CSV):
-        df = pd.read_csv(ARQUIVO_CSV)
+        modificado_em = os.path.getmtime(ARQUIVO_CSV)
+        kpis = get_kpis(ARQUIVO_CSV, modificado_em)
+        gerenciador = get_gerenciador_jobs()
         
         col_kpi1, col_kpi2, col_kpi3 = st.columns(3)
-        col_kpi1.metric("Total de Transações", len(df))
-        col_kpi2.metric("Volume Financeiro", f"${df['valor'].sum():,.2f}")
+        col_kpi1.metric("Total de Transações", kpis["transacoes"])
+        col_kpi2.metric("Volume Financeiro", f"${kpis['volume']:,.2f}")
         
         st.markdown("### Configurar Auditoria")
         
-        filtro_usuario = st.selectbox("Filtrar Funcionário:", ["Todos", "Michael Scott", "Kevin Malone", "Ryan Howard"])
+        # Perfis de risco pré-calculados (perfis_risco.py): quem e o que concentra o risco
+        versao_perfis = f"{modificado_em}:{impressao_indice(DB_EMAILS)}"
+        with st.expander("🎯 Perfis de risco"):
+            aba_funcionarios, aba_categorias = st.tabs(["Funcionários", "Categorias"])
+            aba_funcionarios.dataframe(get_perfis(ARQUIVO_CSV, versao_perfis, "funcionarios"), use_container_width=True, hide_index=True)
+            aba_categorias.dataframe(get_perfis(ARQUIVO_CSV, versao_perfis, "categorias"), use_container_width=True, hide_index=True)
+
+        orcamento = st.number_input(
+            "Orçamento da IA (transações mais arriscadas):", min_value=0, value=ORCAMENTO_PADRAO, step=5,
+            help="A fila de prioridade soma o perfil de risco à triagem das regras; 0 envia a fila inteira.",
+        )
         
         if st.button("🚀 INICIAR VARREDURA DO SISTEMA"):
-            st.write("Iniciando Agentes de IA...")
-            
-            # Lógica de Filtro para Demo
-            if filtro_usuario == "Todos":
-                df_analise = df.head(10) # Trava de segurança
-            else:
-                df_analise = df[df['funcionario'] == filtro_usuario]
-                # Se for Michael, pega aquelas especificas que vimos
-                if filtro_usuario == "Michael Scott":
-                     df_analise = df_analise.head(15) 
-
-            col_kpi3.metric("Transações em Análise", len(df_analise))
-            executar_auditoria(df_analise)
-            st.success("Varredura Completa!")
+            df = get_transacoes(ARQUIVO_CSV, modificado_em)
+
+            # Pré-filtro determinístico: transações claramente conformes não gastam chamadas de IA,
+            # a menos que o perfil de risco as coloque na fila
+            df = df.join(triar_transacoes(df, get_regras(), get_estatisticas(ARQUIVO_CSV, modificado_em)))
+            df = perfis_risco.priorizar(df, get_perfis(ARQUIVO_CSV, versao_perfis, "transacoes"))
+            df_analise = perfis_risco.fila_prioridade(df, limite=orcamento or None)
+            conformes = df['situacao'] == SITUACAO_CONFORME
+            st.caption(f"⚖️ {conformes.sum()} transações aprovadas direto pelas regras da política; "
+                       f"{len(df_analise)} enviadas à IA, das mais arriscadas para as menos.")
+
+            auditar = montar_auditoria()
+            if auditar:
+                st.write("Iniciando Agentes de IA...")
+                descricao = f"Top {orcamento} por risco" if orcamento else "Fila completa por risco"
+                job_id = gerenciador.criar(df_analise, descricao=descricao)
+                gerenciador.iniciar(job_id, auditar)
+                st.session_state.job_auditoria = job_id
+
+        # Varreduras anteriores (inclusive de outras sessões) podem ser reabertas e retomadas
+        jobs = gerenciador.listar()
+        if jobs:
+            with st.expander("📁 Varreduras anteriores"):
+                escolhido = st.selectbox(
+                    "Job:", [j["id"] for j in jobs],
+                    format_func=lambda i: next(f"{i} · {j['descricao']} · {j['estado']} ({j['concluidas']}/{j['total']})" for j in jobs if j["id"] == i),
+                )
+                if st.button("Abrir varredura"):
+                    st.session_state.job_auditoria = escolhido
+
+        job_id = st.session_state.get("job_auditoria")
+        if job_id:
+            status = gerenciador.status(job_id)
+            col_kpi3.metric("Transações em Análise", status["total"])
+            atualizando = gerenciador.ativo(job_id)
+            st.fragment(painel_job, run_every=INTERVALO_ATUALIZACAO if atualizando else None)(job_id, atualizando)
             
     else:
         st.error("Arquivo CSV não encontrado.")
\ No newline at end of file
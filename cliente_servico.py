@@ -0,0 +1,70 @@
+import json
+import os
+
+# --- CLIENTE DO SERVIÇO DE AUDITORIA ---
+# Com TOBY_SERVICO_URL definido (ex: http://127.0.0.1:8765), os scripts e o Streamlit
+# viram clientes finos do servico.py: nada de carregar modelo de embeddings, Chroma ou
+# ChatGroq no próprio processo. As respostas chegam em NDJSON (um evento JSON por linha).
+
+VARIAVEL_URL = "TOBY_SERVICO_URL"
+TIMEOUT_CONEXAO = 10   # segundos; a leitura não tem limite (auditorias longas em streaming)
+
+_cliente = None
+
+
+def url_servico():
+    return os.getenv(VARIAVEL_URL, "").rstrip("/")
+
+
+def servico_configurado():
+    return bool(url_servico())
+
+
+def _http():
+    # Um único cliente HTTP por processo: as conexões com o serviço ficam abertas (keep-alive)
+    global _cliente
+    if _cliente is None:
+        import httpx
+
+        _cliente = httpx.Client(base_url=url_servico(), timeout=httpx.Timeout(TIMEOUT_CONEXAO, read=None))
+    return _cliente
+
+
+def _eventos(rota, dados):
+    with _http().stream("POST", rota, json=dados) as resposta:
+        resposta.raise_for_status()
+        for linha in resposta.iter_lines():
+            if not linha.strip():
+                continue
+            evento = json.loads(linha)
+            # Erro de uma transação vem junto da linha; sozinho, é o stream inteiro que falhou
+            if "erro" in evento and "linha" not in evento:
+                raise RuntimeError(f"Serviço de auditoria: {evento['erro']}")
+            yield evento
+
+
+def perguntar(modulo, pergunta):
+    # Gerador de tokens da resposta ("rules" = Consultor de RH, "emails" = Investigação)
+    for evento in _eventos("/ask", {"modulo": modulo, "pergunta": pergunta}):
+        if "token" in evento:
+            yield evento["token"]
+
+
+def auditar(funcionario=None, ids=None, limite=None):
+    # Primeiro evento: {"resumo": {...}}; depois um {"linha", "regras", "fraude"} por transação,
+    # das mais arriscadas para as menos (`limite` = orçamento em transações)
+    dados = {}
+    if funcionario:
+        dados["funcionario"] = funcionario
+    if ids is not None:
+        dados["ids"] = list(ids)
+    if limite:
+        dados["limite"] = int(limite)
+    yield from _eventos("/audit", dados)
+
+
+def ingerir(fontes=("politica", "emails")):
+    # -> {"politica": resumo, "emails": resumo} (novos/alterados/removidos/inalterados)
+    resposta = _http().post("/ingest", json={"fontes": list(fontes)})
+    resposta.raise_for_status()
+    return resposta.json()
@@ -1,76 +1,82 @@
 import os
 from dotenv import load_dotenv
 
-# Importações LangChain + Groq + HuggingFace
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings  
-from langchain_groq import ChatGroq  
-from langchain_chroma import Chroma
+# Importações LangChain + Groq + HuggingFace (as pesadas ficam dentro das funções:
+# o cliente fino do serviço não precisa carregar modelo nenhum)
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from banco_vetorial import abrir_banco, diretorio_banco
+from ingestao import dividir_politica, sincronizar_indice
+from latencia import MedidorStream
+from modelo_embeddings import EmbeddingsMedidos, criar_embeddings
+from rastreamento import etapa
+import cliente_servico
 
 # Carrega variáveis
 load_dotenv()
 
-# Verifica se a chave da Groq existe
-if not os.getenv("GROQ_API_KEY"):
-    print("❌ Erro: Adicione a GROQ_API_KEY no seu arquivo .env")
-    exit()
+DIRETORIO_DB = diretorio_banco("./db_chroma")   # ./db_chroma_numpy com TOBY_VETORES=numpy/faiss
 
-def carregar_e_indexar():
-    print("📂 Toby está lendo 'politica_compliance.txt'...")
+TEMPLATE_TOBY = """
+    Você é o Toby Flenderson, do RH da Dunder Mifflin.
+    Responda à pergunta do funcionário usando APENAS o contexto abaixo.
+    
+    Se a resposta estiver no texto, cite a seção ou regra específica.
+    Se não estiver, diga que não sabe e mande falar com o Michael.
+    Mantenha um tom profissional, levemente desanimado e burocrático.
+    
+    Contexto:
+    {context}
     
-    # 1. Carregar o arquivo que você subiu
+    Pergunta: {question}
+    """
+
+def carregar_e_indexar(embeddings=None, diretorio=DIRETORIO_DB):
+    # 1. Carregar o arquivo que você subiu (quem chama decide o que fazer se faltar: o
+    # script encerra, o servico.py responde 500)
     if not os.path.exists("politica_compliance.txt"):
-        print("❌ Erro: O arquivo 'politica_compliance.txt' não foi encontrado na pasta!")
-        exit()
+        raise FileNotFoundError("O arquivo 'politica_compliance.txt' não foi encontrado na pasta!")
+
+    print("📂 Toby está lendo 'politica_compliance.txt'...")
+
+    # Só agora (arquivo existe) vale pagar a importação do LangChain Community
+    from langchain_community.document_loaders import TextLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
         
     loader = TextLoader("politica_compliance.txt", encoding="utf-8")
     docs = loader.load()
     
-    # 2. Dividir (Chunking)
+    # 2. Dividir (Chunking) - por seção, com IDs estáveis
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=600, 
         chunk_overlap=100,
         separators=["\n\n", "\n", " ", ""] # Tenta quebrar por parágrafos primeiro
     )
-    splits = text_splitter.split_documents(docs)
+    with etapa("divisao_texto"):
+        splits = dividir_politica(docs[0].page_content, text_splitter)
     
     print(f"📄 Documento dividido em {len(splits)} pedaços.")
 
-    # 3. Vetorizar 
+    # 3. Vetorizar (só o que é novo ou mudou desde a última execução)
     print("🧠 Criando conexões neurais (Embeddings)...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    if embeddings is None:
+        embeddings = criar_embeddings()
     
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory="./db_chroma"
-    )
-    return vectorstore
+    vectorstore = abrir_banco(diretorio, EmbeddingsMedidos(embeddings))
+    resumo = sincronizar_indice(vectorstore, splits, diretorio)
+    print(f"💾 Índice sincronizado: {resumo['novos']} novos, {resumo['alterados']} alterados, "
+          f"{resumo['removidos']} removidos, {resumo['inalterados']} sem mudança.")
+    return vectorstore, resumo
 
 def configurar_chat(vectorstore):
-    llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0)
+    from llm_resiliente import criar_llm
+
+    llm = criar_llm(temperature=0)
 
     retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
 
-    template = """
-    Você é o Toby Flenderson, do RH da Dunder Mifflin.
-    Responda à pergunta do funcionário usando APENAS o contexto abaixo.
-    
-    Se a resposta estiver no texto, cite a seção ou regra específica.
-    Se não estiver, diga que não sabe e mande falar com o Michael.
-    Mantenha um tom profissional, levemente desanimado e burocrático.
-    
-    Contexto:
-    {context}
-    
-    Pergunta: {question}
-    """
-    
-    prompt = ChatPromptTemplate.from_template(template)
+    prompt = ChatPromptTemplate.from_template(TEMPLATE_TOBY)
 
     chain = (
         {"context": retriever, "question": RunnablePassthrough()}
@@ -82,15 +88,27 @@ def configurar_chat(vectorstore):
     return chain
 
 if __name__ == "__main__":
-    # Verifica se já processou antes para ganhar tempo
-    if os.path.exists("./db_chroma"):
-        print("💾 Carregando banco de dados existente...")
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vectorstore = Chroma(persist_directory="./db_chroma", embedding_function=embeddings)
+    if cliente_servico.servico_configurado():
+        # Cliente fino: ingestão e respostas rodam no serviço já aquecido
+        print(f"🌐 Usando o serviço em {cliente_servico.url_servico()}...")
+        resumo = cliente_servico.ingerir(["politica"])["politica"]
+        print(f"💾 Índice sincronizado: {resumo['novos']} novos, {resumo['alterados']} alterados, "
+              f"{resumo['removidos']} removidos, {resumo['inalterados']} sem mudança.")
+        bot = None
     else:
-        vectorstore = carregar_e_indexar()
+        # Verifica se a chave da Groq existe
+        if not os.getenv("GROQ_API_KEY"):
+            print("❌ Erro: Adicione a GROQ_API_KEY no seu arquivo .env")
+            exit()
+
+        # Ingestão incremental: se nada mudou na política, nenhum embedding é recalculado
+        try:
+            vectorstore, _ = carregar_e_indexar()
+        except FileNotFoundError as e:
+            print(f"❌ Erro: {e}")
+            exit()
 
-    bot = configurar_chat(vectorstore)
+        bot = configurar_chat(vectorstore)
 
     print("\n--- 👔 CHATBOT TOBY (Versão Grátis/Groq) ---")
     print("Toby: O que vocês querem agora? Estou tentando trabalhar...")
@@ -101,5 +119,10 @@ if __name__ == "__main__":
             break
             
         print("Toby: *suspiro* Deixe-me verificar...")
-        resposta = bot.invoke(pergunta)
-        print(f"Toby: {resposta}")
\ No newline at end of file
+        # Streaming: cada token aparece assim que chega da Groq
+        tokens = bot.stream(pergunta) if bot else cliente_servico.perguntar("rules", pergunta)
+        medidor = MedidorStream(tokens, origem="etapa01")
+        print("Toby: ", end="", flush=True)
+        for token in medidor:
+            print(token, end="", flush=True)
+        print(f"\n   ⏱️  {medidor.resumo()}")
\ No newline at end of file
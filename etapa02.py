@@ -1,59 +1,23 @@
 import os
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_chroma import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from dotenv import load_dotenv
+from banco_vetorial import abrir_banco, diretorio_banco
+from ingestao import sincronizar_indice
+from parser_emails import documentos_emails
+from indice_pessoas import IndicePessoas
+from modelo_embeddings import EmbeddingsMedidos, criar_embeddings
+from rastreamento import etapa, registrar_uso
+import cliente_servico
 
 # Carrega as chaves do .env
 load_dotenv()
 
 # --- CONFIGURAÇÃO ---
 ARQUIVO_EMAILS = "emails.txt"  # Nome exato do seu arquivo enviado
-DIRETORIO_DB = "./db_emails"   # Pasta separada para a investigação
+DIRETORIO_DB = diretorio_banco("./db_emails")   # Pasta separada para a investigação
 
-def realizar_investigacao():
-    print("🕵️‍♂️  Iniciando Protocolo de Investigação 'Toby-Holmes'...")
-
-    # 1. Carregar e Processar o Dump de E-mails
-    if not os.path.exists(ARQUIVO_EMAILS):
-        raise FileNotFoundError(f"O arquivo {ARQUIVO_EMAILS} não foi encontrado!")
-
-    print(f"📂 Lendo evidências em '{ARQUIVO_EMAILS}'...")
-    with open(ARQUIVO_EMAILS, "r", encoding="utf-8") as f:
-        texto_emails = f.read()
-
- 
-    text_splitter = CharacterTextSplitter(
-        separator="-------------------------------------------------------------------------------",
-        chunk_size=1500,  
-        chunk_overlap=0
-    )
-    documentos = text_splitter.create_documents([texto_emails])
-    print(f"📄 E-mails processados: {len(documentos)}")
-
-    # 2. Criar Embeddings 
-    print("🧠 Criando conexões neurais (Indexando e-mails)...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    # 3. Armazenar no Banco Vetorial 
-    if os.path.exists(DIRETORIO_DB):
-        print("💾 Carregando banco de e-mails existente...")
-        vectorstore = Chroma(persist_directory=DIRETORIO_DB, embedding_function=embeddings)
-    else:
-        print("💾 Criando novo banco de dados forense...")
-        vectorstore = Chroma.from_documents(
-            documents=documentos,
-            embedding=embeddings,
-            persist_directory=DIRETORIO_DB
-        )
-
-    # 4. Configurar a LLM
-    chat_model = ChatGroq(model_name="llama-3.1-8b-instant")
-
-    # Prompt focado em investigação e citação de provas
-    template_investigacao = """
+# Prompt focado em investigação e citação de provas
+TEMPLATE_INVESTIGACAO = """
     Você é um investigador forense analisando e-mails corporativos da Dunder Mifflin.
     
     Contexto (E-mails recuperados):
@@ -67,19 +31,78 @@ def realizar_investigacao():
     3. Seja direto e profissional, como um relatório policial.
     """
 
-    prompt = ChatPromptTemplate.from_template(template_investigacao)
+PERGUNTA_INVESTIGACAO = "O Michael Scott está conspirando contra o Toby Flenderson? Existem planos de demissão, armadilhas ou operações secretas mencionadas?"
+
+def indexar_emails(embeddings=None, diretorio=DIRETORIO_DB):
+    # 1. Carregar e Processar o Dump de E-mails
+    if not os.path.exists(ARQUIVO_EMAILS):
+        raise FileNotFoundError(f"O arquivo {ARQUIVO_EMAILS} não foi encontrado!")
+
+    print(f"📂 Lendo evidências em '{ARQUIVO_EMAILS}' (streaming)...")
+
+    # 2. Criar Embeddings 
+    print("🧠 Criando conexões neurais (Indexando e-mails)...")
+    if embeddings is None:
+        embeddings = criar_embeddings()
+
+    # 3. Armazenar no Banco Vetorial (incremental: só e-mails novos/alterados geram embeddings)
+    # Um e-mail por vez via gerador, com De/Para/Data/Assunto como metadados; a indexação
+    # é feita em lotes, então o consumo de memória não cresce com o tamanho do dump
+    vectorstore = abrir_banco(diretorio, EmbeddingsMedidos(embeddings))
+    # Índice invertido pessoa -> e-mails (usado pela auditoria para filtrar por funcionário/data)
+    indice_pessoas = IndicePessoas(diretorio)
+    if indice_pessoas.vazio():
+        indice_pessoas.reconstruir(vectorstore)
+    resumo = sincronizar_indice(vectorstore, documentos_emails(ARQUIVO_EMAILS), diretorio, auxiliares=[indice_pessoas])
+    indice_pessoas.fechar()
+    print(f"💾 Banco forense sincronizado: {resumo['novos']} novos, {resumo['alterados']} alterados, "
+          f"{resumo['removidos']} removidos, {resumo['inalterados']} sem mudança.")
+    return vectorstore, resumo
+
+def investigacao_remota():
+    # Cliente fino: o serviço já tem o modelo de embeddings e o banco carregados
+    print(f"🌐 Usando o serviço em {cliente_servico.url_servico()}...")
+    resumo = cliente_servico.ingerir(["emails"])["emails"]
+    print(f"💾 Banco forense sincronizado: {resumo['novos']} novos, {resumo['alterados']} alterados, "
+          f"{resumo['removidos']} removidos, {resumo['inalterados']} sem mudança.")
+    print(f"\n🔍 Buscando respostas para: '{PERGUNTA_INVESTIGACAO}'")
+    relatorio = "".join(cliente_servico.perguntar("emails", PERGUNTA_INVESTIGACAO))
+
+    print("\n" + "="*40)
+    print("📋 RELATÓRIO FINAL DE INVESTIGAÇÃO")
+    print("="*40)
+    print(relatorio)
+
+def realizar_investigacao():
+    print("🕵️‍♂️  Iniciando Protocolo de Investigação 'Toby-Holmes'...")
+
+    if cliente_servico.servico_configurado():
+        investigacao_remota()
+        return
+
+    from llm_resiliente import criar_llm
+
+    vectorstore, _ = indexar_emails()
+
+    # 4. Configurar a LLM
+    chat_model = criar_llm()
+
+    prompt = ChatPromptTemplate.from_template(TEMPLATE_INVESTIGACAO)
     chain = prompt | chat_model
 
     # 5. A Investigação
-    pergunta_investigacao = "O Michael Scott está conspirando contra o Toby Flenderson? Existem planos de demissão, armadilhas ou operações secretas mencionadas?"
+    pergunta_investigacao = PERGUNTA_INVESTIGACAO
 
     print(f"\n🔍 Buscando respostas para: '{pergunta_investigacao}'")
     
     # Busca os 4 e-mails mais suspeitos
-    docs_relacionados = vectorstore.similarity_search(pergunta_investigacao, k=4)
+    with etapa("busca_vetorial"):
+        docs_relacionados = vectorstore.similarity_search(pergunta_investigacao, k=4)
     contexto = "\n\n".join([doc.page_content for doc in docs_relacionados])
 
-    resposta = chain.invoke({"context": contexto, "question": pergunta_investigacao})
+    with etapa("llm") as atributos:
+        resposta = chain.invoke({"context": contexto, "question": pergunta_investigacao})
+        atributos.update(registrar_uso(resposta))
 
     print("\n" + "="*40)
     print("📋 RELATÓRIO FINAL DE INVESTIGAÇÃO")
@@ -1,49 +1,34 @@
-import pandas as pd
+import asyncio
 import os
-import time
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.documents import Document
 from dotenv import load_dotenv
+from auditoria_async import LimitadorTaxa, ResultadoAuditoria, Verificacao, auditar_transacoes
+from auditoria_lote import auditar_em_lote
+from cache_veredictos import CacheVeredictos, ids_dos_documentos
+from recuperacao import buscar_em_lote
+from indice_pessoas import emails_por_transacao
+from banco_vetorial import abrir_banco, diretorio_banco
+from modelo_embeddings import criar_embeddings
+from rastreamento import coletar_etapas, etapa, serie
+import cliente_servico
 
 load_dotenv()
 
 # --- CONFIGURAÇÃO ---
 ARQUIVO_CSV = "transacoes_bancarias.csv"
-DB_COMPLIANCE = "./db_chroma"
-DB_EMAILS = "./db_emails"
+DB_COMPLIANCE = diretorio_banco("./db_chroma")
+DB_EMAILS = diretorio_banco("./db_emails")
+CONCORRENCIA_MAX = 8           # Transações analisadas ao mesmo tempo
+REQUISICOES_POR_SEGUNDO = 4    # Limite de chamadas à API da Groq (token bucket)
+MODO_LOTE = True               # Uma chamada julga várias transações do mesmo grupo
+TAMANHO_LOTE = 15
+MAX_DOCS_LOTE = 20             # Teto de e-mails/clusters no contexto de um lote de fraude
+JANELA_EMAILS_DIAS = 7         # E-mails do funcionário até N dias antes/depois da compra
+ORCAMENTO_IA = int(os.getenv("TOBY_ORCAMENTO_IA", "0")) or None   # Top-K: máx. de transações para a IA (vazio = fila toda)
 
-def auditoria_inteligente():
-    print("🕵️‍♂️  TOBY-AUDITOR: Iniciando varredura cruzada (Planilha x Regras x E-mails)...\n")
-
-    # 1. Carregar Dados Financeiros
-    if not os.path.exists(ARQUIVO_CSV):
-        print(f"❌ Erro: Arquivo {ARQUIVO_CSV} não encontrado.")
-        return
-
-    # Lê o CSV garantindo que os tipos de dados estejam certos
-    try:
-        df = pd.read_csv(ARQUIVO_CSV)
-        print(f"📊 Planilha carregada: {len(df)} transações encontradas.")
-    except Exception as e:
-        print(f"❌ Erro ao ler CSV: {e}")
-        return
-
-    # 2. Configurar IA
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    llm = ChatGroq(model_name="llama-3.1-8b-instant")
-
-    # 3. Carregar Bancos de Conhecimento
-    try:
-        vector_rules = Chroma(persist_directory=DB_COMPLIANCE, embedding_function=embeddings)
-        vector_emails = Chroma(persist_directory=DB_EMAILS, embedding_function=embeddings)
-    except Exception as e:
-        print("❌ Erro ao carregar bancos de dados. Certifique-se de ter rodado etapa01.py e etapa02.py.")
-        return
-
-    # --- AGENTE 1: VALIDAR REGRAS (Compliance Puro) ---
-    prompt_regras = ChatPromptTemplate.from_template("""
+# --- AGENTE 1: VALIDAR REGRAS (Compliance Puro) ---
+PROMPT_REGRAS = ChatPromptTemplate.from_template("""
     Você é um auditor financeiro rigoroso da Dunder Mifflin.
     Analise a transação abaixo comparando com as regras da empresa.
     
@@ -60,8 +45,8 @@ def auditoria_inteligente():
     MOTIVO: [Breve explicação]
     """)
 
-    # --- AGENTE 2: INVESTIGAR FRAUDE (Contexto de E-mail) ---
-    prompt_fraude = ChatPromptTemplate.from_template("""
+# --- AGENTE 2: INVESTIGAR FRAUDE (Contexto de E-mail) ---
+PROMPT_FRAUDE = ChatPromptTemplate.from_template("""
     Você é um detetive investigando fraudes.
     Verifique se há e-mails suspeitos que mencionem esta transação ou este funcionário planejando algo errado.
     
@@ -77,64 +62,257 @@ def auditoria_inteligente():
     EVIDÊNCIA: [Cite o e-mail ou diga "Nenhuma"]
     """)
 
-    print("\n" + "="*60)
-    print("INICIANDO ANÁLISE LINHA A LINHA")
-    print("="*60)
+def descrever_transacao(row):
+    # Monta a "história" da transação
+    transacao_str = (
+        f"ID: {row['id_transacao']} | Data: {row['data']} | "
+        f"Func: {row['funcionario']} ({row['cargo']}) | "
+        f"Item: {row['descricao']} | Valor: ${row['valor']:.2f} | Cat: {row['categoria']}"
+    )
+    # Alertas do pré-filtro de regras (quando houver) ajudam o agente a focar
+    if row.get('motivos'):
+        transacao_str += f" | Alertas: {row['motivos']}"
+    return transacao_str
+
+def selecionar_transacoes(df, regras, estatisticas=None, caminho=ARQUIVO_CSV, diretorio_emails=DB_EMAILS):
+    # Pré-filtro determinístico: as regras da política rodam no arquivo todo de uma vez
+    # e só as transações sinalizadas ou ambíguas seguem para a IA
+    from perfis_risco import carregar_perfis, priorizar
+    from regras_compliance import limite_alcada, triar_transacoes
+    from smurfing import descrever_clusters
+
+    with etapa("triagem"):
+        df = df.join(triar_transacoes(df, regras, estatisticas))
+
+    # Smurfing: a IA nunca vê as notas "irmãs" olhando uma linha só, então os clusters
+    # que a triagem detectou no arquivo inteiro entram como contexto do agente de fraude
+    with etapa("smurfing"):
+        textos_clusters = descrever_clusters(df, limite_alcada(regras))
 
-    # Filtra: Michael Scott
-    # Isso prova que você varreu o arquivo todo procurando padrões antes de chamar a IA
-    filtro = (df['funcionario'].isin(['Michael Scott']))
-    transacoes_para_analisar = df[filtro].head(10) # Pega apenas os 10 primeiros casos graves 
-
-    for index, row in transacoes_para_analisar.iterrows():
-        # Monta a "história" da transação
-        transacao_str = (
-            f"ID: {row['id_transacao']} | Data: {row['data']} | "
-            f"Func: {row['funcionario']} ({row['cargo']}) | "
-            f"Item: {row['descricao']} | Valor: ${row['valor']} | Cat: {row['categoria']}"
+    # Perfis de risco (pré-calculados em perfis_risco.py) definem a ordem da fila da IA
+    with etapa("priorizacao"):
+        df = priorizar(df, carregar_perfis(caminho, diretorio_emails))
+    return df, textos_clusters
+
+def montar_contexto(transacoes_para_analisar, vector_rules, vector_emails, textos_clusters, diretorio_emails=DB_EMAILS):
+    # --- ESTÁGIO DE RECUPERAÇÃO (em lote, antes de qualquer chamada à LLM) ---
+    # Consultas repetidas viram uma só; embeddings e buscas saem em massa por banco
+    consultas_regras = "regras sobre " + transacoes_para_analisar['categoria'].astype(str) + " e limites de valor"
+    consultas_emails = (
+        transacoes_para_analisar['funcionario'].astype(str) + " " +
+        transacoes_para_analisar['descricao'].astype(str) + " " +
+        transacoes_para_analisar['categoria'].astype(str)
+    )
+    print(f"🔎 Recuperando contexto: {consultas_regras.nunique()} consultas de regras, "
+          f"{consultas_emails.nunique()} de e-mails...")
+    with etapa("recuperacao"):
+        docs_por_regra = buscar_em_lote(vector_rules, consultas_regras, k=2)
+        # E-mails: só os que envolvem o funcionário (remetente/destinatário) perto da data da compra
+        docs_por_email = emails_por_transacao(
+            vector_emails, diretorio_emails, transacoes_para_analisar, consultas_emails, k=3, janela_dias=JANELA_EMAILS_DIAS
         )
-        
-        print(f"\n🔹 Processando {row['id_transacao']} - {row['funcionario']}...")
 
-        # --- PASSO 1: Checagem de Regras ---
-        # Busca regras sobre a categoria específica (ex: "regras para Almoço")
-        docs_regras = vector_rules.similarity_search(f"regras sobre {row['categoria']} e limites de valor", k=2)
+    # --- PASSO 1: Checagem de Regras ---
+    # Busca regras sobre a categoria específica (ex: "regras para Almoço")
+    def buscar_regras(categoria, linhas=None):
+        return docs_por_regra[f"regras sobre {categoria} e limites de valor"]
+
+    # --- PASSO 2: Checagem de E-mails ---
+    # E-mails do funcionário na janela da compra, ranqueados pelo item (ex: "Kevin" e "Keleven" ou "Ajuste")
+    def buscar_emails(funcionario, linhas, limite=MAX_DOCS_LOTE):
+        # Cada linha: cluster de smurfing (se houver) e depois os e-mails dela, em ordem de relevância
+        por_linha = []
+        for row in linhas:
+            docs = list(docs_por_email[row['id_transacao']])
+            if row['cluster_smurfing'] >= 0:
+                id_cluster = row['cluster_smurfing']
+                docs.insert(0, Document(page_content=textos_clusters[id_cluster], id=f"smurfing-{id_cluster}"))
+            por_linha.append((str(row['id_transacao']), docs))
+
+        # Rodízio entre as linhas até o teto: todas entram com a melhor evidência antes de
+        # qualquer uma ganhar a segunda. Documento repetido só acumula a quem pertence.
+        escolhidos = {}
+        for posicao in range(max((len(docs) for _, docs in por_linha), default=0)):
+            for id_transacao, docs in por_linha:
+                if posicao >= len(docs):
+                    continue
+                d = docs[posicao]
+                if d.page_content not in escolhidos and len(escolhidos) >= limite:
+                    continue
+                escolhidos.setdefault(d.page_content, (d, []))[1].append(id_transacao)
+
+        # metadata["transacoes"] diz de qual transação é cada evidência (vira rótulo no prompt
+        # do lote; o cache e o fallback unitário usam só a evidência da própria linha)
+        return [
+            Document(page_content=d.page_content, id=d.id, metadata={**d.metadata, "transacoes": ids})
+            for d, ids in escolhidos.values()
+        ]
+
+    def preparar(row):
+        transacao_str = descrever_transacao(row)
+        docs_regras = buscar_regras(row['categoria'])
+        docs_emails = buscar_emails(row['funcionario'], [row])
         contexto_regras = "\n".join([d.page_content for d in docs_regras])
-        
-        res_regras = (prompt_regras | llm).invoke({
-            "transacao": transacao_str, 
-            "context": contexto_regras
-        })
-        
-        # --- PASSO 2: Checagem de E-mails ---
-        # Busca e-mails que citam o funcionário E o item (ex: "Kevin" e "Keleven" ou "Ajuste")
-        termo_busca = f"{row['funcionario']} {row['descricao']} {row['categoria']}"
-        docs_emails = vector_emails.similarity_search(termo_busca, k=3)
         contexto_emails = "\n".join([d.page_content for d in docs_emails])
-        
-        res_fraude = (prompt_fraude | llm).invoke({
-            "transacao": transacao_str, 
-            "context": contexto_emails
-        })
-
-        # --- EXIBIÇÃO INTELIGENTE (Só mostra se tiver problema) ---
-        conteudo_regra = res_regras.content
-        conteudo_fraude = res_fraude.content
-
-        is_reprovado = "REPROVADO" in conteudo_regra.upper()
-        is_fraude = "RISCO: ALTO" in conteudo_fraude.upper()
-
-        if is_reprovado or is_fraude:
-            print(f"🚨 ALERTA DETECTADO PARA {row['id_transacao']}!")
-            if is_reprovado:
-                print(f"   [COMPLIANCE]: {conteudo_regra.replace('STATUS:', '').strip()}")
-            if is_fraude:
-                print(f"   [INVESTIGAÇÃO]: {conteudo_fraude.replace('RISCO:', '').strip()}")
-        else:
-            print(f"   ✅ Transação Limpa")
-            
-        # Pequena pausa para não estourar limite de taxa da API (se houver)
-        time.sleep(0.5)
+
+        return (
+            Verificacao(PROMPT_REGRAS, {"transacao": transacao_str, "context": contexto_regras}, ids_dos_documentos(docs_regras)),
+            Verificacao(PROMPT_FRAUDE, {"transacao": transacao_str, "context": contexto_emails}, ids_dos_documentos(docs_emails)),
+        )
+
+    return buscar_regras, buscar_emails, preparar
+
+async def fluxo_auditoria(transacoes_para_analisar, llm, vector_rules, vector_emails, textos_clusters,
+                          limitador=None, cache=None, modo_lote=MODO_LOTE, diretorio_emails=DB_EMAILS):
+    # Gerador assíncrono de ResultadoAuditoria (usado pelo script e pelo servico.py)
+    buscar_regras, buscar_emails, preparar = await asyncio.to_thread(
+        montar_contexto, transacoes_para_analisar, vector_rules, vector_emails, textos_clusters, diretorio_emails
+    )
+    # Regras e fraude de várias linhas rodam ao mesmo tempo; o token bucket
+    # substitui a pausa fixa para não estourar o limite de taxa da API
+    if modo_lote:
+        resultados = auditar_em_lote(
+            transacoes_para_analisar, llm, PROMPT_REGRAS, PROMPT_FRAUDE,
+            descrever_transacao, buscar_regras, buscar_emails,
+            tamanho_lote=TAMANHO_LOTE, concorrencia=CONCORRENCIA_MAX, limitador=limitador, cache=cache,
+        )
+    else:
+        resultados = auditar_transacoes(
+            transacoes_para_analisar, llm, preparar, CONCORRENCIA_MAX, limitador=limitador, cache=cache,
+        )
+    async for resultado in resultados:
+        yield resultado
+
+def exibir(resultado):
+    # --- EXIBIÇÃO INTELIGENTE (Só mostra se tiver problema) ---
+    row = resultado.linha
+    conteudo_regra = resultado.regras
+    conteudo_fraude = resultado.fraude
+
+    is_reprovado = "REPROVADO" in conteudo_regra.upper()
+    is_fraude = "RISCO: ALTO" in conteudo_fraude.upper()
+
+    if resultado.erro:
+        print(f"\n⚠️  {row['id_transacao']} - {row['funcionario']} não analisada: {resultado.erro}")
+        return
+
+    print(f"\n🔹 {row['id_transacao']} - {row['funcionario']} analisada.")
+    if is_reprovado or is_fraude:
+        print(f"🚨 ALERTA DETECTADO PARA {row['id_transacao']}!")
+        if is_reprovado:
+            print(f"   [COMPLIANCE]: {conteudo_regra.replace('STATUS:', '').strip()}")
+        if is_fraude:
+            print(f"   [INVESTIGAÇÃO]: {conteudo_fraude.replace('RISCO:', '').strip()}")
+    else:
+        print(f"   ✅ Transação Limpa")
+
+def exibir_desempenho(relatorio, limite=6):
+    # Onde o tempo e os tokens foram gastos (etapas medidas pelo rastreamento.py)
+    contadores = relatorio["contadores"]
+    print(f"\n⏱️  Desempenho ({relatorio['duracao_s']:.1f} s): {contadores.get('chamadas_llm', 0)} chamadas à IA, "
+          f"{contadores.get(serie('tokens_llm', tipo='entrada'), 0)} tokens de entrada, "
+          f"{contadores.get(serie('tokens_llm', tipo='saida'), 0)} de saída, "
+          f"{contadores.get('llm_retentativas', 0)} retentativas, "
+          f"{sum(v for k, v in contadores.items() if k.startswith('llm_reserva'))} no modelo reserva.")
+    etapas = sorted(relatorio["etapas"].items(), key=lambda item: -item[1]["total_s"])
+    for nome, e in etapas[:limite]:
+        print(f"   {nome:<20} {e['n']:>6}x  total {e['total_s']:>8.2f} s  p95 {e['p95_ms']:>9.1f} ms")
+
+def auditoria_remota():
+    # Cliente fino: o serviço já tem modelos e bancos carregados
+    print(f"🌐 Usando o serviço de auditoria em {cliente_servico.url_servico()}...")
+    for evento in cliente_servico.auditar(limite=ORCAMENTO_IA):
+        if "resumo" in evento:
+            resumo = evento["resumo"]
+            print(f"⚖️  Pré-filtro de regras: {resumo['conformes']} transações conformes (sem IA), "
+                  f"{resumo['em_analise']} enviadas para análise.")
+        elif "linha" in evento:
+            exibir(ResultadoAuditoria(linha=evento["linha"], regras=evento["regras"], fraude=evento["fraude"],
+                                      erro=evento.get("erro")))
+        elif "desempenho" in evento:
+            exibir_desempenho(evento["desempenho"])
+
+def auditoria_inteligente(llm=None):
+    print("🕵️‍♂️  TOBY-AUDITOR: Iniciando varredura cruzada (Planilha x Regras x E-mails)...\n")
+
+    if cliente_servico.servico_configurado() and llm is None:
+        auditoria_remota()
+        return
+
+    # 1. Carregar Dados Financeiros
+    if not os.path.exists(ARQUIVO_CSV):
+        print(f"❌ Erro: Arquivo {ARQUIVO_CSV} não encontrado.")
+        return
+    if not os.path.isdir(DB_COMPLIANCE) or not os.path.isdir(DB_EMAILS):
+        print("❌ Erro ao carregar bancos de dados. Certifique-se de ter rodado etapa01.py e etapa02.py.")
+        return
+
+    # Cada etapa da varredura é medida; o resumo sai no fim
+    with coletar_etapas() as coletor:
+        concluida = auditoria_local(llm)
+    if concluida:
+        exibir_desempenho(coletor.relatorio())
+
+def auditoria_local(llm=None):
+    # pandas/pyarrow só entram aqui, depois que CSV e bancos foram conferidos
+    from perfis_risco import fila_prioridade
+    from regras_compliance import ARQUIVO_POLITICA, SITUACAO_CONFORME, carregar_regras
+    from transacoes import carregar_transacoes
+
+    # Lê as transações já tipadas (cache Parquet, convertido do CSV na primeira vez)
+    try:
+        with etapa("carregar_csv"):
+            df = carregar_transacoes(ARQUIVO_CSV)
+        print(f"📊 Planilha carregada: {len(df)} transações encontradas.")
+    except Exception as e:
+        print(f"❌ Erro ao ler CSV: {e}")
+        return
+
+    # 2. Configurar IA (importações pesadas só aqui, depois que arquivos e bancos foram conferidos)
+    embeddings = criar_embeddings()
+    if llm is None:
+        from llm_resiliente import criar_llm
+
+        llm = criar_llm()
+
+    # 3. Carregar Bancos de Conhecimento
+    try:
+        vector_rules = abrir_banco(DB_COMPLIANCE, embeddings)
+        vector_emails = abrir_banco(DB_EMAILS, embeddings)
+    except Exception as e:
+        print("❌ Erro ao carregar bancos de dados. Certifique-se de ter rodado etapa01.py e etapa02.py.")
+        return
+
+    print("\n" + "="*60)
+    print("INICIANDO ANÁLISE EM PARALELO")
+    print("="*60)
+
+    df, textos_clusters = selecionar_transacoes(df, carregar_regras(ARQUIVO_POLITICA))
+    contagem = df['situacao'].value_counts()
+    # Fila de prioridade: as mais arriscadas primeiro, até o orçamento (TOBY_ORCAMENTO_IA)
+    transacoes_para_analisar = fila_prioridade(df, limite=ORCAMENTO_IA)
+    por_risco = (transacoes_para_analisar['situacao'] == SITUACAO_CONFORME).sum()
+    print(f"⚖️  Pré-filtro de regras: {contagem.get(SITUACAO_CONFORME, 0)} transações conformes (sem IA), "
+          f"{len(transacoes_para_analisar)} enviadas para análise, das mais arriscadas para as menos"
+          f"{f' (orçamento: {ORCAMENTO_IA})' if ORCAMENTO_IA else ''}; {por_risco} delas entraram só pelo perfil de risco.")
+
+    # Vereditos já calculados (mesma transação, mesmos chunks, mesmo prompt e modelo) vêm do disco
+    cache = CacheVeredictos(indices={"rules": DB_COMPLIANCE, "emails": DB_EMAILS})
+
+    async def consumir():
+        limitador = LimitadorTaxa(REQUISICOES_POR_SEGUNDO)
+        async for resultado in fluxo_auditoria(
+            transacoes_para_analisar, llm, vector_rules, vector_emails, textos_clusters,
+            limitador=limitador, cache=cache,
+        ):
+            exibir(resultado)
+
+    asyncio.run(consumir())
+
+    stats = cache.estatisticas()
+    print(f"\n💾 Cache de vereditos: {stats['acertos']} acertos, {stats['falhas']} falhas "
+          f"({stats['taxa_acerto']:.0%}), {stats['entradas']} vereditos guardados.")
+    return True
 
 if __name__ == "__main__":
-    auditoria_inteligente()
\ No newline at end of file
+    auditoria_inteligente()
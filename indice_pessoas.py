@@ -0,0 +1,118 @@
+import os
+import re
+import sqlite3
+import unicodedata
+from datetime import datetime, timedelta
+
+from parser_emails import contatos
+from rastreamento import etapa
+from recuperacao import buscar_em_lote, buscar_entre_candidatos
+
+# --- ÍNDICE INVERTIDO PESSOA -> E-MAILS ---
+# Para cada e-mail indexado guarda quem enviou e quem recebeu, com o dia. Na auditoria,
+# o agente de fraude só compara a transação com e-mails que envolvem o próprio
+# funcionário numa janela de ±N dias da data da compra, em vez de ranquear o dump inteiro.
+# Fica em SQLite dentro da pasta do banco de e-mails e é mantido pela ingestão incremental.
+
+ARQUIVO_INDICE = "indice_pessoas.sqlite"
+JANELA_DIAS = 7
+TAMANHO_LOTE_RECONSTRUCAO = 1000
+
+
+def chave_pessoa(texto):
+    # "Phyllis Lapin-Vance" -> "phyllis lapin vance" ; "phyllis.vance" -> "phyllis vance"
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"[a-z0-9]+", sem_acento.lower()))
+
+
+def pessoas_do_email(metadados):
+    # Nome e parte local do endereço de remetente e destinatários: "Phyllis Vance" (planilha)
+    # casa com "phyllis.vance@..." mesmo quando o nome no e-mail é "Phyllis Lapin-Vance"
+    chaves = set()
+    for nome, endereco in contatos(metadados.get("de", "")) + contatos(metadados.get("para", "")):
+        chaves.add(chave_pessoa(nome))
+        if endereco:
+            chaves.add(chave_pessoa(endereco.split("@")[0]))
+    chaves.discard("")
+    return chaves
+
+
+def _dia(data):
+    # "2008-04-05" / "2008-04-05 14:00" / Timestamp -> 20080405
+    return int(str(data)[:10].replace("-", ""))
+
+
+class IndicePessoas:
+    def __init__(self, diretorio):
+        os.makedirs(diretorio, exist_ok=True)
+        self.conexao = sqlite3.connect(os.path.join(diretorio, ARQUIVO_INDICE))
+        self.conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS envolvidos (pessoa TEXT NOT NULL, id_chunk TEXT NOT NULL, data_dia INTEGER);
+            CREATE INDEX IF NOT EXISTS idx_pessoa_dia ON envolvidos (pessoa, data_dia);
+            CREATE INDEX IF NOT EXISTS idx_chunk ON envolvidos (id_chunk);
+        """)
+
+    # Interface usada por ingestao.sincronizar_indice
+    def registrar(self, documentos):
+        self.remover([d.id for d in documentos])
+        self.conexao.executemany(
+            "INSERT INTO envolvidos VALUES (?, ?, ?)",
+            ((pessoa, d.id, d.metadata.get("data_dia")) for d in documentos for pessoa in pessoas_do_email(d.metadata)),
+        )
+        self.conexao.commit()
+
+    def remover(self, ids):
+        self.conexao.executemany("DELETE FROM envolvidos WHERE id_chunk = ?", ((i,) for i in ids))
+        self.conexao.commit()
+
+    def vazio(self):
+        return self.conexao.execute("SELECT 1 FROM envolvidos LIMIT 1").fetchone() is None
+
+    def reconstruir(self, vectorstore, tamanho_lote=TAMANHO_LOTE_RECONSTRUCAO):
+        # Preenche o índice a partir dos metadados já gravados no banco vetorial (banco existente)
+        self.conexao.execute("DELETE FROM envolvidos")
+        inicio = 0
+        while True:
+            pagina = vectorstore.get(include=["metadatas"], limit=tamanho_lote, offset=inicio)
+            if not pagina["ids"]:
+                break
+            self.conexao.executemany(
+                "INSERT INTO envolvidos VALUES (?, ?, ?)",
+                ((pessoa, i, (meta or {}).get("data_dia"))
+                 for i, meta in zip(pagina["ids"], pagina["metadatas"]) for pessoa in pessoas_do_email(meta or {})),
+            )
+            inicio += len(pagina["ids"])
+        self.conexao.commit()
+
+    def candidatos(self, pessoa, data, janela_dias=JANELA_DIAS):
+        # IDs dos e-mails que envolvem `pessoa` entre data - janela e data + janela
+        centro = datetime.strptime(str(_dia(data)), "%Y%m%d")
+        inicio = _dia((centro - timedelta(days=janela_dias)).date())
+        fim = _dia((centro + timedelta(days=janela_dias)).date())
+        linhas = self.conexao.execute(
+            "SELECT DISTINCT id_chunk FROM envolvidos WHERE pessoa = ? AND data_dia BETWEEN ? AND ?",
+            (chave_pessoa(pessoa), inicio, fim),
+        )
+        return tuple(i for (i,) in linhas)
+
+    def fechar(self):
+        self.conexao.close()
+
+
+def emails_por_transacao(vectorstore, diretorio, df, consultas, k=3, janela_dias=JANELA_DIAS):
+    # {id_transacao: [Document]}: e-mails do funcionário no período, ranqueados pela consulta.
+    # Bancos indexados antes do índice de pessoas caem na busca livre no dump inteiro.
+    indice = IndicePessoas(diretorio)
+    try:
+        if indice.vazio():
+            print("⚠️  Índice de pessoas vazio (rode etapa02.py): usando busca livre nos e-mails.")
+            docs = buscar_em_lote(vectorstore, consultas, k=k)
+            return {id_t: docs[c] for id_t, c in zip(df["id_transacao"], consultas)}
+        with etapa("indice_pessoas"):
+            pares = [
+                (consulta, indice.candidatos(funcionario, data, janela_dias))
+                for consulta, funcionario, data in zip(consultas, df["funcionario"].astype(str), df["data"])
+            ]
+    finally:
+        indice.fechar()
+    return dict(zip(df["id_transacao"], buscar_entre_candidatos(vectorstore, pares, k=k)))
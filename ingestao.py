@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+from langchain_core.documents import Document
+
+# --- INGESTÃO INCREMENTAL ---
+# Cada chunk recebe um ID estável (hash do cabeçalho do e-mail ou da seção da política).
+# Um manifesto no diretório do banco guarda o hash do conteúdo de cada ID indexado, então
+# rodar a ingestão de novo só gera embeddings do que é novo ou mudou e remove do banco
+# o que não existe mais. Rodar duas vezes seguidas não faz nada (idempotente).
+#
+# A sincronização consome os documentos como um iterador, em lotes de tamanho fixo, e o
+# manifesto fica em SQLite: indexar um dump de vários GB usa memória constante.
+
+ARQUIVO_MANIFESTO = "manifesto.sqlite"
+ARQUIVO_MANIFESTO_LEGADO = "manifesto.json"
+TAMANHO_LOTE_INDEXACAO = 256
+
+
+def id_estavel(*partes):
+    return hashlib.sha256("\x1f".join(str(p) for p in partes).encode("utf-8")).hexdigest()[:32]
+
+
+def hash_conteudo(texto):
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def documento_com_id(texto, id_chunk, metadados):
+    # O hash cobre texto + metadados: mudar um cabeçalho também reindexa o chunk
+    assinatura = texto + json.dumps(metadados, sort_keys=True, ensure_ascii=False)
+    metadados = dict(metadados, hash=hash_conteudo(assinatura))
+    return Document(page_content=texto, metadata=metadados, id=id_chunk)
+
+
+# --- CHUNKING COM IDs ESTÁVEIS ---
+def dividir_politica(texto, splitter):
+    # Quebra por seção/subseção ("SEÇÃO 2: ...", "2.1. ...") antes do splitter, para que
+    # editar uma seção só mude os chunks dela
+    texto = re.sub(r"(?m)^=+\s*$", "", texto)
+    blocos = re.split(r"(?m)^(?=SEÇÃO \d+:|\d\.\d\.\s)", texto)
+    documentos = []
+    for bloco in blocos:
+        bloco = bloco.strip()
+        if not bloco:
+            continue
+        titulo = bloco.splitlines()[0].strip()
+        for i, pedaco in enumerate(splitter.split_text(bloco)):
+            documentos.append(documento_com_id(pedaco, id_estavel("politica", titulo, i), {"secao": titulo}))
+    return documentos
+
+
+# --- MANIFESTO ---
+class Manifesto:
+    # Tabela chunks(id, hash, rodada): `rodada` marca em qual sincronização o ID foi visto
+    # pela última vez; o que ficou com rodada antiga no fim saiu da fonte. A tabela impressao
+    # guarda o hash de todos os (id, hash), recalculado só quando uma sincronização muda algo.
+    def __init__(self, diretorio):
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, ARQUIVO_MANIFESTO)
+        self.novo = not os.path.exists(caminho)
+        self.conexao = sqlite3.connect(caminho)
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, hash TEXT, rodada INTEGER NOT NULL)"
+        )
+        self.conexao.execute("CREATE TABLE IF NOT EXISTS impressao (valor TEXT NOT NULL)")
+        if self.novo:
+            self._importar_legado(os.path.join(diretorio, ARQUIVO_MANIFESTO_LEGADO))
+        self.rodada = self.conexao.execute("SELECT COALESCE(MAX(rodada), 0) + 1 FROM chunks").fetchone()[0]
+
+    def _importar_legado(self, caminho):
+        # Manifesto JSON antigo: os IDs entram sem hash (serão reindexados uma vez)
+        if not os.path.exists(caminho):
+            return
+        with open(caminho, "r", encoding="utf-8") as f:
+            ids = json.load(f)["chunks"]
+        self.conexao.executemany("INSERT OR IGNORE INTO chunks VALUES (?, NULL, 0)", ((i,) for i in ids))
+        self.conexao.commit()
+        os.remove(caminho)
+        self.novo = False
+
+    def consultar(self, id_chunk):
+        # -> (hash, rodada) ou None
+        return self.conexao.execute("SELECT hash, rodada FROM chunks WHERE id = ?", (id_chunk,)).fetchone()
+
+    def marcar(self, id_chunk, hash_chunk):
+        self.conexao.execute(
+            "INSERT INTO chunks VALUES (?, ?, ?) ON CONFLICT(id) DO UPDATE SET hash = excluded.hash, rodada = excluded.rodada",
+            (id_chunk, hash_chunk, self.rodada),
+        )
+
+    def confirmar(self, documentos):
+        # Só grava o hash depois do upsert no banco vetorial: se cair no meio, reindexa
+        self.conexao.executemany(
+            "UPDATE chunks SET hash = ? WHERE id = ?", ((d.metadata["hash"], d.id) for d in documentos)
+        )
+        self.conexao.commit()
+
+    def ausentes(self, tamanho_lote):
+        # IDs não vistos nesta rodada, em lotes (sem carregar a lista inteira)
+        while True:
+            lote = [i for (i,) in self.conexao.execute(
+                "SELECT id FROM chunks WHERE rodada < ? LIMIT ?", (self.rodada, tamanho_lote)
+            )]
+            if not lote:
+                return
+            yield lote
+            self.conexao.executemany("DELETE FROM chunks WHERE id = ?", ((i,) for i in lote))
+            self.conexao.commit()
+
+    def impressao(self):
+        linha = self.conexao.execute("SELECT valor FROM impressao").fetchone()
+        return linha[0] if linha else None
+
+    def atualizar_impressao(self):
+        # Percorre o manifesto em ordem de ID (cursor, sem carregar tudo na memória)
+        digest = hashlib.sha256()
+        for id_chunk, hash_chunk in self.conexao.execute("SELECT id, hash FROM chunks ORDER BY id"):
+            digest.update(f"{id_chunk}:{hash_chunk}\n".encode("utf-8"))
+        self.conexao.execute("DELETE FROM impressao")
+        self.conexao.execute("INSERT INTO impressao VALUES (?)", (digest.hexdigest(),))
+        self.conexao.commit()
+
+    def fechar(self):
+        self.conexao.commit()
+        self.conexao.close()
+
+
+def ler_impressao(diretorio):
+    # Versão do conteúdo indexado em `diretorio` (None se nunca foi sincronizado).
+    # Só leitura: não cria o manifesto nem disputa a escrita com uma ingestão em andamento.
+    caminho = os.path.join(diretorio, ARQUIVO_MANIFESTO)
+    if not os.path.exists(caminho):
+        return None
+    conexao = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        linha = conexao.execute("SELECT valor FROM impressao").fetchone()
+    except sqlite3.OperationalError:
+        return None   # Manifesto de antes da tabela impressao
+    finally:
+        conexao.close()
+    return linha[0] if linha else None
+
+
+# --- SINCRONIZAÇÃO ---
+def sincronizar_indice(vectorstore, documentos, diretorio, tamanho_lote=TAMANHO_LOTE_INDEXACAO, auxiliares=()):
+    # `documentos` pode ser uma lista ou um gerador (ex: parser_emails.documentos_emails).
+    # `auxiliares` são índices derivados (ex: indice_pessoas.IndicePessoas) com
+    # registrar(documentos) e remover(ids), mantidos em sincronia com o banco vetorial.
+    manifesto = Manifesto(diretorio)
+    if manifesto.novo:
+        # Banco criado antes do manifesto (IDs aleatórios): limpa para não duplicar chunks
+        legado = vectorstore.get(include=[])["ids"]
+        for i in range(0, len(legado), tamanho_lote):
+            vectorstore.delete(ids=legado[i:i + tamanho_lote])
+            for auxiliar in auxiliares:
+                auxiliar.remover(legado[i:i + tamanho_lote])
+
+    resumo = {"novos": 0, "alterados": 0, "removidos": 0, "inalterados": 0}
+    pendentes = []
+
+    def gravar():
+        # Chroma e BancoNumpy fazem upsert por ID: um chunk alterado é substituído, não duplicado
+        vectorstore.add_documents(pendentes, ids=[d.id for d in pendentes])
+        for auxiliar in auxiliares:
+            auxiliar.registrar(pendentes)
+        manifesto.confirmar(pendentes)
+        pendentes.clear()
+
+    try:
+        for documento in documentos:
+            registro = manifesto.consultar(documento.id)
+            id_base, repeticao = documento.id, 1
+            while registro and registro[1] == manifesto.rodada:
+                # Cabeçalhos repetidos (reenvios) ganham um sufixo para continuarem únicos
+                repeticao += 1
+                documento.id = id_estavel(id_base, repeticao)
+                registro = manifesto.consultar(documento.id)
+
+            hash_chunk = documento.metadata["hash"]
+            if registro and registro[0] == hash_chunk:
+                resumo["inalterados"] += 1
+                manifesto.marcar(documento.id, hash_chunk)
+                continue
+            resumo["alterados" if registro else "novos"] += 1
+            manifesto.marcar(documento.id, None)
+            pendentes.append(documento)
+            if len(pendentes) >= tamanho_lote:
+                gravar()
+        if pendentes:
+            gravar()
+
+        for lote in manifesto.ausentes(tamanho_lote):
+            vectorstore.delete(ids=lote)
+            for auxiliar in auxiliares:
+                auxiliar.remover(lote)
+            resumo["removidos"] += len(lote)
+    finally:
+        # Também numa sincronização interrompida: o que já foi gravado muda a impressão
+        if resumo["novos"] or resumo["alterados"] or resumo["removidos"] or manifesto.impressao() is None:
+            manifesto.atualizar_impressao()
+        manifesto.fechar()
+    return resumo
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from auditoria_async import AuditoriaCancelada
+from rastreamento import coletar_etapas
+
+# --- EXECUTOR DE AUDITORIAS EM SEGUNDO PLANO ---
+# A varredura roda numa thread fora do script do Streamlit. Cada job tem uma pasta em
+# DIRETORIO_JOBS com as transações a analisar (transacoes.parquet), o estado (job.json) e os
+# resultados gravados um por linha assim que ficam prontos (resultados.jsonl). A página só
+# lê esses arquivos, então um rerun não perde nada; um job cancelado ou interrompido
+# (ex: servidor reiniciado) pode ser retomado, pulando as transações já gravadas. Transações
+# que falharam ficam gravadas com `erro` (o job termina em ESTADO_ERRO) e são refeitas ao retomar.
+# As etapas medidas durante a execução (rastreamento.py) ficam em desempenho.json.
+
+DIRETORIO_JOBS = "./jobs_auditoria"
+MAX_JOBS_SIMULTANEOS = 2
+
+ESTADO_PENDENTE = "pendente"
+ESTADO_EXECUTANDO = "executando"
+ESTADO_CONCLUIDO = "concluido"
+ESTADO_CANCELADO = "cancelado"
+ESTADO_ERRO = "erro"
+ESTADO_INTERROMPIDO = "interrompido"   # Estava executando, mas a thread não existe mais
+
+
+class JobCancelado(AuditoriaCancelada):
+    pass
+
+
+def _nativo(valor):
+    # float32 via texto: 82.84 continua 82.84 (e não 82.83999633789062)
+    if isinstance(valor, np.float32):
+        return float(str(valor))
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def _nome_tipo(tipo):
+    # str(StringDtype) é só "string": sem o storage, string[pyarrow] voltaria como string[python]
+    if isinstance(tipo, pd.StringDtype):
+        return f"string[{tipo.storage}]"
+    return str(tipo)
+
+
+def linha_para_json(linha):
+    # Series/dict da transação -> dict com tipos nativos (NumPy/pandas não vão direto para o JSON)
+    return {coluna: _nativo(valor) for coluna, valor in linha.items()}
+
+
+class GerenciadorJobs:
+    def __init__(self, diretorio=DIRETORIO_JOBS, max_jobs=MAX_JOBS_SIMULTANEOS):
+        self.diretorio = diretorio
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="auditoria")
+        self._futuros = {}
+        self._cancelamentos = {}
+        self._coletores = {}
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, job_id, arquivo):
+        return os.path.join(self.diretorio, job_id, arquivo)
+
+    def _ler_estado(self, job_id):
+        with open(self._caminho(job_id, "job.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _gravar_estado(self, job_id, **campos):
+        with self._lock:
+            estado = self._ler_estado(job_id)
+            estado.update(campos, atualizado_em=time.time())
+            temporario = self._caminho(job_id, "job.json.tmp")
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(estado, f, ensure_ascii=False)
+            os.replace(temporario, self._caminho(job_id, "job.json"))
+
+    def criar(self, df, descricao=""):
+        job_id = uuid.uuid4().hex[:12]
+        os.makedirs(os.path.join(self.diretorio, job_id))
+        # Parquet guarda categorias, float32, datas e índice; `tipos` cobre o que o Parquet
+        # não distingue sozinho (ex: string[pyarrow] volta como string[python])
+        df.to_parquet(self._caminho(job_id, "transacoes.parquet"))
+        with open(self._caminho(job_id, "job.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "id": job_id, "descricao": descricao, "total": len(df), "estado": ESTADO_PENDENTE,
+                "erro": None, "criado_em": time.time(), "atualizado_em": time.time(),
+                "tipos": {coluna: _nome_tipo(tipo) for coluna, tipo in df.dtypes.items()},
+            }, f, ensure_ascii=False)
+        open(self._caminho(job_id, "resultados.jsonl"), "a").close()
+        return job_id
+
+    def iniciar(self, job_id, auditar):
+        # `auditar(df_pendente, ao_concluir, cancelamento)` roda na thread do job; deve chamar
+        # ao_concluir(resultado) a cada ResultadoAuditoria e parar se cancelamento.is_set()
+        with self._lock:
+            futuro = self._futuros.get(job_id)
+            if futuro and not futuro.done():
+                return
+            cancelamento = threading.Event()
+            self._cancelamentos[job_id] = cancelamento
+            self._futuros[job_id] = self.executor.submit(self._executar, job_id, auditar, cancelamento)
+
+    def transacoes(self, job_id):
+        caminho = self._caminho(job_id, "transacoes.parquet")
+        if not os.path.exists(caminho):
+            # Job criado antes do snapshot em Parquet
+            return pd.read_csv(self._caminho(job_id, "transacoes.csv"), index_col=0)
+        df = pd.read_parquet(caminho)
+        tipos = self._ler_estado(job_id).get("tipos", {})
+        diferentes = {coluna: tipo for coluna, tipo in tipos.items() if _nome_tipo(df[coluna].dtype) != tipo}
+        return df.astype(diferentes) if diferentes else df
+
+    def _executar(self, job_id, auditar, cancelamento):
+        self._gravar_estado(job_id, estado=ESTADO_EXECUTANDO, erro=None)
+        df = self.transacoes(job_id)
+        feitos = {r["linha"]["id_transacao"] for r in self.resultados(job_id) if not r.get("erro")}
+        pendente = df[~df["id_transacao"].isin(feitos)]
+        falhas = []
+
+        def ao_concluir(resultado):
+            self._anexar_resultado(job_id, resultado)
+            if resultado.erro:
+                falhas.append(resultado.erro)
+            if cancelamento.is_set():
+                raise JobCancelado()
+
+        try:
+            with coletar_etapas() as coletor:
+                self._coletores[job_id] = coletor
+                try:
+                    if len(pendente):
+                        auditar(pendente, ao_concluir, cancelamento)
+                finally:
+                    self._gravar_desempenho(job_id, coletor.relatorio())
+            if cancelamento.is_set():
+                raise JobCancelado()
+            if falhas:
+                self._gravar_estado(job_id, estado=ESTADO_ERRO,
+                                    erro=f"{len(falhas)} transações não analisadas (ex: {falhas[0]})")
+            else:
+                self._gravar_estado(job_id, estado=ESTADO_CONCLUIDO)
+        except JobCancelado:
+            self._gravar_estado(job_id, estado=ESTADO_CANCELADO)
+        except Exception as e:
+            self._gravar_estado(job_id, estado=ESTADO_ERRO, erro=str(e))
+        finally:
+            self._coletores.pop(job_id, None)
+
+    def _gravar_desempenho(self, job_id, relatorio):
+        temporario = self._caminho(job_id, "desempenho.json.tmp")
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False)
+        os.replace(temporario, self._caminho(job_id, "desempenho.json"))
+
+    def desempenho(self, job_id):
+        # Relatório parcial enquanto o job roda; depois, o da última execução (ou None)
+        coletor = self._coletores.get(job_id)
+        if coletor is not None:
+            return coletor.relatorio()
+        caminho = self._caminho(job_id, "desempenho.json")
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _anexar_resultado(self, job_id, resultado):
+        registro = {
+            "linha": linha_para_json(resultado.linha),
+            "regras": resultado.regras,
+            "fraude": resultado.fraude,
+        }
+        if resultado.erro:
+            registro["erro"] = resultado.erro
+        with self._lock, open(self._caminho(job_id, "resultados.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+
+    def cancelar(self, job_id):
+        cancelamento = self._cancelamentos.get(job_id)
+        if cancelamento:
+            cancelamento.set()
+
+    def ativo(self, job_id):
+        futuro = self._futuros.get(job_id)
+        return bool(futuro and not futuro.done())
+
+    def status(self, job_id):
+        estado = self._ler_estado(job_id)
+        if estado["estado"] in (ESTADO_PENDENTE, ESTADO_EXECUTANDO) and not self.ativo(job_id):
+            estado["estado"] = ESTADO_INTERROMPIDO
+        estado["concluidas"] = len(self.resultados(job_id))
+        return estado
+
+    def resultados(self, job_id):
+        # Uma transação refeita ao retomar aparece de novo no arquivo: vale o registro mais recente
+        registros = {}
+        with open(self._caminho(job_id, "resultados.jsonl"), "r", encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    # Última linha cortada por uma queda no meio da escrita: será refeita
+                    continue
+                registros.pop(registro["linha"]["id_transacao"], None)
+                registros[registro["linha"]["id_transacao"]] = registro
+        return list(registros.values())
+
+    def listar(self):
+        jobs = []
+        for job_id in os.listdir(self.diretorio):
+            if os.path.exists(self._caminho(job_id, "job.json")):
+                jobs.append(self.status(job_id))
+        return sorted(jobs, key=lambda j: j["criado_em"], reverse=True)
@@ -0,0 +1,50 @@
+import json
+import time
+
+# --- LATÊNCIA PERCEBIDA (Streaming de tokens) ---
+# Envolve o gerador de tokens de uma chain (`chain.stream(...)`) e mede o tempo até o
+# primeiro token (TTFT) e o tempo total de cada resposta. Cada medição vira uma linha
+# em ARQUIVO_LATENCIAS para acompanhar a evolução ao longo do tempo.
+
+ARQUIVO_LATENCIAS = "./latencias.jsonl"
+
+
+class MedidorStream:
+    def __init__(self, tokens, origem, arquivo=ARQUIVO_LATENCIAS):
+        self.tokens = tokens
+        self.origem = origem
+        self.arquivo = arquivo
+        self.primeiro_token = None   # segundos
+        self.total = None            # segundos
+        self.qtd_tokens = 0
+
+    def __iter__(self):
+        inicio = time.perf_counter()
+        try:
+            for token in self.tokens:
+                if self.primeiro_token is None:
+                    self.primeiro_token = time.perf_counter() - inicio
+                self.qtd_tokens += 1
+                yield token
+        finally:
+            # Também registra respostas interrompidas no meio
+            self.total = time.perf_counter() - inicio
+            self._registrar()
+
+    def _registrar(self):
+        if not self.arquivo:
+            return
+        registro = {
+            "origem": self.origem,
+            "quando": time.time(),
+            "primeiro_token_ms": round(self.primeiro_token * 1000, 1) if self.primeiro_token is not None else None,
+            "total_ms": round(self.total * 1000, 1),
+            "tokens": self.qtd_tokens,
+        }
+        with open(self.arquivo, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro) + "\n")
+
+    def resumo(self):
+        if self.primeiro_token is None:
+            return "sem tokens"
+        return f"primeiro token em {self.primeiro_token * 1000:.0f} ms · total {self.total:.1f} s"
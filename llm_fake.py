@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# --- MODELO FALSO (Substituto local do ChatGroq para testes e demos offline) ---
+# Responde de forma determinística com base no texto do prompt e simula a latência da API.
+# O uso de tokens (usage_metadata) é estimado contando palavras, só para as métricas terem números.
+
+
+class ChatFalso(BaseChatModel):
+    model_name: str = "toby-fake"
+    latencia: float = 0.2   # segundos por chamada
+    variacao: float = 0.0   # jitter máximo (segundos) somado à latência
+    semente: int = 42
+    limite_reprovacao: float = 500.0
+    lote_malformado: bool = False   # força o fallback unitário da auditoria em lote
+    latencia_token: float = 0.0     # intervalo entre tokens no streaming (após o primeiro)
+
+    @property
+    def _llm_type(self):
+        return "toby-fake"
+
+    def _tempo_resposta(self, texto):
+        if not self.variacao:
+            return self.latencia
+        # Jitter reprodutível: a mesma entrada sempre demora o mesmo tempo
+        gerador = random.Random(f"{self.semente}:{texto}")
+        return self.latencia + gerador.uniform(0, self.variacao)
+
+    def _responder_lote(self, texto):
+        if self.lote_malformado:
+            return "Claro! Aqui está a análise das transações solicitadas."
+        linhas = []
+        for id_transacao, valor in re.findall(r"ID: (\S+) .*?Valor: \$([\d.]+)", texto):
+            alto = float(valor) > self.limite_reprovacao
+            if '"status"' in texto:
+                item = {"id_transacao": id_transacao, "status": "REPROVADO" if alto else "APROVADO",
+                        "motivo": "Valor acima da alçada." if alto else "Dentro dos limites."}
+            else:
+                item = {"id_transacao": id_transacao, "risco": "BAIXO", "evidencia": "Nenhuma"}
+            linhas.append(json.dumps(item, ensure_ascii=False))
+        return "\n".join(linhas)
+
+    def _responder(self, texto):
+        if "uma linha JSON por transação" in texto:
+            return self._responder_lote(texto)
+        valor = re.search(r"Valor: \$([\d.]+)", texto)
+        valor = float(valor.group(1)) if valor else 0.0
+        alto = valor > self.limite_reprovacao
+
+        if "STATUS:" in texto:
+            if alto:
+                return "STATUS: REPROVADO\nMOTIVO: Valor acima da alçada permitida para a categoria."
+            return "STATUS: APROVADO\nMOTIVO: Dentro dos limites da política."
+        if "RISCO:" in texto:
+            return "RISCO: BAIXO\nEVIDÊNCIA: Nenhuma"
+        if "REPROVADO" in texto:
+            return "REPROVADO: valor acima da alçada." if alto else "APROVADO."
+        if "ALTO RISCO" in texto:
+            return "BAIXO RISCO. Nenhum e-mail suspeito."
+        return "Não sei. Fale com o Michael."
+
+    def _uso(self, texto, resposta):
+        entrada, saida = len(texto.split()), len(resposta.split())
+        return {"input_tokens": entrada, "output_tokens": saida, "total_tokens": entrada + saida}
+
+    def _resultado(self, texto):
+        resposta = self._responder(texto)
+        mensagem = AIMessage(content=resposta, usage_metadata=self._uso(texto, resposta))
+        return ChatResult(generations=[ChatGeneration(message=mensagem)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        texto = "\n".join(str(m.content) for m in messages)
+        time.sleep(self._tempo_resposta(texto))
+        return self._resultado(texto)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        texto = "\n".join(str(m.content) for m in messages)
+        await asyncio.sleep(self._tempo_resposta(texto))
+        return self._resultado(texto)
+
+    def _tokens(self, texto):
+        # "Palavras" com o espaço/quebra de linha que vem depois, como chegariam da API
+        return re.findall(r"\S+\s*", self._responder(texto))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        texto = "\n".join(str(m.content) for m in messages)
+        time.sleep(self._tempo_resposta(texto))
+        for i, token in enumerate(self._tokens(texto)):
+            if i:
+                time.sleep(self.latencia_token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        # Como na Groq, o uso de tokens chega num último pedaço sem texto
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._uso(texto, self._responder(texto))))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        texto = "\n".join(str(m.content) for m in messages)
+        await asyncio.sleep(self._tempo_resposta(texto))
+        for i, token in enumerate(self._tokens(texto)):
+            if i:
+                await asyncio.sleep(self.latencia_token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._uso(texto, self._responder(texto))))
+
+
+# --- SERVIDOR FALSO (API da Groq na máquina local, com falhas injetadas) ---
+# Responde em /openai/v1/chat/completions como a Groq (JSON ou SSE com stream=true), com as
+# respostas do ChatFalso e os cabeçalhos x-ratelimit-*. Injeta 429 (com retry-after), 500,
+# picos de latência e modelos fora do ar, para exercitar o llm_resiliente.py de verdade:
+#   python llm_fake.py --porta 8799 --taxa-429 0.2 --taxa-pico 0.05 --fora llama-3.1-8b-instant
+#   export GROQ_API_BASE=http://127.0.0.1:8799 GROQ_API_KEY=falsa
+
+
+class ServidorFalso:
+    def __init__(self, porta=0, latencia=0.05, taxa_429=0.0, taxa_500=0.0, taxa_pico=0.0, pico=2.0,
+                 requisicoes_por_minuto=None, modelos_fora=(), latencia_token=0.0, semente=42):
+        self.latencia = latencia
+        self.taxa_429 = taxa_429
+        self.taxa_500 = taxa_500
+        self.taxa_pico = taxa_pico
+        self.pico = pico
+        self.requisicoes_por_minuto = requisicoes_por_minuto
+        self.modelos_fora = set(modelos_fora)
+        self.latencia_token = latencia_token
+        self.respostas = {}   # (modelo, status) -> quantidade
+        self._modelo = ChatFalso()
+        self._sorteio = random.Random(semente)
+        self._janelas = {}    # modelo -> (início da janela de 60 s, requisições nela)
+        self._trava = threading.Lock()
+        self._http = ThreadingHTTPServer(("127.0.0.1", porta), self._manipulador())
+        self._http.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._http.server_address[1]}"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def _decidir(self, modelo):
+        # -> (status, cabeçalhos de limite, atraso extra)
+        with self._trava:
+            sorteio, pico = self._sorteio.random(), self._sorteio.random()
+            agora = time.monotonic()
+            inicio, usadas = self._janelas.get(modelo, (agora, 0))
+            if agora - inicio >= 60:
+                inicio, usadas = agora, 0
+            reset = 60 - (agora - inicio)
+            limite = self.requisicoes_por_minuto or 1_000_000
+            cabecalhos = {
+                "x-ratelimit-limit-requests": str(limite),
+                "x-ratelimit-remaining-requests": str(max(0, limite - usadas - 1)),
+                "x-ratelimit-reset-requests": f"{reset:.2f}s",
+                "x-ratelimit-limit-tokens": "1000000",
+                "x-ratelimit-remaining-tokens": "1000000",
+                "x-ratelimit-reset-tokens": "0s",
+            }
+            if modelo in self.modelos_fora:
+                status = 503
+            elif usadas >= limite:
+                status = 429
+                cabecalhos.update({"retry-after": str(max(1, round(reset))), "x-ratelimit-remaining-requests": "0"})
+            elif sorteio < self.taxa_429:
+                status = 429
+                cabecalhos["retry-after"] = "1"
+            elif sorteio < self.taxa_429 + self.taxa_500:
+                status = 500
+            else:
+                status = 200
+                usadas += 1
+            self._janelas[modelo] = (inicio, usadas)
+            self.respostas[(modelo, status)] = self.respostas.get((modelo, status), 0) + 1
+        return status, cabecalhos, self.pico if pico < self.taxa_pico else 0.0
+
+    def _manipulador(self):
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, status, corpo, cabecalhos):
+                dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                for nome, valor in {**cabecalhos, "content-type": "application/json"}.items():
+                    self.send_header(nome, valor)
+                self.send_header("content-length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def _evento(self, dados):
+                linha = f"data: {dados if isinstance(dados, str) else json.dumps(dados, ensure_ascii=False)}\n\n"
+                self.wfile.write(linha.encode("utf-8"))
+                self.wfile.flush()
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/openai/v1/chat/completions":
+                    self._json(404, {"error": {"message": "Rota desconhecida", "type": "invalid_request_error"}}, {})
+                    return
+                pedido = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+                modelo = pedido.get("model", "")
+                status, cabecalhos, atraso = servidor._decidir(modelo)
+                time.sleep(servidor.latencia + atraso)
+                if status != 200:
+                    tipo = {429: "rate_limit_exceeded", 503: "service_unavailable"}.get(status, "internal_server_error")
+                    self._json(status, {"error": {"message": f"Falha simulada ({status})", "type": tipo, "code": tipo}}, cabecalhos)
+                    return
+
+                texto = "\n".join(str(m.get("content", "")) for m in pedido.get("messages", []))
+                resposta = servidor._modelo._responder(texto)
+                uso = servidor._modelo._uso(texto, resposta)
+                uso = {"prompt_tokens": uso["input_tokens"], "completion_tokens": uso["output_tokens"], "total_tokens": uso["total_tokens"]}
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": modelo}
+                if not pedido.get("stream"):
+                    self._json(200, {
+                        **base, "object": "chat.completion",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": resposta}, "finish_reason": "stop"}],
+                        "usage": uso,
+                    }, cabecalhos)
+                    return
+
+                self.send_response(200)
+                for nome, valor in {**cabecalhos, "content-type": "text/event-stream", "connection": "close"}.items():
+                    self.send_header(nome, valor)
+                self.end_headers()
+                self.close_connection = True
+                for i, token in enumerate(servidor._modelo._tokens(texto)):
+                    if i:
+                        time.sleep(servidor.latencia_token)
+                    delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+                    self._evento({**base, "object": "chat.completion.chunk",
+                                  "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                # Como na Groq: o uso de tokens vem no último pedaço, em x_groq
+                self._evento({**base, "object": "chat.completion.chunk",
+                              "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": uso}})
+                self._evento("[DONE]")
+
+        return Manipulador
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--porta", type=int, default=8799)
+    parser.add_argument("--latencia", type=float, default=0.05)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--taxa-500", type=float, default=0.0)
+    parser.add_argument("--taxa-pico", type=float, default=0.0)
+    parser.add_argument("--pico", type=float, default=2.0, help="segundos somados num pico de latência")
+    parser.add_argument("--rpm", type=int, default=None, help="requisições por minuto por modelo")
+    parser.add_argument("--fora", nargs="*", default=[], help="modelos que respondem 503")
+    args = parser.parse_args()
+
+    servidor = ServidorFalso(
+        args.porta, args.latencia, args.taxa_429, args.taxa_500, args.taxa_pico, args.pico, args.rpm, args.fora,
+    )
+    print(f"🧪 API falsa da Groq em {servidor.url} (export GROQ_API_BASE={servidor.url})")
+    try:
+        servidor._http.serve_forever()
+    except KeyboardInterrupt:
+        servidor.parar()
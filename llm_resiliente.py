@@ -0,0 +1,529 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from rastreamento import STATUS_RETENTATIVA, contar, etapa, ganchos_http
+
+# --- CAMADA RESILIENTE DA LLM (Envolve o ChatGroq em todos os scripts) ---
+# Um 429 ou um timeout não derrubam mais a varredura no meio do CSV:
+#   1. Limites da API: quando os cabeçalhos x-ratelimit-remaining-* da Groq chegam a zero,
+#      todas as chamadas ao modelo esperam o x-ratelimit-reset-* (pausa compartilhada).
+#   2. Retentativas com backoff exponencial e jitter; o retry-after de um 429 vale para a
+#      chamada que o recebeu (nunca se tenta de novo antes dele).
+#   3. Disjuntor por modelo: depois de FALHAS_PARA_ABRIR falhas seguidas (5xx, timeout; um 429
+#      é só limite e não conta) o modelo fica TEMPO_ABERTO segundos sem receber chamadas;
+#      depois disso uma chamada de teste decide.
+#   4. Modelo reserva: com as tentativas do principal esgotadas, o disjuntor aberto ou uma
+#      pausa da API maior que ESPERA_MAXIMA, vai para o próximo. O último modelo da lista
+#      espera pausas de até PAUSA_MAXIMA (a janela por minuto da Groq); acima disso (cota do
+#      dia acabou) a chamada falha.
+#   5. Chamadas idênticas em andamento (mesmas mensagens, mesmo modo) viram uma só: quem chega
+#      depois espera a resposta do primeiro, inclusive em streaming (vários analistas no
+#      Streamlit fazendo a mesma pergunta pagam uma chamada só).
+# ChatResiliente é um chat model do LangChain: entra no lugar do ChatGroq em `prompt | llm`,
+# invoke/ainvoke e stream/astream. Para testar sem a Groq: llm_fake.py (ServidorFalso).
+
+MODELO_PRINCIPAL = os.getenv("TOBY_LLM_MODELO", "llama-3.1-8b-instant")
+MODELO_RESERVA = os.getenv("TOBY_LLM_RESERVA", "llama-3.3-70b-versatile")   # "" desliga a reserva
+TIMEOUT_LLM = 30.0              # segundos por requisição HTTP
+MAX_TENTATIVAS = 4              # por modelo
+ESPERA_BASE = 0.5               # segundos; dobra a cada tentativa
+ESPERA_MAXIMA = 20.0
+PAUSA_MAXIMA = 90.0
+FALHAS_PARA_ABRIR = 5
+TEMPO_ABERTO = 30.0
+MINIMO_TOKENS_RESTANTES = 1000  # abaixo disso na janela da API, espera o reset (~ um prompt de auditoria)
+
+
+class LLMIndisponivel(Exception):
+    pass
+
+
+def _segundos(texto):
+    # Formatos da Groq: "2", "7.66s", "2m59.56s", "1h2m3s", "120ms" -> segundos
+    texto = str(texto).strip()
+    try:
+        return float(texto)
+    except ValueError:
+        pass
+    total = 0.0
+    for numero, unidade in re.findall(r"([\d.]+)(ms|h|m|s)", texto):
+        total += float(numero) * {"ms": 0.001, "h": 3600, "m": 60, "s": 1}[unidade]
+    return total
+
+
+# --- LIMITES DA API ---
+class LimitesApi:
+    # Pausa compartilhada de um modelo, alimentada pelos cabeçalhos de cada resposta HTTP
+    def __init__(self):
+        self._pausa_ate = 0.0
+        self._trava = threading.Lock()
+
+    def observar(self, cabecalhos):
+        pausas = []
+        for recurso, minimo in (("requests", 1), ("tokens", MINIMO_TOKENS_RESTANTES)):
+            restante = cabecalhos.get(f"x-ratelimit-remaining-{recurso}")
+            reset = cabecalhos.get(f"x-ratelimit-reset-{recurso}")
+            if restante is not None and reset and float(restante) < minimo:
+                pausas.append(_segundos(reset))
+        if pausas:
+            with self._trava:
+                self._pausa_ate = max(self._pausa_ate, time.monotonic() + max(pausas))
+
+    def espera(self, folga=0.0):
+        # folga aleatória depois da pausa: o reset vem arredondado e as chamadas paradas
+        # não devem acordar todas no mesmo instante
+        restante = self._pausa_ate - time.monotonic()
+        return restante + random.uniform(0, folga) if restante > 0 else 0.0
+
+    def ganchos_http(self, assincrono=False):
+        # event_hooks do httpx: as métricas de rastreamento.py + a leitura dos cabeçalhos
+        def observar(resposta):
+            self.observar(resposta.headers)
+
+        async def aobservar(resposta):
+            self.observar(resposta.headers)
+
+        ganchos = ganchos_http(assincrono)
+        ganchos["response"] = ganchos["response"] + [aobservar if assincrono else observar]
+        return ganchos
+
+
+# --- DISJUNTOR ---
+class Disjuntor:
+    def __init__(self, nome, limite_falhas=FALHAS_PARA_ABRIR, tempo_aberto=TEMPO_ABERTO):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self._falhas = 0
+        self._aberto_ate = None
+        self._testando = False
+        self._trava = threading.Lock()
+
+    def estado(self):
+        if self._aberto_ate is None:
+            return "fechado"
+        return "aberto" if time.monotonic() < self._aberto_ate else "meio-aberto"
+
+    def permitir(self):
+        # Meio-aberto: só uma chamada de teste por vez
+        with self._trava:
+            if self._aberto_ate is None:
+                return True
+            if time.monotonic() < self._aberto_ate or self._testando:
+                return False
+            self._testando = True
+            return True
+
+    def sucesso(self):
+        with self._trava:
+            self._falhas = 0
+            self._aberto_ate = None
+            self._testando = False
+
+    def desistir(self):
+        # Quem ganhou a chamada de teste e não chegou a usá-la (ex: erro 400) a devolve
+        with self._trava:
+            self._testando = False
+
+    def falha(self):
+        with self._trava:
+            self._falhas += 1
+            fechado = self._aberto_ate is None
+            if self._testando or (fechado and self._falhas >= self.limite_falhas):
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
+                self._testando = False
+                contar("llm_disjuntor_aberto", modelo=self.nome)
+
+
+def _retentavel(erro):
+    # Erros do SDK da Groq têm status_code; timeouts e quedas de conexão não
+    status = getattr(erro, "status_code", None)
+    if status is not None:
+        return status in STATUS_RETENTATIVA
+    return isinstance(erro, (TimeoutError, ConnectionError)) or type(erro).__name__ in (
+        "APITimeoutError", "APIConnectionError", "TimeoutException", "ConnectError", "ReadTimeout",
+        "RemoteProtocolError",
+    )
+
+
+def _nome(modelo):
+    return getattr(modelo, "model_name", None) or getattr(modelo, "model", None) or type(modelo).__name__
+
+
+# --- CHAMADAS COMPARTILHADAS ---
+class _EmAndamento:
+    # Resultado (ou pedaços de streaming) de uma chamada que outras idênticas estão esperando.
+    # Quem espera pode estar em outra thread (sessões do Streamlit) ou em outro event loop.
+    def __init__(self):
+        self.pedacos = []
+        self.resultado = None
+        self.erro = None
+        self.fim = False
+        self._condicao = threading.Condition()
+        self._eventos = []   # (loop, asyncio.Event) de quem espera com await
+
+    def _avisar(self):
+        # Chamado com a condição adquirida
+        self._condicao.notify_all()
+        for loop, evento in self._eventos:
+            loop.call_soon_threadsafe(evento.set)
+
+    def publicar(self, pedaco):
+        with self._condicao:
+            self.pedacos.append(pedaco)
+            self._avisar()
+
+    def concluir(self, resultado=None, erro=None):
+        with self._condicao:
+            self.resultado, self.erro, self.fim = resultado, erro, True
+            self._avisar()
+
+    def acompanhar(self):
+        # Gerador: pedaços já publicados e os que vierem, até o fim
+        lidos = 0
+        while True:
+            with self._condicao:
+                while lidos == len(self.pedacos) and not self.fim:
+                    self._condicao.wait()
+                novos, fim, erro = self.pedacos[lidos:], self.fim, self.erro
+            lidos += len(novos)
+            yield from novos
+            if fim and lidos == len(self.pedacos):
+                if erro is not None:
+                    raise erro
+                return
+
+    async def aacompanhar(self):
+        evento = asyncio.Event()
+        registro = (asyncio.get_running_loop(), evento)
+        with self._condicao:
+            self._eventos.append(registro)
+        lidos = 0
+        try:
+            while True:
+                with self._condicao:
+                    # Limpo antes de ler: um aviso depois daqui acorda o await abaixo
+                    evento.clear()
+                    novos, fim, erro = self.pedacos[lidos:], self.fim, self.erro
+                lidos += len(novos)
+                for pedaco in novos:
+                    yield pedaco
+                if fim and lidos == len(self.pedacos):
+                    if erro is not None:
+                        raise erro
+                    return
+                if not novos:
+                    await evento.wait()
+        finally:
+            with self._condicao:
+                self._eventos.remove(registro)
+
+    def esperar(self):
+        for _ in self.acompanhar():
+            pass
+        return self.resultado
+
+    async def aesperar(self):
+        async for _ in self.aacompanhar():
+            pass
+        return self.resultado
+
+
+def _copia_sem_uso(mensagem):
+    # Cópia para quem pegou carona: o LangChain altera a mensagem (id, metadados) e os
+    # tokens já foram contados na chamada original
+    copia = copy.deepcopy(mensagem)
+    copia.usage_metadata = None
+    return copia
+
+
+class ChatResiliente(BaseChatModel):
+    modelos: list                 # [principal, reserva, ...] (chat models do LangChain)
+    limites: list = []            # LimitesApi de cada modelo (criados aqui se vazio)
+    max_tentativas: int = MAX_TENTATIVAS
+    espera_base: float = ESPERA_BASE
+    espera_maxima: float = ESPERA_MAXIMA
+    pausa_maxima: float = PAUSA_MAXIMA
+    falhas_para_abrir: int = FALHAS_PARA_ABRIR
+    tempo_aberto: float = TEMPO_ABERTO
+    compartilhar: bool = True     # junta chamadas idênticas em andamento
+
+    _disjuntores: list = PrivateAttr(default_factory=list)
+    _em_andamento: dict = PrivateAttr(default_factory=dict)
+    _trava: object = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **dados):
+        super().__init__(**dados)
+        if not self.limites:
+            self.limites = [LimitesApi() for _ in self.modelos]
+        self._disjuntores = [
+            Disjuntor(_nome(m), self.falhas_para_abrir, self.tempo_aberto) for m in self.modelos
+        ]
+
+    @property
+    def _llm_type(self):
+        return "toby-resiliente"
+
+    @property
+    def model_name(self):
+        # Nome do principal: as chaves dos caches (veredictos, semântico) não mudam
+        return _nome(self.modelos[0])
+
+    def estado(self):
+        return {_nome(m): d.estado() for m, d in zip(self.modelos, self._disjuntores)}
+
+    def _mensagem_indisponivel(self, erro):
+        estados = ", ".join(f"{nome}: {estado}" for nome, estado in self.estado().items())
+        motivo = f"Último erro: {erro}" if erro else "Disjuntores abertos ou pausa da API longa demais."
+        return f"Nenhum modelo respondeu ({estados}). {motivo}"
+
+    # --- RETENTATIVAS / RESERVA ---
+    def _espera(self, tentativa, limites):
+        # Backoff exponencial com jitter completo, respeitando a pausa pedida pela API
+        janela = min(self.espera_maxima, self.espera_base * 2 ** tentativa)
+        return max(limites.espera(self.espera_base), random.uniform(0, janela))
+
+    def _candidatos(self):
+        for i, (modelo, limites, disjuntor) in enumerate(zip(self.modelos, self.limites, self._disjuntores)):
+            if not disjuntor.permitir():
+                contar("llm_disjuntor_pulos", modelo=disjuntor.nome)
+                continue
+            if i:
+                contar("llm_reserva", modelo=disjuntor.nome)
+            # Pausa aceitável: curta se ainda há reserva depois deste modelo
+            teto = self.espera_maxima if i + 1 < len(self.modelos) else self.pausa_maxima
+            yield modelo, limites, disjuntor, teto
+
+    def _falhou(self, erro, tentativa, limites, disjuntor, teto):
+        # -> segundos até a próxima tentativa no mesmo modelo, ou None para ir ao próximo
+        cabecalhos = getattr(getattr(erro, "response", None), "headers", None) or {}
+        limites.observar(cabecalhos)
+        if not _retentavel(erro):
+            return None
+        if getattr(erro, "status_code", None) != 429:
+            disjuntor.falha()
+        if tentativa + 1 >= self.max_tentativas or disjuntor.estado() != "fechado":
+            return None
+        espera = max(_segundos(cabecalhos.get("retry-after") or 0), self._espera(tentativa, limites))
+        if espera > teto:
+            return None
+        contar("llm_tentativas_extras", modelo=disjuntor.nome)
+        return espera
+
+    def _executar(self, chamar):
+        ultimo_erro = None
+        for modelo, limites, disjuntor, teto in self._candidatos():
+            for tentativa in range(self.max_tentativas):
+                if limites.espera() > teto:
+                    break
+                pausa = limites.espera(self.espera_base)
+                if pausa:
+                    with etapa("espera_limite_api"):
+                        time.sleep(pausa)
+                try:
+                    resultado = chamar(modelo)
+                except Exception as e:
+                    ultimo_erro = e
+                    espera = self._falhou(e, tentativa, limites, disjuntor, teto)
+                    if espera is None:
+                        break
+                    with etapa("espera_retentativa"):
+                        time.sleep(espera)
+                    continue
+                disjuntor.sucesso()
+                return resultado
+            disjuntor.desistir()
+        raise LLMIndisponivel(self._mensagem_indisponivel(ultimo_erro)) from ultimo_erro
+
+    async def _aexecutar(self, chamar):
+        ultimo_erro = None
+        for modelo, limites, disjuntor, teto in self._candidatos():
+            for tentativa in range(self.max_tentativas):
+                if limites.espera() > teto:
+                    break
+                pausa = limites.espera(self.espera_base)
+                if pausa:
+                    with etapa("espera_limite_api"):
+                        await asyncio.sleep(pausa)
+                try:
+                    resultado = await chamar(modelo)
+                except Exception as e:
+                    ultimo_erro = e
+                    espera = self._falhou(e, tentativa, limites, disjuntor, teto)
+                    if espera is None:
+                        break
+                    with etapa("espera_retentativa"):
+                        await asyncio.sleep(espera)
+                    continue
+                disjuntor.sucesso()
+                return resultado
+            disjuntor.desistir()
+        raise LLMIndisponivel(self._mensagem_indisponivel(ultimo_erro)) from ultimo_erro
+
+    # --- CHAMADAS COMPARTILHADAS ---
+    def _chave(self, modo, messages, stop, kwargs):
+        material = json.dumps(
+            [modo, [(m.type, m.content) for m in messages], stop, kwargs], ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _entrar(self, chave):
+        # -> (_EmAndamento, True se esta chamada é a que vai de fato à API)
+        with self._trava:
+            if chave in self._em_andamento:
+                contar("llm_compartilhadas")
+                return self._em_andamento[chave], False
+            andamento = self._em_andamento[chave] = _EmAndamento()
+            return andamento, True
+
+    def _sair(self, chave, andamento, resultado=None, erro=None):
+        with self._trava:
+            if self._em_andamento.get(chave) is andamento:
+                del self._em_andamento[chave]
+        if isinstance(erro, Exception) or erro is None:
+            andamento.concluir(resultado, erro)
+        else:
+            # Cancelamento/gerador fechado de quem chamou: quem espera recebe um erro comum
+            andamento.concluir(erro=LLMIndisponivel("A chamada compartilhada foi interrompida."))
+
+    # --- INTERFACE DO LANGCHAIN ---
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        chave = self._chave("invoke", messages, stop, kwargs)
+        andamento, primeiro = self._entrar(chave) if self.compartilhar else (None, True)
+        if not primeiro:
+            resultado = andamento.esperar()
+            return ChatResult(generations=[ChatGeneration(message=_copia_sem_uso(resultado))])
+        resultado = erro = None
+        try:
+            resultado = self._executar(lambda modelo: modelo.invoke(messages, stop=stop, **kwargs))
+            return ChatResult(generations=[ChatGeneration(message=resultado)])
+        except BaseException as e:
+            erro = e
+            raise
+        finally:
+            if andamento:
+                self._sair(chave, andamento, resultado, erro)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        chave = self._chave("invoke", messages, stop, kwargs)
+        andamento, primeiro = self._entrar(chave) if self.compartilhar else (None, True)
+        if not primeiro:
+            resultado = await andamento.aesperar()
+            return ChatResult(generations=[ChatGeneration(message=_copia_sem_uso(resultado))])
+        resultado = erro = None
+        try:
+            resultado = await self._aexecutar(lambda modelo: modelo.ainvoke(messages, stop=stop, **kwargs))
+            return ChatResult(generations=[ChatGeneration(message=resultado)])
+        except BaseException as e:
+            erro = e
+            raise
+        finally:
+            if andamento:
+                self._sair(chave, andamento, resultado, erro)
+
+    def _abrir_stream(self, modelo, messages, stop, kwargs):
+        # Erros de limite/conexão aparecem até o primeiro pedaço: só essa parte é repetida.
+        # Depois que o texto começou a sair, uma falha sobe para quem chamou.
+        pedacos = modelo.stream(messages, stop=stop, **kwargs)
+        return next(pedacos, None), pedacos
+
+    async def _aabrir_stream(self, modelo, messages, stop, kwargs):
+        pedacos = modelo.astream(messages, stop=stop, **kwargs).__aiter__()
+        try:
+            return await pedacos.__anext__(), pedacos
+        except StopAsyncIteration:
+            return None, pedacos
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        chave = self._chave("stream", messages, stop, kwargs)
+        andamento, primeiro = self._entrar(chave) if self.compartilhar else (None, True)
+        if not primeiro:
+            for pedaco in andamento.acompanhar():
+                yield ChatGenerationChunk(message=_copia_sem_uso(pedaco))
+            return
+        erro = None
+        try:
+            inicial, pedacos = self._executar(lambda modelo: self._abrir_stream(modelo, messages, stop, kwargs))
+            if inicial is not None:
+                for pedaco in _encadear(inicial, pedacos):
+                    if andamento:
+                        andamento.publicar(copy.deepcopy(pedaco))
+                    if run_manager:
+                        run_manager.on_llm_new_token(pedaco.content, chunk=ChatGenerationChunk(message=pedaco))
+                    yield ChatGenerationChunk(message=pedaco)
+        except BaseException as e:
+            erro = e
+            raise
+        finally:
+            if andamento:
+                self._sair(chave, andamento, erro=erro)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        chave = self._chave("stream", messages, stop, kwargs)
+        andamento, primeiro = self._entrar(chave) if self.compartilhar else (None, True)
+        if not primeiro:
+            async for pedaco in andamento.aacompanhar():
+                yield ChatGenerationChunk(message=_copia_sem_uso(pedaco))
+            return
+        erro = None
+        try:
+            inicial, pedacos = await self._aexecutar(
+                lambda modelo: self._aabrir_stream(modelo, messages, stop, kwargs)
+            )
+            if inicial is not None:
+                async for pedaco in _aencadear(inicial, pedacos):
+                    if andamento:
+                        andamento.publicar(copy.deepcopy(pedaco))
+                    if run_manager:
+                        await run_manager.on_llm_new_token(pedaco.content, chunk=ChatGenerationChunk(message=pedaco))
+                    yield ChatGenerationChunk(message=pedaco)
+        except BaseException as e:
+            erro = e
+            raise
+        finally:
+            if andamento:
+                self._sair(chave, andamento, erro=erro)
+
+
+def _encadear(inicial, pedacos):
+    yield inicial
+    yield from pedacos
+
+
+async def _aencadear(inicial, pedacos):
+    yield inicial
+    async for pedaco in pedacos:
+        yield pedaco
+
+
+# --- FÁBRICA ---
+def criar_llm(modelo=MODELO_PRINCIPAL, reserva=MODELO_RESERVA, limites_conexao=None, **opcoes):
+    # ChatGroq principal + reserva, cada um com seus clientes HTTP (os limites da Groq são por
+    # modelo). O SDK não repete nada sozinho (max_retries=0): quem decide é o ChatResiliente.
+    # GROQ_API_BASE=http://127.0.0.1:8799 aponta tudo para o ServidorFalso do llm_fake.py.
+    import httpx
+    from langchain_groq import ChatGroq
+
+    modelos, limites = [], []
+    extras = {"limits": limites_conexao} if limites_conexao else {}
+    for nome in dict.fromkeys(n for n in (modelo, reserva) if n):
+        limite = LimitesApi()
+        modelos.append(ChatGroq(
+            model_name=nome, max_retries=0, request_timeout=TIMEOUT_LLM,
+            http_client=httpx.Client(event_hooks=limite.ganchos_http(), **extras),
+            http_async_client=httpx.AsyncClient(event_hooks=limite.ganchos_http(assincrono=True), **extras),
+            **opcoes,
+        ))
+        limites.append(limite)
+    return ChatResiliente(modelos=modelos, limites=limites)
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from rastreamento import etapa
+
+# --- MODELO DE EMBEDDINGS (all-MiniLM-L6-v2) ---
+# Um só lugar decide como os embeddings são calculados. TOBY_EMBEDDINGS escolhe o backend:
+#   torch      -> HuggingFaceEmbeddings (sentence-transformers + PyTorch), o padrão
+#   onnx       -> o mesmo modelo exportado para ONNX, rodando no onnxruntime (sem torch)
+#   onnx-int8  -> versão quantizada em 8 bits: mais rápida e leve, vetores levemente diferentes
+# Os backends ONNX só precisam de onnxruntime, tokenizers e huggingface_hub, que sobem em
+# uma fração do tempo do torch (veja benchmarks/bench_importacao.py).
+
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
+VARIAVEL_BACKEND = "TOBY_EMBEDDINGS"
+BACKEND_PADRAO = "torch"
+ARQUIVOS_ONNX = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+TAMANHO_MAXIMO_TOKENS = 256   # max_seq_length do all-MiniLM-L6-v2 no sentence-transformers
+TAMANHO_LOTE = 32
+
+
+class EmbeddingsOnnx(Embeddings):
+    # Reproduz o pipeline do sentence-transformers: tokenização, transformer,
+    # média dos tokens reais (mean pooling) e normalização L2
+    def __init__(self, arquivo_modelo=ARQUIVOS_ONNX["onnx"], modelo=MODELO_EMBEDDINGS, tamanho_lote=TAMANHO_LOTE, threads=None):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        # Baixa uma vez para o cache do Hugging Face; depois funciona offline (HF_HUB_OFFLINE=1)
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(modelo, "tokenizer.json"))
+        self.tokenizer.enable_truncation(TAMANHO_MAXIMO_TOKENS)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+
+        opcoes = ort.SessionOptions()
+        if threads:
+            opcoes.intra_op_num_threads = threads
+        self.sessao = ort.InferenceSession(hf_hub_download(modelo, arquivo_modelo), opcoes, providers=["CPUExecutionProvider"])
+        self.entradas = {entrada.name for entrada in self.sessao.get_inputs()}
+        self.tamanho_lote = tamanho_lote
+
+    def _vetorizar(self, textos):
+        codificados = self.tokenizer.encode_batch(textos)
+        mascara = np.array([c.attention_mask for c in codificados], dtype=np.int64)
+        entradas = {
+            "input_ids": np.array([c.ids for c in codificados], dtype=np.int64),
+            "attention_mask": mascara,
+        }
+        if "token_type_ids" in self.entradas:
+            entradas["token_type_ids"] = np.array([c.type_ids for c in codificados], dtype=np.int64)
+
+        tokens = self.sessao.run(None, entradas)[0]   # last_hidden_state: (lote, tokens, 384)
+        peso = mascara[..., None].astype(np.float32)
+        media = (tokens * peso).sum(axis=1) / np.clip(peso.sum(axis=1), 1e-9, None)
+        return media / np.clip(np.linalg.norm(media, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        # Lotes de textos de tamanho parecido: menos padding, menos tokens inúteis no transformer
+        ordem = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vetores = [None] * len(texts)
+        for inicio in range(0, len(ordem), self.tamanho_lote):
+            lote = ordem[inicio:inicio + self.tamanho_lote]
+            for i, vetor in zip(lote, self._vetorizar([texts[i] for i in lote])):
+                vetores[i] = vetor.tolist()
+        return vetores
+
+    def embed_query(self, text):
+        return self._vetorizar([text])[0].tolist()
+
+
+class EmbeddingsMedidos(Embeddings):
+    # Envolve qualquer modelo de embeddings para que as chamadas feitas por dentro do banco
+    # vetorial (add_documents na ingestão, similarity_search) também virem etapas medidas
+    def __init__(self, embeddings, nome="embeddings"):
+        self.embeddings = embeddings
+        self.nome = nome
+
+    def embed_documents(self, texts):
+        with etapa(self.nome) as atributos:
+            atributos["textos"] = len(texts)
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with etapa(self.nome):
+            return self.embeddings.embed_query(text)
+
+
+def backend_embeddings():
+    return os.getenv(VARIAVEL_BACKEND, BACKEND_PADRAO).strip().lower() or BACKEND_PADRAO
+
+
+def criar_embeddings(backend=None):
+    backend = backend or backend_embeddings()
+    if backend in ARQUIVOS_ONNX:
+        return EmbeddingsOnnx(ARQUIVOS_ONNX[backend])
+    if backend != "torch":
+        raise ValueError(f"{VARIAVEL_BACKEND} inválido: '{backend}' (use torch, {', '.join(ARQUIVOS_ONNX)})")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=MODELO_EMBEDDINGS)
@@ -0,0 +1,134 @@
+import mmap
+import os
+import re
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from ingestao import documento_com_id, id_estavel
+from rastreamento import etapa
+
+# --- PARSER DE E-MAILS EM STREAMING ---
+# Lê o dump com mmap e devolve um e-mail estruturado por vez (gerador), sem carregar o
+# arquivo inteiro na memória. Os cabeçalhos viram metadados no Chroma, permitindo filtrar
+# por remetente ou por período na hora da busca.
+
+SEPARADOR_EMAILS = "-------------------------------------------------------------------------------"
+CAMPOS_CABECALHO = ("De", "Para", "Data", "Assunto")
+FORMATO_DATA = "%Y-%m-%d %H:%M"
+FORMATOS_DATA = ("%Y-%m-%d %H:%M %z", "%Y-%m-%d %H:%M:%S %z", FORMATO_DATA, "%Y-%m-%d")
+BYTES_LIBERAR = 64 * 1024 * 1024   # Devolve ao SO as páginas já lidas a cada 64 MB
+
+
+def _separar_contato(texto):
+    # "Michael Scott <michael.scott@dundermifflin.com>" -> ("Michael Scott", "michael.scott@...")
+    achado = re.match(r"\s*(.*?)\s*<([^>]+)>", texto)
+    if achado:
+        return achado.group(1), achado.group(2).lower()
+    return texto.strip(), ""
+
+
+def contatos(texto):
+    # "A <a@x.com>; B <b@x.com>" -> [("A", "a@x.com"), ("B", "b@x.com")]
+    return [_separar_contato(parte) for parte in re.split(r"[;,](?![^<]*>)", texto) if parte.strip()]
+
+
+def _interpretar_data(texto):
+    # Com fuso no cabeçalho ("2008-04-05 14:00 -0400" ou RFC 2822), a data sai com ele;
+    # sem fuso, é tratada como UTC (nunca como o fuso da máquina que indexa)
+    texto = texto.strip()
+    for formato in FORMATOS_DATA:
+        try:
+            data = datetime.strptime(texto, formato)
+            break
+        except ValueError:
+            continue
+    else:
+        try:
+            data = parsedate_to_datetime(texto)
+        except (TypeError, ValueError):
+            return None
+    return data if data.tzinfo else data.replace(tzinfo=timezone.utc)
+
+
+def interpretar_email(bloco):
+    # Bloco de texto de um e-mail -> dict com De, Para, Data, Assunto e Mensagem.
+    # Devolve None para blocos sem cabeçalho (ex: preâmbulo do dump).
+    cabecalho, _, mensagem = bloco.partition("Mensagem:")
+    campos = {}
+    for linha in cabecalho.splitlines():
+        nome, separador, valor = linha.partition(":")
+        if separador and nome.strip() in CAMPOS_CABECALHO:
+            campos[nome.strip()] = valor.strip()
+    if "De" not in campos:
+        return None
+    return {
+        "De": campos.get("De", ""),
+        "Para": campos.get("Para", ""),
+        "Data": campos.get("Data", ""),
+        "Assunto": campos.get("Assunto", ""),
+        "Mensagem": mensagem.strip(),
+        "texto": bloco.strip(),
+    }
+
+
+def ler_emails(caminho, separador=SEPARADOR_EMAILS):
+    # Gerador: um e-mail por vez, lendo o arquivo via mmap (memória constante)
+    if os.path.getsize(caminho) == 0:
+        return
+    marcador = separador.encode("utf-8")
+    with open(caminho, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        inicio = 0
+        liberado = 0
+        while inicio < len(mm):
+            if hasattr(mm, "madvise") and inicio - liberado >= BYTES_LIBERAR:
+                # Sem isso as páginas mapeadas contam no RSS até o fim do arquivo
+                fim_paginas = inicio - inicio % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, liberado, fim_paginas - liberado)
+                liberado = fim_paginas
+            fim = mm.find(marcador, inicio)
+            if fim == -1:
+                fim = len(mm)
+            with etapa("divisao_emails"):
+                email = interpretar_email(mm[inicio:fim].decode("utf-8", errors="replace"))
+            if email:
+                yield email
+            inicio = fim + len(marcador)
+
+
+def metadados_email(email):
+    de_nome, de_email = _separar_contato(email["De"])
+    para_nome, para_email = _separar_contato(email["Para"])
+    metadados = {
+        "de": email["De"], "de_nome": de_nome, "de_email": de_email,
+        "para": email["Para"], "para_nome": para_nome, "para_email": para_email,
+        "data": email["Data"], "assunto": email["Assunto"],
+    }
+    data = _interpretar_data(email["Data"])
+    if data:
+        # Numéricos para permitir filtros de intervalo ($gte/$lte) no Chroma: data_ts é o
+        # instante em UTC; data_dia é o dia escrito no cabeçalho (o do remetente)
+        metadados["data_ts"] = int(data.astimezone(timezone.utc).timestamp())
+        metadados["data_dia"] = int(data.strftime("%Y%m%d"))
+    return metadados
+
+
+def documentos_emails(caminho):
+    # Gerador de Documents prontos para a ingestão incremental (ID estável pelo cabeçalho)
+    for email in ler_emails(caminho):
+        id_chunk = id_estavel("email", email["De"], email["Data"], email["Assunto"])
+        yield documento_com_id(email["texto"], id_chunk, metadados_email(email))
+
+
+def filtro_emails(remetente=None, data_inicio=None, data_fim=None):
+    # Monta o `where` do Chroma: remetente (nome ou e-mail) e/ou período (datas 'AAAA-MM-DD')
+    condicoes = []
+    if remetente:
+        campo = "de_email" if "@" in remetente else "de_nome"
+        condicoes.append({campo: remetente.lower() if campo == "de_email" else remetente})
+    if data_inicio:
+        condicoes.append({"data_dia": {"$gte": int(data_inicio.replace("-", ""))}})
+    if data_fim:
+        condicoes.append({"data_dia": {"$lte": int(data_fim.replace("-", ""))}})
+    if not condicoes:
+        return None
+    return condicoes[0] if len(condicoes) == 1 else {"$and": condicoes}
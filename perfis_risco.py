@@ -0,0 +1,252 @@
+import json
+import os
+import re
+import shutil
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from banco_vetorial import abrir_banco, diretorio_banco
+from cache_veredictos import impressao_indice
+from indice_pessoas import JANELA_DIAS, chave_pessoa, pessoas_do_email
+from regras_compliance import SITUACAO_AMBIGUA, SITUACAO_VIOLACAO
+from transacoes import ARQUIVO_CSV, carregar_transacoes
+
+# --- PERFIS DE RISCO (pré-calculados, fora da auditoria) ---
+# Uma passada offline dá a cada transação três sinais, cada um saturado entre 0 e 1:
+#   valor      -> z-score do valor entre as compras do mesmo cargo e categoria (só acima da média)
+#   frequencia -> quanto o funcionário usa a categoria além do esperado: participação dela nas
+#                 compras dele / participação no arquivo inteiro (em log2)
+#   emails     -> e-mails com termos suspeitos ("mascarar", "número mágico", "não conta pra
+#                 ninguém", ...) que envolvem o funcionário em ±JANELA_DIAS da compra (db_emails)
+# O risco da transação é a média ponderada dos sinais. O índice (um Parquet por transação e os
+# perfis por funcionário e por categoria) fica ao lado do CSV e é refeito quando o CSV ou o
+# banco de e-mails mudam. Na auditoria, a fila de prioridade soma o risco à situação da triagem
+# e a IA recebe primeiro as transações mais arriscadas, até o orçamento (top-K).
+
+DB_EMAILS = diretorio_banco("./db_emails")
+VERSAO_PERFIS = 1
+MINIMO_GRUPO = 5               # Cargo+categoria com menos compras usa a média/desvio da categoria
+Z_INICIO, Z_SATURACAO = 1.0, 4.0
+LOG_FREQUENCIA_SATURACAO = 3.0  # 8x a participação esperada = sinal cheio
+EMAILS_SATURACAO = 3           # E-mails suspeitos na janela para o sinal cheio
+PESOS = {"valor": 0.45, "frequencia": 0.25, "emails": 0.30}
+LIMIAR_RISCO = 0.5             # Transação "arriscada" nos perfis; conformes acima disso também vão para a fila
+PESO_SITUACAO = {SITUACAO_VIOLACAO: 1.0, SITUACAO_AMBIGUA: LIMIAR_RISCO}
+PRIORIDADE_MINIMA = LIMIAR_RISCO
+TAMANHO_LOTE_EMAILS = 1000
+
+# Expressões sobre o texto sem acento e em minúsculas
+TERMOS_SUSPEITOS = (
+    r"nao conta (pra|para) ninguem", r"ninguem (vai|pode|precisa) saber", r"nunca vai saber", r"mascar\w*",
+    r"nome generico", r"nao escrevam", r"nem olha", r"abaixo de (us)?\$? ?50", r"numero magico", r"keleven",
+    r"favorzinho", r"me responsabilizo", r"aprovou verbalmente", r"esquema\w*", r"ajuste\w*", r"por fora",
+    r"sem recibo", r"lancei como", r"lancar como", r"passa o cartao", r"fica tudo abaixo",
+)
+_PADRAO_SUSPEITO = re.compile(r"\b(" + "|".join(TERMOS_SUSPEITOS) + r")")
+
+
+def diretorio_perfis(caminho=ARQUIVO_CSV):
+    # transacoes_bancarias.csv -> transacoes_bancarias_risco/
+    return os.path.splitext(caminho)[0] + "_risco"
+
+
+def _assinatura(caminho, diretorio_emails):
+    info = os.stat(caminho)
+    return {
+        "versao": VERSAO_PERFIS, "tamanho": info.st_size, "mtime_ns": info.st_mtime_ns,
+        "emails": impressao_indice(diretorio_emails),
+    }
+
+
+def _normalizar(texto):
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return sem_acento.lower()
+
+
+def termos_suspeitos(texto):
+    return [achado.group(0) for achado in _PADRAO_SUSPEITO.finditer(_normalizar(texto))]
+
+
+# --- SINAIS ---
+def _sinal_valor(df):
+    # z-score no grupo cargo+categoria; grupos pequenos caem para a categoria inteira
+    valor = df["valor"].astype("float64")
+    grupos = [df["cargo"], df["categoria"]]
+    n = valor.groupby(grupos, observed=True).transform("size")
+    media = valor.groupby(grupos, observed=True).transform("mean")
+    desvio = valor.groupby(grupos, observed=True).transform("std")
+    pequeno = n < MINIMO_GRUPO
+    media = media.where(~pequeno, valor.groupby(df["categoria"], observed=True).transform("mean"))
+    desvio = desvio.where(~pequeno, valor.groupby(df["categoria"], observed=True).transform("std"))
+    z = ((valor - media) / desvio.replace(0, np.nan)).fillna(0.0)
+    return z, ((z - Z_INICIO) / (Z_SATURACAO - Z_INICIO)).clip(0, 1)
+
+
+def _sinal_frequencia(df):
+    # Participação da categoria nas compras do funcionário / participação no arquivo
+    por_funcionario_categoria = df.groupby(["funcionario", "categoria"], observed=True)["valor"].transform("size")
+    por_funcionario = df.groupby("funcionario", observed=True)["valor"].transform("size")
+    por_categoria = df.groupby("categoria", observed=True)["valor"].transform("size")
+    razao = (por_funcionario_categoria / por_funcionario) / (por_categoria / len(df))
+    return razao, (np.log2(razao) / LOG_FREQUENCIA_SATURACAO).clip(0, 1)
+
+
+def emails_suspeitos(diretorio_emails=DB_EMAILS, tamanho_lote=TAMANHO_LOTE_EMAILS):
+    # DataFrame (pessoa, dia, emails, suspeitos): e-mails por pessoa e dia, lidos dos metadados
+    # e textos já gravados no banco (sem embeddings). Banco ausente -> sem sinal de e-mail.
+    colunas = ["pessoa", "dia", "emails", "suspeitos"]
+    if not os.path.isdir(diretorio_emails):
+        print(f"⚠️  Banco de e-mails '{diretorio_emails}' não encontrado (rode etapa02.py): perfis sem o sinal de e-mails.")
+        return pd.DataFrame(columns=colunas)
+    vectorstore = abrir_banco(diretorio_emails, None)
+    registros, inicio = [], 0
+    while True:
+        pagina = vectorstore.get(include=["documents", "metadatas"], limit=tamanho_lote, offset=inicio)
+        if not pagina["ids"]:
+            break
+        for texto, meta in zip(pagina["documents"], pagina["metadatas"]):
+            meta = meta or {}
+            if not meta.get("data_dia"):
+                continue
+            suspeito = int(bool(termos_suspeitos(texto or "")))
+            registros.extend((pessoa, meta["data_dia"], 1, suspeito) for pessoa in pessoas_do_email(meta))
+        inicio += len(pagina["ids"])
+    if not registros:
+        return pd.DataFrame(columns=colunas)
+    emails = pd.DataFrame(registros, columns=colunas)
+    emails["dia"] = pd.to_datetime(emails["dia"].astype(str), format="%Y%m%d").to_numpy().astype("datetime64[D]")
+    return emails.groupby(["pessoa", "dia"], as_index=False)[["emails", "suspeitos"]].sum()
+
+
+def _sinal_emails(df, emails, janela_dias=JANELA_DIAS):
+    # E-mails suspeitos da pessoa em ±janela_dias da compra: soma acumulada por dia + busca binária
+    contagem = np.zeros(len(df), dtype=np.int64)
+    if len(emails):
+        pessoa = df["funcionario"].astype(str).map(chave_pessoa).to_numpy()
+        dias = np.asarray(pd.to_datetime(df["data"].astype(str)).to_numpy(), dtype="datetime64[D]")
+        janela = np.timedelta64(janela_dias, "D")
+        for chave, grupo in emails[emails["suspeitos"] > 0].groupby("pessoa"):
+            linhas = np.flatnonzero(pessoa == chave)
+            if not len(linhas):
+                continue
+            grupo = grupo.sort_values("dia")
+            dias_email = grupo["dia"].to_numpy().astype("datetime64[D]")
+            acumulado = np.concatenate([[0], np.cumsum(grupo["suspeitos"].to_numpy())])
+            ate = np.searchsorted(dias_email, dias[linhas] + janela, side="right")
+            desde = np.searchsorted(dias_email, dias[linhas] - janela, side="left")
+            contagem[linhas] = acumulado[ate] - acumulado[desde]
+    return contagem, np.minimum(contagem / EMAILS_SATURACAO, 1.0)
+
+
+# --- PASSADA OFFLINE ---
+def calcular_perfis(caminho=ARQUIVO_CSV, diretorio_emails=DB_EMAILS):
+    # -> {"transacoes", "funcionarios", "categorias"} (DataFrames)
+    df = carregar_transacoes(caminho, colunas=["id_transacao", "data", "funcionario", "cargo", "valor", "categoria"])
+    emails = emails_suspeitos(diretorio_emails)
+    z, sinal_valor = _sinal_valor(df)
+    razao, sinal_frequencia = _sinal_frequencia(df)
+    contagem, sinal_emails = _sinal_emails(df, emails)
+    risco = PESOS["valor"] * sinal_valor + PESOS["frequencia"] * sinal_frequencia + PESOS["emails"] * sinal_emails
+    riscos = pd.DataFrame({
+        "id_transacao": df["id_transacao"].astype(str),
+        "z_valor": z.astype("float32"),
+        "frequencia_relativa": razao.astype("float32"),
+        "emails_suspeitos": contagem.astype("int32"),
+        "risco": risco.astype("float32"),
+    })
+
+    base = df.assign(
+        valor=df["valor"].astype("float64"), z_valor=z, risco=risco, arriscada=risco >= LIMIAR_RISCO,
+        emails_suspeitos=contagem,
+    )
+    funcionarios = base.groupby("funcionario", observed=True).agg(
+        cargo=("cargo", lambda c: c.astype(str).mode().iat[0]),
+        transacoes=("valor", "size"), volume=("valor", "sum"),
+        risco_medio=("risco", "mean"), risco_maximo=("risco", "max"), transacoes_arriscadas=("arriscada", "sum"),
+        z_maximo=("z_valor", "max"),
+    )
+    if len(emails):
+        por_pessoa = emails.groupby("pessoa")[["emails", "suspeitos"]].sum()
+        chaves = funcionarios.index.astype(str).map(chave_pessoa)
+        funcionarios["emails"] = por_pessoa["emails"].reindex(chaves).fillna(0).astype(int).to_numpy()
+        funcionarios["emails_suspeitos"] = por_pessoa["suspeitos"].reindex(chaves).fillna(0).astype(int).to_numpy()
+    else:
+        funcionarios["emails"] = funcionarios["emails_suspeitos"] = 0
+    funcionarios["densidade_emails"] = (funcionarios["emails_suspeitos"] / funcionarios["emails"].replace(0, np.nan)).fillna(0.0)
+    funcionarios = funcionarios.sort_values(["transacoes_arriscadas", "risco_maximo"], ascending=False).reset_index()
+    funcionarios["funcionario"] = funcionarios["funcionario"].astype(str)
+
+    categorias = base.groupby("categoria", observed=True).agg(
+        transacoes=("valor", "size"), volume=("valor", "sum"), media=("valor", "mean"), desvio=("valor", "std"),
+        funcionarios=("funcionario", "nunique"), risco_medio=("risco", "mean"), risco_maximo=("risco", "max"),
+        transacoes_arriscadas=("arriscada", "sum"),
+    )
+    categorias = categorias.sort_values(["transacoes_arriscadas", "risco_maximo"], ascending=False).reset_index()
+    categorias["categoria"] = categorias["categoria"].astype(str)
+    return {"transacoes": riscos, "funcionarios": funcionarios, "categorias": categorias}
+
+
+def atualizar_perfis(caminho=ARQUIVO_CSV, diretorio_emails=DB_EMAILS):
+    # Recalcula o índice só quando o CSV ou o banco de e-mails mudaram; troca a pasta de uma vez
+    diretorio = diretorio_perfis(caminho)
+    assinatura = _assinatura(caminho, diretorio_emails)
+    try:
+        with open(os.path.join(diretorio, "meta.json"), "r", encoding="utf-8") as f:
+            if json.load(f) == assinatura:
+                return diretorio
+    except (OSError, json.JSONDecodeError):
+        pass
+
+    print("🎯 Calculando perfis de risco (só quando as transações ou os e-mails mudam)...")
+    temporario = f"{diretorio}.tmp-{os.getpid()}"
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+    for nome, tabela in calcular_perfis(caminho, diretorio_emails).items():
+        tabela.to_parquet(os.path.join(temporario, f"{nome}.parquet"), index=False)
+    with open(os.path.join(temporario, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(assinatura, f)
+
+    antigo = f"{diretorio}.antigo-{os.getpid()}"
+    if os.path.exists(diretorio):
+        os.replace(diretorio, antigo)
+    os.replace(temporario, diretorio)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return diretorio
+
+
+def carregar_perfis(caminho=ARQUIVO_CSV, diretorio_emails=DB_EMAILS, tipo="transacoes"):
+    # tipo: "transacoes" (risco por id_transacao), "funcionarios" ou "categorias"
+    return pd.read_parquet(os.path.join(atualizar_perfis(caminho, diretorio_emails), f"{tipo}.parquet"))
+
+
+# --- FILA DE PRIORIDADE ---
+def priorizar(df, riscos):
+    # Anexa `risco` e `prioridade` (risco + peso da situação da triagem, quando houver)
+    risco = df["id_transacao"].astype(str).map(riscos.set_index("id_transacao")["risco"]).astype("float64").fillna(0.0)
+    prioridade = risco
+    if "situacao" in df:
+        prioridade = prioridade + df["situacao"].map(PESO_SITUACAO).astype("float64").fillna(0.0)
+    return df.assign(risco=risco, prioridade=prioridade)
+
+
+def fila_prioridade(df, limite=None, prioridade_minima=PRIORIDADE_MINIMA):
+    # Transações na ordem em que a IA deve vê-las (mais arriscadas primeiro; empates na ordem
+    # do arquivo). `limite` = orçamento em transações (top-K); `prioridade_minima=None` não corta
+    # nada. Com a triagem, violações e ambíguas sempre entram; conformes só com risco alto.
+    if prioridade_minima is not None:
+        df = df[df["prioridade"] >= prioridade_minima]
+    if limite:
+        return df.nlargest(limite, "prioridade", keep="first")
+    return df.sort_values("prioridade", ascending=False, kind="stable")
+
+
+if __name__ == "__main__":
+    # Passada offline: recalcula (se preciso) e mostra quem concentra o risco
+    atualizar_perfis()
+    with pd.option_context("display.width", 160, "display.max_columns", 20, "display.precision", 2):
+        print("\n👤 Funcionários:")
+        print(carregar_perfis(tipo="funcionarios").head(10).to_string(index=False))
+        print("\n🗂️  Categorias:")
+        print(carregar_perfis(tipo="categorias").head(10).to_string(index=False))
@@ -0,0 +1,262 @@
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+# --- MEDIÇÃO POR ETAPA ---
+# Os trechos caros do pipeline ficam dentro de `with etapa("nome"):`. Cada execução alimenta:
+#   1. METRICAS: agregados do processo inteiro (histograma por etapa + contadores), sempre
+#      ligados e baratos; o servico.py os expõe em GET /metricas no formato do Prometheus.
+#   2. O coletor ativo, se houver: dentro de `coletar_etapas()` cada execução vira uma
+#      amostra de tempo (p50/p95/p99 de uma auditoria ou de um benchmark). O ContextVar
+#      acompanha as tarefas do asyncio e o asyncio.to_thread, então uma auditoria paralela
+#      inteira cai no mesmo coletor.
+#   3. Com TOBY_TRACOS=caminho.jsonl, uma linha JSON por execução (etapa, duração, atributos).
+#   with coletar_etapas() as coletor:
+#       ... roda a auditoria ...
+#   coletor.resumo()  # {"llm": {"n": 120, "p50_ms": ..., "p95_ms": ..., ...}, ...}
+# `contar(nome, **rotulos)` soma eventos (tokens, acertos de cache, retentativas) nos mesmos lugares.
+
+VARIAVEL_TRACOS = "TOBY_TRACOS"
+PREFIXO_METRICAS = "toby"
+LIMITES_HISTOGRAMA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATUS_RETENTATIVA = {408, 409, 429, 500, 502, 503, 504}   # Respostas que valem nova tentativa (llm_resiliente.py)
+
+_coletor_ativo = ContextVar("coletor_etapas", default=None)
+
+
+def serie(nome, **rotulos):
+    # serie("cache_consultas", cache="veredictos") -> 'cache_consultas{cache="veredictos"}'
+    # (chave dos contadores no relatório de um coletor)
+    if not rotulos:
+        return nome
+    return nome + "{" + ",".join(f'{chave}="{valor}"' for chave, valor in sorted(rotulos.items())) + "}"
+
+
+class ColetorEtapas:
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.amostras = {}
+        self.contadores = {}
+        self.inicio = time.time()
+        self._remotos = []
+        self._trava = threading.Lock()
+
+    def registrar(self, nome, segundos):
+        with self._trava:
+            self.amostras.setdefault(nome, []).append(segundos)
+
+    def contar(self, serie, quantidade):
+        with self._trava:
+            self.contadores[serie] = self.contadores.get(serie, 0) + quantidade
+
+    def importar(self, relatorio):
+        # Relatório de outro processo (ex: a auditoria que rodou no servico.py)
+        with self._trava:
+            self._remotos.append(relatorio)
+
+    def resumo(self):
+        # Cópia sob a trava: pode ser chamado enquanto a auditoria ainda registra amostras
+        with self._trava:
+            copia = {nome: list(amostras) for nome, amostras in self.amostras.items()}
+        resumo = {}
+        for nome, amostras in copia.items():
+            tempos = np.asarray(amostras) * 1000
+            p50, p95, p99 = np.percentile(tempos, [50, 95, 99])
+            resumo[nome] = {
+                "n": len(tempos), "total_s": round(float(tempos.sum()) / 1000, 4),
+                "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3), "max_ms": round(float(tempos.max()), 3),
+            }
+        return resumo
+
+    def relatorio(self):
+        # -> {"id", "duracao_s", "etapas": resumo(), "contadores": {serie: valor}}
+        etapas = self.resumo()
+        with self._trava:
+            contadores, remotos = dict(self.contadores), list(self._remotos)
+        for remoto in remotos:
+            etapas.update(remoto["etapas"])
+            for serie, valor in remoto["contadores"].items():
+                contadores[serie] = contadores.get(serie, 0) + valor
+        return {
+            "id": self.id, "duracao_s": round(time.time() - self.inicio, 3),
+            "etapas": etapas, "contadores": contadores,
+        }
+
+
+class Metricas:
+    # Agregados do processo desde que ele subiu (nunca zeram, como pede o Prometheus)
+    def __init__(self):
+        self.histogramas = {}   # etapa -> [baldes..., soma, contagem]
+        self.contadores = {}    # (nome, rótulos ordenados) -> valor
+        self._trava = threading.Lock()
+
+    def observar(self, nome, segundos):
+        with self._trava:
+            histograma = self.histogramas.get(nome)
+            if histograma is None:
+                histograma = self.histogramas[nome] = [0] * (len(LIMITES_HISTOGRAMA) + 3)
+            histograma[bisect.bisect_left(LIMITES_HISTOGRAMA, segundos)] += 1
+            histograma[-2] += segundos
+            histograma[-1] += 1
+
+    def contar(self, nome, rotulos, quantidade):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._trava:
+            self.contadores[chave] = self.contadores.get(chave, 0) + quantidade
+
+    def texto_prometheus(self):
+        linhas = [f"# TYPE {PREFIXO_METRICAS}_etapa_segundos histogram"]
+        with self._trava:
+            for nome, histograma in sorted(self.histogramas.items()):
+                acumulado = 0
+                for limite, quantidade in zip(LIMITES_HISTOGRAMA + ("+Inf",), histograma):
+                    acumulado += quantidade
+                    linhas.append(f'{PREFIXO_METRICAS}_etapa_segundos_bucket{{etapa="{nome}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{PREFIXO_METRICAS}_etapa_segundos_sum{{etapa="{nome}"}} {histograma[-2]:.6f}')
+                linhas.append(f'{PREFIXO_METRICAS}_etapa_segundos_count{{etapa="{nome}"}} {histograma[-1]}')
+            tipos_declarados = set()
+            for (nome, rotulos), valor in sorted(self.contadores.items()):
+                if nome not in tipos_declarados:
+                    tipos_declarados.add(nome)
+                    linhas.append(f"# TYPE {PREFIXO_METRICAS}_{nome}_total counter")
+                linhas.append(f"{PREFIXO_METRICAS}_{serie(nome + '_total', **dict(rotulos))} {valor}")
+        return "\n".join(linhas) + "\n"
+
+
+METRICAS = Metricas()
+
+
+class ArquivoTracos:
+    # Uma linha JSON por etapa executada; aberto uma vez e compartilhado entre as threads
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._arquivo = None
+        self._trava = threading.Lock()
+
+    def gravar(self, registro):
+        linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+        with self._trava:
+            if self._arquivo is None:
+                self._arquivo = open(self.caminho, "a", encoding="utf-8", buffering=1)
+            self._arquivo.write(linha)
+
+
+_tracos = ArquivoTracos(os.environ[VARIAVEL_TRACOS]) if os.getenv(VARIAVEL_TRACOS) else None
+
+
+@contextmanager
+def etapa(nome):
+    # Devolve um dict de atributos que o chamador pode preencher (ex: tokens da resposta);
+    # eles vão para a linha do arquivo de traços
+    atributos = {}
+    inicio = time.perf_counter()
+    erro = None
+    try:
+        yield atributos
+    except Exception as e:
+        erro = type(e).__name__
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        coletor = _coletor_ativo.get()
+        METRICAS.observar(nome, segundos)
+        if coletor is not None:
+            coletor.registrar(nome, segundos)
+        if erro:
+            contar("etapa_erros", etapa=nome)
+        if _tracos is not None:
+            _tracos.gravar({
+                "quando": time.time(), "rastro": coletor.id if coletor else None, "etapa": nome,
+                "ms": round(segundos * 1000, 3), "erro": erro, **atributos,
+            })
+
+
+def contar(nome, quantidade=1, **rotulos):
+    METRICAS.contar(nome, rotulos, quantidade)
+    coletor = _coletor_ativo.get()
+    if coletor is not None:
+        coletor.contar(serie(nome, **rotulos), quantidade)
+
+
+def coletor_atual():
+    return _coletor_ativo.get()
+
+
+@contextmanager
+def coletar_etapas():
+    coletor = ColetorEtapas()
+    token = _coletor_ativo.set(coletor)
+    try:
+        yield coletor
+    finally:
+        _coletor_ativo.reset(token)
+
+
+# --- CHAMADAS À LLM ---
+def registrar_uso(mensagem):
+    # Tokens da resposta (AIMessage): `usage_metadata` do LangChain ou, nas versões antigas
+    # do langchain_groq, `response_metadata["token_usage"]`. -> atributos para a etapa
+    contar("chamadas_llm")
+    uso = getattr(mensagem, "usage_metadata", None) or {}
+    entrada, saida = uso.get("input_tokens"), uso.get("output_tokens")
+    if entrada is None and saida is None:
+        uso = (getattr(mensagem, "response_metadata", None) or {}).get("token_usage") or {}
+        entrada, saida = uso.get("prompt_tokens"), uso.get("completion_tokens")
+    if entrada is None and saida is None:
+        return {}
+    contar("tokens_llm", entrada or 0, tipo="entrada")
+    contar("tokens_llm", saida or 0, tipo="saida")
+    return {"tokens_entrada": entrada or 0, "tokens_saida": saida or 0}
+
+
+def _juntar_pedacos(total, pedaco):
+    return pedaco if total is None else total + pedaco
+
+
+def conteudo_com_uso(pedacos, nome="llm"):
+    # Envolve `(prompt | llm).stream(...)`: repassa só o texto (como o StrOutputParser) e,
+    # no fim, soma os AIMessageChunk para registrar os tokens do último pedaço
+    with etapa(nome) as atributos:
+        total = None
+        for pedaco in pedacos:
+            total = _juntar_pedacos(total, pedaco)
+            if pedaco.content:
+                yield pedaco.content
+        if total is not None:
+            atributos.update(registrar_uso(total))
+
+
+async def aconteudo_com_uso(pedacos, nome="llm"):
+    # Versão assíncrona de conteudo_com_uso, para `astream`
+    with etapa(nome) as atributos:
+        total = None
+        async for pedaco in pedacos:
+            total = _juntar_pedacos(total, pedaco)
+            if pedaco.content:
+                yield pedaco.content
+        if total is not None:
+            atributos.update(registrar_uso(total))
+
+
+def _contar_resposta_http(resposta):
+    contar("llm_respostas_http", status=resposta.status_code)
+    if resposta.status_code in STATUS_RETENTATIVA:
+        contar("llm_retentativas")
+
+
+async def _acontar_resposta_http(resposta):
+    _contar_resposta_http(resposta)
+
+
+def ganchos_http(assincrono=False):
+    # event_hooks dos clientes httpx do ChatGroq: cada tentativa HTTP passa por aqui, então
+    # as respostas que levam a uma nova tentativa (429/5xx) aparecem nas métricas
+    return {"response": [_acontar_resposta_http if assincrono else _contar_resposta_http]}
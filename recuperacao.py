@@ -0,0 +1,67 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from banco_vetorial import consultar_vetores
+from rastreamento import etapa
+
+# --- RECUPERAÇÃO EM LOTE ---
+# Em vez de um similarity_search (embedding + busca) por linha, o estágio de recuperação
+# remove consultas repetidas, gera os embeddings de todas de uma vez e faz uma única
+# consulta em massa por banco (Chroma ou BancoNumpy, ver banco_vetorial.py). O resultado
+# é um dicionário {consulta: [Document, ...]} que o estágio da LLM só consulta.
+# `filtro` é um `where` do Chroma aplicado a todas as consultas do lote (ex:
+# parser_emails.filtro_emails(remetente="Michael Scott", data_inicio="2008-04-01")).
+
+TAMANHO_LOTE_EMBEDDINGS = 256   # consultas por chamada ao modelo de embeddings / ao banco vetorial
+
+
+def buscar_em_lote(vectorstore, consultas, k=4, tamanho_lote=TAMANHO_LOTE_EMBEDDINGS, filtro=None):
+    unicas = list(dict.fromkeys(consultas))
+    resultados = {}
+    for i in range(0, len(unicas), tamanho_lote):
+        lote = unicas[i:i + tamanho_lote]
+        with etapa("embeddings"):
+            vetores = vectorstore.embeddings.embed_documents(lote)
+        with etapa("busca_vetorial"):
+            resultados.update(zip(lote, consultar_vetores(vectorstore, vetores, k=k, filtro=filtro)))
+    return resultados
+
+
+def buscar_entre_candidatos(vectorstore, pares, k=4, tamanho_lote=TAMANHO_LOTE_EMBEDDINGS):
+    # `pares` = [(consulta, ids_candidatos), ...]: cada consulta só compete entre os seus
+    # candidatos (ex: e-mails do funcionário no período). Os vetores dos candidatos vêm do
+    # banco (sem recalcular) e o ranking por cosseno é feito aqui. Devolve uma lista
+    # alinhada a `pares`.
+    consultas = list(dict.fromkeys(c for c, ids in pares if ids))
+    ids_unicos = list(dict.fromkeys(i for _, ids in pares for i in ids))
+
+    vetor_consulta = {}
+    for i in range(0, len(consultas), tamanho_lote):
+        lote = consultas[i:i + tamanho_lote]
+        with etapa("embeddings"):
+            vetor_consulta.update(zip(lote, vectorstore.embeddings.embed_documents(lote)))
+
+    candidatos = {}
+    for i in range(0, len(ids_unicos), tamanho_lote):
+        with etapa("busca_vetorial"):
+            resposta = vectorstore.get(
+                ids=ids_unicos[i:i + tamanho_lote], include=["embeddings", "documents", "metadatas"]
+            )
+        for id_doc, vetor, texto, meta in zip(
+            resposta["ids"], resposta["embeddings"], resposta["documents"], resposta["metadatas"]
+        ):
+            vetor = np.asarray(vetor, dtype=np.float32)
+            candidatos[id_doc] = (vetor / (np.linalg.norm(vetor) or 1.0), Document(page_content=texto, metadata=meta or {}, id=id_doc))
+
+    resultados = []
+    with etapa("ranking_candidatos"):
+        for consulta, ids in pares:
+            ids = [i for i in ids if i in candidatos]
+            if not ids:
+                resultados.append([])
+                continue
+            matriz = np.stack([candidatos[i][0] for i in ids])
+            pontuacao = matriz @ np.asarray(vetor_consulta[consulta], dtype=np.float32)
+            melhores = np.argsort(-pontuacao, kind="stable")[:k]
+            resultados.append([candidatos[ids[j]][1] for j in melhores])
+    return resultados
@@ -0,0 +1,225 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from smurfing import detectar_smurfing
+
+# --- MOTOR DE REGRAS DETERMINÍSTICO (Pré-filtro antes da LLM) ---
+# Extrai da política uma tabela estruturada de regras (alçadas, tetos por categoria e
+# itens proibidos) e aplica tudo de forma vetorizada sobre o DataFrame inteiro.
+# Só as transações sinalizadas ou ambíguas seguem para o agente `prompt_regras`.
+
+ARQUIVO_POLITICA = "politica_compliance.txt"
+
+LIMIAR_RARIDADE = 2           # Descrição ou categoria vista até N vezes no arquivo é "fora do padrão"
+LIMIAR_Z_VALOR = 3.0          # Valor a mais de N desvios-padrão da média da categoria
+
+# Palavras genéricas que não servem para identificar um item proibido
+_PALAVRAS_GENERICAS = {
+    "para", "como", "apenas", "itens", "item", "kits", "kit", "servicos", "servico", "uso",
+    "equipamentos", "equipamento", "compra", "venda", "produtos", "dentro", "escritorio",
+    "masculinos", "femininos", "outros", "empresa", "funcionario", "funcionarios", "fornecedor",
+    "parente", "conjuge", "pessoais", "negocios", "investimento", "industrial", "treinados",
+    "marcados", "brancas", "fogo", "estacionamento", "animais", "considerados", "apresentacao",
+    "restaurante", "canais", "pagos", "com", "dunder", "pelo", "dos", "das", "nos",
+}
+
+SITUACAO_CONFORME = "conforme"
+SITUACAO_AMBIGUA = "ambigua"
+SITUACAO_VIOLACAO = "violacao"
+
+
+def _normalizar(texto):
+    sem_acento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return sem_acento.lower()
+
+
+def _valor_monetario(texto):
+    # "1.500,00" -> 1500.0 ; "50,01" -> 50.01 ; "100" -> 100.0
+    return float(texto.replace(".", "").replace(",", "."))
+
+
+def _secoes(texto):
+    # Quebra a política em subseções numeradas ("1.1.", "3.2.", ...)
+    partes = re.split(r"^(\d\.\d)\.\s+", texto, flags=re.MULTILINE)
+    return {partes[i]: partes[i + 1] for i in range(1, len(partes) - 1, 2)}
+
+
+def _palavras_chave(trecho):
+    for palavra in re.findall(r"[a-z][a-z\-]{2,}", _normalizar(trecho)):
+        if palavra not in _PALAVRAS_GENERICAS:
+            yield palavra.rstrip("s") if len(palavra) > 5 else palavra
+
+
+def _termos_proibidos(trecho):
+    # Frases de proibição ("Estão proibidos: a, b e c.", "X são proibidos", "Y não são
+    # reembolsáveis", "Z está banido") e itens listados em "Proibições Específicas: a) b) c)".
+    termos = []
+    em_lista = False
+    for linha in trecho.splitlines():
+        linha = linha.strip()
+        if not linha or linha.startswith("=") or linha.isupper():
+            continue
+        if re.match(r"^[a-z]\)", linha):
+            if em_lista:
+                # Primeiro substantivo do item + exemplos entre parênteses/aspas
+                item = re.sub(r"^[a-z]\)\s*(compra de|investimento em|venda de)?\s*", "", linha, flags=re.IGNORECASE)
+                termos.extend(list(_palavras_chave(item))[:1])
+                for exemplo in re.findall(r"\((?:ex:\s*)?([^)]*)\)", linha):
+                    termos.extend(_palavras_chave(exemplo))
+            continue
+        em_lista = "Proibições Específicas" in linha
+
+        for frase in re.split(r"(?<=\.)\s+", linha):
+            lista = re.search(r"proibidos:(.*)", frase, flags=re.IGNORECASE)
+            sujeito = re.search(r"(.*?)\b(?:não são reembolsáveis|são proibid\w*|está banid\w*)", frase)
+            if lista:
+                termos.extend(_palavras_chave(lista.group(1)))
+            elif sujeito:
+                termos.extend(_palavras_chave(sujeito.group(1).split(":")[-1]))
+    return termos
+
+
+def extrair_regras(texto):
+    # Tabela de regras: uma linha por regra, com a seção da política de onde veio
+    regras = []
+    secoes = _secoes(texto)
+
+    # Seção 1: Alçadas de aprovação (Categoria A/B/C)
+    for secao, trecho in secoes.items():
+        faixa = re.search(r"\(Categoria ([ABC]) - (Até|De|Acima de) US\$ ([\d.,]+)(?: a US\$ ([\d.,]+))?\)", trecho)
+        if not faixa:
+            continue
+        letra, tipo, v1, v2 = faixa.groups()
+        minimo, maximo = {
+            "Até": (0.0, _valor_monetario(v1)),
+            "De": (_valor_monetario(v1), _valor_monetario(v2 or v1)),
+            "Acima de": (_valor_monetario(v1), np.inf),
+        }[tipo]
+        autoridade = re.search(r"Autoridade:\s*(.+)", trecho)
+        regras.append({
+            "secao": secao, "tipo": "alcada", "categoria": letra, "minimo": minimo, "maximo": maximo,
+            "termo": None, "descricao": autoridade.group(1).strip() if autoridade else "",
+        })
+
+    # Seção 2: Tetos por categoria contábil
+    for categorias, limite in re.findall(r"((?:\"[^\"]+\"\s*e?\s*)+)não são categorias aceitáveis para valores acima de US\$ ([\d.,]+)", texto):
+        for categoria in re.findall(r'"([^"]+)"', categorias):
+            regras.append({
+                "secao": "2", "tipo": "teto_categoria", "categoria": categoria, "minimo": 0.0,
+                "maximo": _valor_monetario(limite), "termo": None,
+                "descricao": f"'{categoria}' não é aceita acima de US$ {limite}",
+            })
+    for secao, trecho in secoes.items():
+        for categoria, limite, destino in re.findall(r"compra de (\w+) acima de US\$ ([\d.,]+) deve passar pel[oa] (\w+)", trecho):
+            regras.append({
+                "secao": secao, "tipo": "teto_categoria", "categoria": categoria, "minimo": 0.0,
+                "maximo": _valor_monetario(limite), "termo": None,
+                "descricao": f"Compra de {categoria} acima de US$ {limite} precisa do {destino}",
+            })
+
+    # Seções 2 e 3: Itens e locais proibidos
+    for secao, trecho in secoes.items():
+        if not secao.startswith(("2.", "3.")):
+            continue
+        for termo in dict.fromkeys(_termos_proibidos(trecho)):
+            regras.append({
+                "secao": secao, "tipo": "proibicao", "categoria": None, "minimo": np.nan,
+                "maximo": np.nan, "termo": termo, "descricao": f"Item proibido pela seção {secao}",
+            })
+
+    return pd.DataFrame(regras, columns=["secao", "tipo", "categoria", "minimo", "maximo", "termo", "descricao"])
+
+
+def carregar_regras(caminho=ARQUIVO_POLITICA):
+    with open(caminho, "r", encoding="utf-8") as f:
+        return extrair_regras(f.read())
+
+
+def _anexar_motivo(motivos, mascara, texto):
+    # `texto` pode ser uma string fixa ou uma Series alinhada ao DataFrame
+    return np.where(mascara, motivos + texto + "; ", motivos)
+
+
+def limite_alcada(regras):
+    # Valor acima do qual a compra cai na alçada mais alta (Categoria A); None sem alçadas
+    alcadas = regras[regras["tipo"] == "alcada"]
+    return float(alcadas["minimo"].max()) if len(alcadas) else None
+
+
+def triar_transacoes(df, regras, estatisticas=None):
+    # Devolve um DataFrame alinhado a `df` com `situacao` (conforme/ambigua/violacao), `motivos`
+    # e os clusters de smurfing (`cluster_smurfing`, `soma_cluster`, `qtd_cluster`), calculados
+    # uma vez com a alçada da política: o alerta e o texto do cluster no prompt de fraude
+    # saem da mesma detecção.
+    # `estatisticas` (transacoes.estatisticas_triagem) traz as frequências e médias do arquivo
+    # inteiro, para triar só uma fatia dele com o mesmo resultado.
+    # Centavos exatos: o valor em float32 (carga tipada) não pode passar de um teto por ruído
+    valor = df["valor"].astype("float64").round(2)
+    # Como category, a normalização de texto roda uma vez por valor distinto, não por linha
+    categoria = df["categoria"].astype("category")
+    motivos = np.full(len(df), "", dtype=object)
+    violacao = np.zeros(len(df), dtype=bool)
+
+    # 1. Alçada máxima (Categoria A exige PO e assinatura do CFO)
+    alcadas = regras[regras["tipo"] == "alcada"].sort_values("minimo")
+    if len(alcadas):
+        topo = alcadas.iloc[-1]
+        acima = (valor > topo["minimo"]).to_numpy()
+        violacao |= acima
+        motivos = _anexar_motivo(motivos, acima, f"Acima de US$ {topo['minimo']:.2f}: {topo['descricao']}")
+
+    # 2. Tetos por categoria
+    tetos = regras[regras["tipo"] == "teto_categoria"]
+    if len(tetos):
+        teto_por_categoria = dict(zip(tetos["categoria"].map(_normalizar), tetos["maximo"]))
+        descricao_teto = dict(zip(tetos["categoria"].map(_normalizar), tetos["descricao"]))
+        chave = categoria.map(_normalizar)
+        teto = chave.map(teto_por_categoria).astype("float64")
+        estourou = (valor > teto).to_numpy()
+        violacao |= estourou
+        motivos = _anexar_motivo(motivos, estourou, chave.map(descricao_teto).fillna("").to_numpy())
+
+    # 3. Itens proibidos (palavra-chave na descrição)
+    termos = regras.loc[regras["tipo"] == "proibicao", "termo"].dropna().unique()
+    if len(termos):
+        # Aceita plural/sufixo curto: "algema" casa com "Algemas"
+        padrao = r"\b(" + "|".join(re.escape(t) for t in sorted(termos, key=len, reverse=True)) + r")\w{0,2}\b"
+        achado = df["descricao"].astype("category").map(_normalizar).astype(str).str.extract(padrao, expand=False)
+        proibido = achado.notna().to_numpy()
+        violacao |= proibido
+        motivos = _anexar_motivo(motivos, proibido, ("Item proibido: " + achado.fillna("")).to_numpy())
+
+    # 4. Fracionamento de compras (Smurfing); sem alçada na política, nenhum cluster
+    limite = limite_alcada(regras)
+    clusters = detectar_smurfing(df, np.inf if limite is None else limite)
+    fracionada = (clusters["cluster_smurfing"] >= 0).to_numpy()
+    violacao |= fracionada
+    motivos = _anexar_motivo(motivos, fracionada, "Possível fracionamento (Smurfing)")
+
+    # 5. Fora do padrão: descrição/categoria rara ou valor atípico para a categoria
+    if estatisticas is None:
+        freq_descricao = df.groupby("descricao", observed=True)["descricao"].transform("size")
+        freq_categoria = df.groupby("categoria", observed=True)["categoria"].transform("size")
+        media = valor.groupby(categoria, observed=True).transform("mean")
+        desvio = valor.groupby(categoria, observed=True).transform("std")
+    else:
+        descricao = df["descricao"].astype("category")
+        freq_descricao = descricao.map(estatisticas["freq_descricao"]).astype("float64")
+        freq_categoria = categoria.map(estatisticas["freq_categoria"]).astype("float64")
+        media = categoria.map(estatisticas["media_categoria"]).astype("float64")
+        desvio = categoria.map(estatisticas["desvio_categoria"]).astype("float64")
+    rara = ((freq_descricao <= LIMIAR_RARIDADE) | (freq_categoria <= LIMIAR_RARIDADE)).to_numpy()
+    desvio = desvio.replace(0, np.nan)
+    atipico = (((valor - media) / desvio) > LIMIAR_Z_VALOR).fillna(False).to_numpy()
+    ambigua = (rara | atipico) & ~violacao
+    motivos = _anexar_motivo(motivos, rara, "Item fora do padrão do arquivo")
+    motivos = _anexar_motivo(motivos, atipico, "Valor atípico para a categoria")
+
+    situacao = np.where(violacao, SITUACAO_VIOLACAO, np.where(ambigua, SITUACAO_AMBIGUA, SITUACAO_CONFORME))
+    return pd.DataFrame(
+        {"situacao": situacao, "motivos": pd.Series(motivos, index=df.index).str.rstrip("; ")},
+        index=df.index,
+    ).join(clusters)
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+from langchain_core.prompts import ChatPromptTemplate
+
+from auditoria_async import LimitadorTaxa
+from banco_vetorial import abrir_banco
+from cache_semantico import CacheSemantico
+from cache_veredictos import CacheVeredictos, impressao_indice, nome_do_modelo
+from jobs_auditoria import linha_para_json
+from modelo_embeddings import backend_embeddings, criar_embeddings
+from rastreamento import METRICAS, aconteudo_com_uso, coletar_etapas, etapa
+from regras_compliance import ARQUIVO_POLITICA, SITUACAO_CONFORME, carregar_regras
+from perfis_risco import PRIORIDADE_MINIMA, fila_prioridade
+from transacoes import carregar_transacoes
+import etapa01
+import etapa02
+import etapa03
+
+# --- SERVIÇO DE AUDITORIA (processo único e aquecido) ---
+# Carrega uma vez o modelo de embeddings, os bancos vetoriais, o ChatGroq (com pool de
+# conexões HTTP) e os caches, e atende vários analistas ao mesmo tempo:
+#   GET  /saude   -> {"status": "ok"}
+#   GET  /metricas -> tempos por etapa, tokens, cache e retentativas (formato texto do Prometheus)
+#   POST /ask     {"modulo": "rules"|"emails", "pergunta": "..."}      -> NDJSON de tokens
+#   POST /audit   {"funcionario", "ids", "limite": opcionais}         -> NDJSON de resultados (+ desempenho)
+#   POST /ingest  {"fontes": ["politica", "emails"]}                  -> resumo da sincronização
+# App ASGI escrito à mão (sem framework); rode com `python servico.py` (uvicorn).
+
+load_dotenv()
+
+HOST = os.getenv("TOBY_SERVICO_HOST", "127.0.0.1")
+PORTA = int(os.getenv("TOBY_SERVICO_PORTA", "8765"))
+MAX_CONEXOES_LLM = 32          # Conexões HTTP simultâneas com a API da Groq
+K_PERGUNTAS = 4
+
+DIRETORIOS = {"rules": etapa01.DIRETORIO_DB, "emails": etapa02.DIRETORIO_DB}
+TEMPLATES = {"rules": etapa01.TEMPLATE_TOBY, "emails": etapa02.TEMPLATE_INVESTIGACAO}
+
+
+class Recursos:
+    # Tudo que é caro de criar fica aqui e é compartilhado entre as requisições
+    def __init__(self, embeddings=None, llm=None):
+        if embeddings is None:
+            embeddings = criar_embeddings()
+        if llm is None:
+            import httpx
+            from llm_resiliente import criar_llm
+
+            llm = criar_llm(limites_conexao=httpx.Limits(
+                max_connections=MAX_CONEXOES_LLM, max_keepalive_connections=MAX_CONEXOES_LLM
+            ))
+        self.embeddings = embeddings
+        self.llm = llm
+        self.vectorstores = {
+            tipo: abrir_banco(diretorio, embeddings)
+            for tipo, diretorio in DIRETORIOS.items()
+        }
+        self.cache_veredictos = CacheVeredictos(indices=DIRETORIOS)
+        self.cache_semantico = CacheSemantico()
+        self.limitador = LimitadorTaxa(etapa03.REQUISICOES_POR_SEGUNDO)
+        self.trava_ingestao = asyncio.Lock()
+        self._triagem = (None, None)
+
+    def transacoes_triadas(self):
+        # Triagem e prioridades do arquivo inteiro, refeitas só quando o CSV, a política ou os e-mails mudam
+        versao = (
+            os.path.getmtime(etapa03.ARQUIVO_CSV), os.path.getmtime(ARQUIVO_POLITICA), impressao_indice(etapa03.DB_EMAILS)
+        )
+        if self._triagem[0] != versao:
+            df = carregar_transacoes(etapa03.ARQUIVO_CSV)
+            self._triagem = (versao, etapa03.selecionar_transacoes(df, carregar_regras(ARQUIVO_POLITICA)))
+        return self._triagem[1]
+
+
+recursos = None   # Preenchido no startup (ou injetado antes, ex: com ChatFalso)
+
+
+# --- ROTAS ---
+async def perguntar(dados):
+    modulo = dados.get("modulo", "rules")
+    if modulo not in DIRETORIOS:
+        raise ValueError(f"Módulo desconhecido: {modulo}")
+    pergunta = dados["pergunta"]
+    vectorstore = recursos.vectorstores[modulo]
+
+    # Cache semântico (espaço próprio do serviço, que usa os prompts das etapas)
+    versao = f"{impressao_indice(DIRETORIOS[modulo])}:{nome_do_modelo(recursos.llm)}:{backend_embeddings()}"
+    with etapa("embeddings"):
+        vetor = await asyncio.to_thread(recursos.embeddings.embed_query, pergunta)
+    em_cache = recursos.cache_semantico.buscar(f"servico-{modulo}", versao, vetor)
+    if em_cache:
+        yield {"token": em_cache["resposta"]}
+        yield {"fim": True, "em_cache": True}
+        return
+
+    with etapa("busca_vetorial"):
+        docs = await asyncio.to_thread(vectorstore.similarity_search_by_vector, vetor, K_PERGUNTAS)
+    contexto = "\n\n".join(d.page_content for d in docs)
+    chain = ChatPromptTemplate.from_template(TEMPLATES[modulo]) | recursos.llm
+
+    await recursos.limitador.adquirir()
+    inicio = time.perf_counter()
+    primeiro_token = None
+    partes = []
+    async for token in aconteudo_com_uso(chain.astream({"context": contexto, "question": pergunta})):
+        if primeiro_token is None:
+            primeiro_token = time.perf_counter() - inicio
+        partes.append(token)
+        yield {"token": token}
+    recursos.cache_semantico.guardar(f"servico-{modulo}", versao, pergunta, vetor, "".join(partes))
+    yield {"fim": True, "em_cache": False, "primeiro_token_ms": round((primeiro_token or 0) * 1000, 1)}
+
+
+async def auditar(dados):
+    df, textos_clusters = await asyncio.to_thread(recursos.transacoes_triadas)
+    # Fila de prioridade: ids escolhidos pelo cliente entram todos; sem ids, só o que passa do corte
+    if dados.get("ids") is not None:
+        selecao, minima = df[df["id_transacao"].isin(dados["ids"])], None
+    else:
+        selecao, minima = df, PRIORIDADE_MINIMA
+    if dados.get("funcionario"):
+        selecao = selecao[selecao["funcionario"] == dados["funcionario"]]
+    selecao = fila_prioridade(selecao, limite=dados.get("limite"), prioridade_minima=minima)
+
+    conformes = int((df["situacao"] == SITUACAO_CONFORME).sum())
+    yield {"resumo": {"total": len(df), "conformes": conformes, "em_analise": len(selecao)}}
+
+    recursos.cache_veredictos.sincronizar_indices(DIRETORIOS)
+    # As etapas desta auditoria (e só desta) vão para o cliente no último evento
+    with coletar_etapas() as coletor:
+        async for resultado in etapa03.fluxo_auditoria(
+            selecao, recursos.llm, recursos.vectorstores["rules"], recursos.vectorstores["emails"], textos_clusters,
+            limitador=recursos.limitador, cache=recursos.cache_veredictos,
+        ):
+            evento = {"linha": linha_para_json(resultado.linha), "regras": resultado.regras, "fraude": resultado.fraude}
+            if resultado.erro:
+                evento["erro"] = resultado.erro
+            yield evento
+    yield {"desempenho": coletor.relatorio()}
+
+
+async def ingerir(dados):
+    fontes = dados.get("fontes") or ["politica", "emails"]
+    resumo = {}
+    # Uma ingestão por vez; as buscas continuam sendo atendidas enquanto ela roda
+    async with recursos.trava_ingestao:
+        if "politica" in fontes:
+            _, resumo["politica"] = await asyncio.to_thread(etapa01.carregar_e_indexar, recursos.embeddings)
+        if "emails" in fontes:
+            _, resumo["emails"] = await asyncio.to_thread(etapa02.indexar_emails, recursos.embeddings)
+    return resumo
+
+
+ROTAS_STREAMING = {"/ask": perguntar, "/audit": auditar}
+
+
+# --- ASGI ---
+async def _ler_json(receive):
+    corpo = b""
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get("body", b"")
+        if not mensagem.get("more_body"):
+            break
+    return json.loads(corpo or b"{}")
+
+
+async def _responder_json(send, status, dados):
+    corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json; charset=utf-8")]})
+    await send({"type": "http.response.body", "body": corpo})
+
+
+async def _responder_texto(send, status, texto, tipo):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", tipo.encode("ascii"))]})
+    await send({"type": "http.response.body", "body": texto.encode("utf-8")})
+
+
+async def _responder_ndjson(send, eventos):
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson; charset=utf-8")]})
+    try:
+        async for evento in eventos:
+            linha = json.dumps(evento, ensure_ascii=False, default=str) + "\n"
+            await send({"type": "http.response.body", "body": linha.encode("utf-8"), "more_body": True})
+    except Exception as e:
+        # O status 200 já foi enviado: o erro vai como último evento do stream
+        linha = json.dumps({"erro": str(e)}, ensure_ascii=False) + "\n"
+        await send({"type": "http.response.body", "body": linha.encode("utf-8"), "more_body": True})
+    finally:
+        # Cliente desconectou ou terminou: encerra o gerador (cancela as chamadas pendentes)
+        await eventos.aclose()
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _lifespan(receive, send):
+    global recursos
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "lifespan.startup":
+            try:
+                if recursos is None:
+                    print("🧠 Carregando modelos e bancos (uma vez só)...")
+                    recursos = await asyncio.to_thread(Recursos)
+                print(f"✅ Serviço pronto em http://{HOST}:{PORTA}")
+                await send({"type": "lifespan.startup.complete"})
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+        elif mensagem["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    caminho, metodo = scope["path"], scope["method"]
+    if caminho == "/saude" and metodo == "GET":
+        await _responder_json(send, 200, {"status": "ok"})
+        return
+    if caminho == "/metricas" and metodo == "GET":
+        await _responder_texto(send, 200, METRICAS.texto_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        return
+    if caminho not in ROTAS_STREAMING and caminho != "/ingest":
+        await _responder_json(send, 404, {"erro": f"Rota não encontrada: {caminho}"})
+        return
+    if metodo != "POST":
+        await _responder_json(send, 405, {"erro": "Use POST"})
+        return
+
+    try:
+        dados = await _ler_json(receive)
+    except json.JSONDecodeError:
+        await _responder_json(send, 400, {"erro": "Corpo JSON inválido"})
+        return
+
+    if caminho == "/ingest":
+        try:
+            await _responder_json(send, 200, await ingerir(dados))
+        except Exception as e:
+            await _responder_json(send, 500, {"erro": str(e)})
+        return
+    await _responder_ndjson(send, ROTAS_STREAMING[caminho](dados))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=HOST, port=PORTA)
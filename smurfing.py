@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# --- DETECTOR DE SMURFING (Fracionamento de compras) ---
+# Seção 1.3 da política: é proibido dividir uma compra acima da alçada em notas menores.
+# Agrupa por funcionário + categoria, ordena por data uma única vez e usa somas acumuladas
+# com busca binária para avaliar a janela deslizante de cada nota, sem loops em Python.
+
+LIMITE_APROVACAO = 500.0   # Acima disso exige PO (Categoria A)
+JANELA_DIAS = 1            # Notas do mesmo dia; use 2+ para pegar notas em dias seguidos
+MINIMO_NOTAS = 2
+
+
+def _dias(datas):
+    # Datas -> dias desde 1970 (int64). A coluna date32 da carga tipada (transacoes.py) é
+    # convertida direto no Arrow; pd.to_datetime nela criaria um objeto date por linha.
+    if isinstance(datas.dtype, pd.ArrowDtype):
+        return pa.array(datas.array).cast(pa.int32()).to_numpy(zero_copy_only=False).astype(np.int64)
+    return pd.to_datetime(datas).to_numpy().astype("datetime64[D]").astype(np.int64)
+
+
+def detectar_smurfing(df, limite=LIMITE_APROVACAO, janela_dias=JANELA_DIAS, minimo_notas=MINIMO_NOTAS):
+    # Devolve um DataFrame alinhado a `df` com `cluster_smurfing` (-1 = fora de cluster),
+    # `soma_cluster` e `qtd_cluster`.
+    n = len(df)
+    resultado = pd.DataFrame(
+        {"cluster_smurfing": np.full(n, -1, dtype=np.int64), "soma_cluster": np.zeros(n), "qtd_cluster": np.zeros(n, dtype=np.int64)},
+        index=df.index,
+    )
+    if n == 0:
+        return resultado
+
+    grupo = df.groupby(["funcionario", "categoria"], sort=False, observed=True, dropna=False).ngroup().to_numpy(dtype=np.int64)
+    dia = _dias(df["data"])
+    dia = dia - dia.min()
+    # Arredondar aos centavos desfaz o ruído do float32 (82.84 -> 82.83999634) antes das somas
+    valor = np.round(df["valor"].to_numpy(dtype=np.float64), 2)
+    abaixo = valor <= limite
+
+    # Chave única (grupo, dia): a janela de uma nota nunca atravessa para outro grupo
+    chave = grupo * (int(dia.max()) + janela_dias + 1) + dia
+    ordem = np.argsort(chave, kind="stable")
+    chave_ord = chave[ordem]
+    valor_ord = np.where(abaixo[ordem], valor[ordem], 0.0)
+    conta_ord = abaixo[ordem].astype(np.int64)
+
+    soma_acum = np.concatenate(([0.0], np.cumsum(valor_ord)))
+    conta_acum = np.concatenate(([0], np.cumsum(conta_ord)))
+
+    # Janela que termina no dia da nota: [dia - janela + 1, dia], incluindo todas as notas do dia
+    inicio = np.searchsorted(chave_ord, chave_ord - (janela_dias - 1), side="left")
+    fim = np.searchsorted(chave_ord, chave_ord, side="right")
+    soma_janela = soma_acum[fim] - soma_acum[inicio]
+    qtd_janela = conta_acum[fim] - conta_acum[inicio]
+    suspeita = (soma_janela > limite) & (qtd_janela >= minimo_notas)
+
+    # Marca todas as notas cobertas por alguma janela suspeita (vetor de diferenças)
+    cobertura = np.bincount(inicio[suspeita], minlength=n + 1) - np.bincount(fim[suspeita], minlength=n + 1)
+    membro = (np.cumsum(cobertura)[:n] > 0) & (conta_ord == 1)
+    if not membro.any():
+        return resultado
+
+    # Clusters: sequências de membros no mesmo grupo com distância menor que a janela
+    grupo_ord = grupo[ordem]
+    dia_ord = dia[ordem]
+    continua = np.zeros(n, dtype=bool)
+    continua[1:] = membro[:-1] & (grupo_ord[1:] == grupo_ord[:-1]) & (dia_ord[1:] - dia_ord[:-1] < janela_dias)
+    novo = membro & ~continua
+    cluster_ord = np.where(membro, np.cumsum(novo) - 1, -1)
+
+    ids = cluster_ord[membro]
+    soma_cluster = np.bincount(ids, weights=valor_ord[membro])
+    qtd_cluster = np.bincount(ids)
+    # Só mantém clusters que, consolidados, realmente passam do limite
+    valido = (soma_cluster > limite) & (qtd_cluster >= minimo_notas)
+    cluster_ord = np.where(membro & valido[np.maximum(cluster_ord, 0)], cluster_ord, -1)
+
+    cluster = np.empty(n, dtype=np.int64)
+    cluster[ordem] = cluster_ord
+    no_cluster = cluster >= 0
+    resultado["cluster_smurfing"] = cluster
+    resultado.loc[no_cluster, "soma_cluster"] = soma_cluster[cluster[no_cluster]]
+    resultado.loc[no_cluster, "qtd_cluster"] = qtd_cluster[cluster[no_cluster]]
+    return resultado
+
+
+def descrever_clusters(df, limite=LIMITE_APROVACAO):
+    # Texto de cada cluster (para anexar ao prompt de fraude): {id_cluster: "..."}.
+    # `df` já traz `cluster_smurfing` (regras_compliance.triar_transacoes).
+    membros = df[df["cluster_smurfing"] >= 0]
+    textos = {}
+    for id_cluster, grupo in membros.groupby("cluster_smurfing"):
+        primeira = grupo.iloc[0]
+        linhas = "\n".join(
+            f"- {r['id_transacao']} | {r['data']} | {r['descricao']} | ${r['valor']:.2f}"
+            for _, r in grupo.sort_values("data").iterrows()
+        )
+        textos[id_cluster] = (
+            f"POSSÍVEL FRACIONAMENTO (Smurfing): {len(grupo)} notas de {primeira['funcionario']} "
+            f"em '{primeira['categoria']}' somando ${grupo['valor'].sum():.2f}, acima da alçada de ${limite:.2f}:\n"
+            f"{linhas}"
+        )
+    return textos
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auditoria_async import (  # noqa: E402
+    AuditoriaCancelada,
+    LimitadorTaxa,
+    Verificacao,
+    auditar_transacoes,
+    processar_em_paralelo,
+)
+from etapa03 import PROMPT_FRAUDE, PROMPT_REGRAS  # noqa: E402
+from llm_fake import ChatFalso  # noqa: E402
+
+
+def _transacoes(valores):
+    return pd.DataFrame({"id_transacao": [f"T{i}" for i in range(len(valores))], "valor": valores})
+
+
+def preparar(linha):
+    transacao = f"ID: {linha['id_transacao']} | Valor: ${linha['valor']:.2f}"
+    return (
+        Verificacao(PROMPT_REGRAS, {"transacao": transacao, "context": ""}),
+        Verificacao(PROMPT_FRAUDE, {"transacao": transacao, "context": ""}),
+    )
+
+
+def _auditar(df, llm, concorrencia=8, limitador=None, preparar=preparar):
+    async def rodar():
+        return [r async for r in auditar_transacoes(df, llm, preparar, concorrencia, limitador)]
+    return asyncio.run(rodar())
+
+
+class ChatLatenciaPorValor(ChatFalso):
+    # Quanto maior o valor, mais a resposta demora (ordem de conclusão previsível)
+    def _tempo_resposta(self, texto):
+        return float(texto.split("Valor: $")[1].split()[0]) / 1000
+
+
+class ChatContado(ChatFalso):
+    # Registra quantas chamadas estão em andamento ao mesmo tempo e quando cada uma começou
+    em_andamento: int = 0
+    maximo: int = 0
+    inicios: list = []
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.inicios.append(time.monotonic())
+        self.em_andamento += 1
+        self.maximo = max(self.maximo, self.em_andamento)
+        try:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        finally:
+            self.em_andamento -= 1
+
+
+class ChatComFalha(ChatFalso):
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if "Valor: $666.00" in str(messages[0].content):
+            raise RuntimeError("API fora do ar")
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+
+def test_resultados_saem_na_ordem_de_conclusao():
+    resultados = _auditar(_transacoes([300.0, 100.0, 200.0, 10.0]), ChatLatenciaPorValor())
+    assert [r.linha["id_transacao"] for r in resultados] == ["T3", "T1", "T2", "T0"]
+    assert all(r.erro is None for r in resultados)
+    assert "REPROVADO" not in resultados[0].regras
+
+
+def test_vereditos_do_modelo_falso():
+    resultado, = _auditar(_transacoes([900.0]), ChatFalso(latencia=0))
+    assert resultado.regras.startswith("STATUS: REPROVADO")
+    assert resultado.fraude.startswith("RISCO: BAIXO")
+
+
+def test_concorrencia_limita_as_chamadas_simultaneas():
+    llm = ChatContado(latencia=0.02, variacao=0.03, inicios=[])
+    resultados = _auditar(_transacoes([10.0] * 12), llm, concorrencia=3)
+    assert len(resultados) == 12
+    assert llm.maximo == 6   # 3 transações em paralelo, cada uma com regras e fraude juntas
+    assert llm.em_andamento == 0
+
+
+def test_limitador_segura_a_taxa_de_chamadas():
+    llm = ChatContado(latencia=0, inicios=[])
+    inicio = time.monotonic()
+    _auditar(_transacoes([10.0] * 10), llm, limitador=LimitadorTaxa(40, capacidade=1))
+    # 20 chamadas a 40/s com balde de 1 ficha: a primeira sai na hora, as outras 19 esperam
+    assert time.monotonic() - inicio >= 19 / 40 * 0.9
+    intervalos = [b - a for a, b in zip(llm.inicios, llm.inicios[1:])]
+    assert min(intervalos) >= 1 / 40 * 0.5
+
+
+def test_limitador_libera_a_capacidade_de_uma_vez():
+    async def rodar():
+        limitador = LimitadorTaxa(10, capacidade=5)
+        inicio = time.monotonic()
+        for _ in range(5):
+            await limitador.adquirir()
+        rajada = time.monotonic() - inicio
+        await limitador.adquirir()
+        return rajada, time.monotonic() - inicio
+
+    rajada, total = asyncio.run(rodar())
+    assert rajada < 0.05
+    assert total >= 0.09
+
+
+def test_transacao_com_erro_vira_resultado_e_as_outras_seguem():
+    resultados = _auditar(_transacoes([10.0, 666.0, 20.0, 30.0]), ChatComFalha(latencia=0.01, variacao=0.02),
+                          concorrencia=2)
+    por_id = {r.linha["id_transacao"]: r for r in resultados}
+    assert set(por_id) == {"T0", "T1", "T2", "T3"}
+    assert "API fora do ar" in por_id["T1"].erro
+    assert [i for i, r in por_id.items() if r.erro] == ["T1"]
+
+
+def test_cancelamento_interrompe_a_auditoria():
+    def preparar_cancelando(linha):
+        if linha["id_transacao"] == "T2":
+            raise AuditoriaCancelada()
+        return preparar(linha)
+
+    with pytest.raises(AuditoriaCancelada):
+        _auditar(_transacoes([10.0] * 6), ChatFalso(latencia=0.01), concorrencia=2, preparar=preparar_cancelando)
+
+
+def test_sem_ao_falhar_o_erro_propaga():
+    async def falhar(item):
+        if item == 2:
+            raise ValueError("boom")
+        return item
+
+    async def rodar():
+        return [r async for r in processar_em_paralelo(range(5), falhar, 2)]
+
+    with pytest.raises(ValueError):
+        asyncio.run(rodar())
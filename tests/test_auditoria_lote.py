@@ -0,0 +1,87 @@
+import asyncio
+import json
+import os
+import sys
+
+import pandas as pd
+from langchain_core.documents import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auditoria_lote import CHECAGEM_FRAUDE, CHECAGEM_REGRAS, auditar_em_lote, interpretar_lote  # noqa: E402
+from etapa03 import PROMPT_FRAUDE, PROMPT_REGRAS, descrever_transacao  # noqa: E402
+from llm_fake import ChatFalso  # noqa: E402
+
+IDS = {"T1", "T2", "T3"}
+
+
+def _linha(id_transacao, status="APROVADO", motivo="ok"):
+    return json.dumps({"id_transacao": id_transacao, "status": status, "motivo": motivo})
+
+
+def test_resposta_completa():
+    texto = "\n".join(_linha(i) for i in ("T1", "T2", "T3"))
+    assert interpretar_lote(texto, IDS, CHECAGEM_REGRAS) == {
+        i: "STATUS: APROVADO\nMOTIVO: ok" for i in ("T1", "T2", "T3")
+    }
+
+
+def test_linhas_invalidas_nao_derrubam_as_validas():
+    texto = "\n".join([
+        "Claro! Segue a análise:",
+        _linha("T1", status="REPROVADO", motivo="caro"),
+        _linha("T2", status="TALVEZ"),                                  # valor inválido
+        _linha("T9"),                                                   # ID fora do lote
+        json.dumps({"id_transacao": "T3", "status": "APROVADO"}),      # falta o motivo
+    ])
+    assert interpretar_lote(texto, IDS, CHECAGEM_REGRAS) == {"T1": "STATUS: REPROVADO\nMOTIVO: caro"}
+
+
+def test_resposta_parcial():
+    assert set(interpretar_lote(_linha("T2"), IDS, CHECAGEM_REGRAS)) == {"T2"}
+
+
+def test_id_repetido_fica_sem_veredito():
+    texto = "\n".join([_linha("T1"), _linha("T2"), _linha("T1", status="REPROVADO")])
+    assert set(interpretar_lote(texto, IDS, CHECAGEM_REGRAS)) == {"T2"}
+
+
+def test_bloco_de_codigo_e_ignorado():
+    texto = "```json\n" + json.dumps({"id_transacao": "T1", "risco": "alto", "evidencia": "e-mail 3"}) + "\n```"
+    assert interpretar_lote(texto, IDS, CHECAGEM_FRAUDE) == {"T1": "RISCO: ALTO\nEVIDÊNCIA: e-mail 3"}
+
+
+def test_lixo_total():
+    assert interpretar_lote("não consegui analisar", IDS, CHECAGEM_REGRAS) == {}
+
+
+class ChatLoteParcial(ChatFalso):
+    # Responde o lote, mas perde a última transação; conta as chamadas unitárias
+    unitarias: int = 0
+
+    def _responder(self, texto):
+        resposta = super()._responder(texto)
+        if "uma linha JSON por transação" in texto:
+            return "\n".join(resposta.splitlines()[:-1])
+        self.unitarias += 1
+        return resposta
+
+
+def test_so_quem_ficou_sem_veredito_vai_para_o_fallback():
+    df = pd.DataFrame({
+        "id_transacao": ["T1", "T2", "T3"], "data": ["2008-04-01"] * 3, "funcionario": ["Kevin"] * 3,
+        "cargo": ["Contador"] * 3, "descricao": ["Café"] * 3, "valor": [10.0, 900.0, 20.0],
+        "categoria": ["Copa"] * 3,
+    })
+    llm = ChatLoteParcial(latencia=0)
+
+    def contexto(chave, linhas):
+        return [Document(page_content="Limite de $500", id="regra")]
+
+    async def rodar():
+        return [r async for r in auditar_em_lote(df, llm, PROMPT_REGRAS, PROMPT_FRAUDE, descrever_transacao,
+                                                 contexto, contexto)]
+
+    resultados = {r.linha["id_transacao"]: r for r in asyncio.run(rodar())}
+    assert set(resultados) == {"T1", "T2", "T3"}
+    assert "REPROVADO" in resultados["T2"].regras
+    assert llm.unitarias == 2   # Só T3, uma vez em cada checagem
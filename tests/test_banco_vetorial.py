@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from banco_vetorial import BancoNumpy  # noqa: E402
+
+
+class EmbeddingsFixos(Embeddings):
+    # Vetor determinístico por texto, sem modelo
+    def embed_documents(self, texts):
+        return [np.random.default_rng(sum(t.encode("utf-8"))).random(8).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _linhas_f32(diretorio, banco):
+    return os.path.getsize(os.path.join(diretorio, f"vetores-{banco.geracao}.f32")) // (banco.dimensao * 4)
+
+
+def test_leitor_relendo_no_meio_da_escrita_nao_corta_o_escritor(tmp_path):
+    diretorio = str(tmp_path / "banco")
+    escritor = BancoNumpy(diretorio, EmbeddingsFixos())
+    escritor.add_texts(["um"], ids=["1"])
+    leitor = BancoNumpy(diretorio, EmbeddingsFixos())
+    escritor.add_texts(["dois"], ids=["2"])   # O leitor fica desatualizado e vai reler
+
+    # O leitor relê entre a gravação do vetor e a do registro (ex: /ask durante o /ingest)
+    anexar = escritor._anexar_registros
+
+    def anexar_com_leitura(registros):
+        leitor._atualizar()
+        leitor.similarity_search("um", k=1)
+        anexar(registros)
+
+    escritor._anexar_registros = anexar_com_leitura
+    escritor.add_texts(["três"], ids=["3"])
+    escritor._anexar_registros = anexar
+
+    assert _linhas_f32(diretorio, escritor) == 3
+    assert escritor.get()["ids"] == ["1", "2", "3"]
+    assert leitor.get()["ids"] == ["1", "2", "3"]
+    assert BancoNumpy(diretorio, EmbeddingsFixos()).get()["ids"] == ["1", "2", "3"]
+    assert leitor.similarity_search("três", k=1)[0].id == "3"
+
+
+def test_sobra_de_queda_so_e_consertada_pelo_escritor(tmp_path):
+    diretorio = str(tmp_path / "banco")
+    escritor = BancoNumpy(diretorio, EmbeddingsFixos())
+    escritor.add_texts(["um", "dois"], ids=["1", "2"])
+    # Queda depois do vetor e no meio do registro
+    with open(os.path.join(diretorio, f"vetores-{escritor.geracao}.f32"), "ab") as f:
+        np.zeros(8, dtype=np.float32).tofile(f)
+    with open(os.path.join(diretorio, f"registros-{escritor.geracao}.jsonl"), "ab") as f:
+        f.write(b'{"id": "3", "tex')
+
+    leitor = BancoNumpy(diretorio, EmbeddingsFixos())
+    assert leitor.get()["ids"] == ["1", "2"]
+    assert _linhas_f32(diretorio, leitor) == 3   # Leitor não mexe nos arquivos
+
+    BancoNumpy(diretorio, EmbeddingsFixos()).add_texts(["quatro"], ids=["4"])
+    assert leitor.get()["ids"] == ["1", "2", "4"]
+    assert BancoNumpy(diretorio, EmbeddingsFixos()).similarity_search("quatro", k=1)[0].id == "4"
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_fake import ChatFalso, ServidorFalso  # noqa: E402
+from llm_resiliente import ChatResiliente, LLMIndisponivel, criar_llm  # noqa: E402
+
+PERGUNTA = "Responda com STATUS:. ID: TX_1 | Valor: $900.00"
+
+
+class ErroApi(Exception):
+    # Como os erros do SDK da Groq: status_code e a resposta HTTP com os cabeçalhos
+    def __init__(self, status, cabecalhos=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(headers=cabecalhos or {})
+
+
+class ChatRoteiro(ChatFalso):
+    # Cada chamada consome o próximo item do roteiro: um erro é levantado, None responde.
+    # Roteiro vazio responde sempre. `chamadas` conta as requisições que chegaram ao "servidor".
+    roteiro: list = []
+    chamadas: int = 0
+    horarios: list = []
+
+    def _proximo(self):
+        self.chamadas += 1
+        self.horarios.append(time.monotonic())
+        erro = self.roteiro.pop(0) if self.roteiro else None
+        if erro is not None:
+            raise erro
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._proximo()
+        return super()._generate(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._proximo()
+        return await super()._agenerate(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._proximo()
+        yield from super()._stream(messages, stop, run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._proximo()
+        async for pedaco in super()._astream(messages, stop, run_manager, **kwargs):
+            yield pedaco
+
+
+def _resiliente(*modelos, **opcoes):
+    return ChatResiliente(modelos=list(modelos), **{"espera_base": 0.001, **opcoes})
+
+
+def test_429_respeita_o_retry_after_sem_abrir_o_disjuntor():
+    modelo = ChatRoteiro(model_name="principal", latencia=0, horarios=[], roteiro=[
+        ErroApi(429, {"retry-after": "0.3"}), ErroApi(429, {"retry-after": "0.3"}),
+    ])
+    llm = _resiliente(modelo, falhas_para_abrir=1)
+
+    assert llm.invoke(PERGUNTA).content.startswith("STATUS: REPROVADO")
+    assert modelo.chamadas == 3
+    intervalos = [b - a for a, b in zip(modelo.horarios, modelo.horarios[1:])]
+    assert min(intervalos) >= 0.3
+    assert llm.estado() == {"principal": "fechado"}
+
+
+def test_disjuntor_abre_apos_falhas_5xx_e_fica_meio_aberto():
+    modelo = ChatRoteiro(model_name="principal", latencia=0, horarios=[], roteiro=[ErroApi(500)] * 3)
+    llm = _resiliente(modelo, falhas_para_abrir=3, max_tentativas=5, tempo_aberto=0.2)
+
+    with pytest.raises(LLMIndisponivel):
+        llm.invoke(PERGUNTA)
+    assert modelo.chamadas == 3
+    assert llm.estado() == {"principal": "aberto"}
+
+    # Aberto: nem chega ao modelo
+    with pytest.raises(LLMIndisponivel):
+        llm.invoke(PERGUNTA)
+    assert modelo.chamadas == 3
+
+    time.sleep(0.25)
+    assert llm.estado() == {"principal": "meio-aberto"}
+    # A chamada de teste falha: volta a abrir sem esperar outras 3 falhas
+    modelo.roteiro = [ErroApi(503)]
+    with pytest.raises(LLMIndisponivel):
+        llm.invoke(PERGUNTA)
+    assert modelo.chamadas == 4
+    assert llm.estado() == {"principal": "aberto"}
+
+    time.sleep(0.25)
+    assert llm.invoke(PERGUNTA).content.startswith("STATUS:")
+    assert llm.estado() == {"principal": "fechado"}
+
+
+def test_503_vai_para_o_modelo_reserva():
+    principal = ChatRoteiro(model_name="principal", latencia=0, horarios=[], roteiro=[ErroApi(503)] * 10)
+    reserva = ChatRoteiro(model_name="reserva", latencia=0, horarios=[])
+    llm = _resiliente(principal, reserva, max_tentativas=2)
+
+    assert asyncio.run(llm.ainvoke(PERGUNTA)).content.startswith("STATUS: REPROVADO")
+    assert (principal.chamadas, reserva.chamadas) == (2, 1)
+    assert llm.model_name == "principal"   # As chaves dos caches continuam as do principal
+
+
+def test_503_do_servidor_falso_vai_para_o_modelo_reserva(monkeypatch):
+    pytest.importorskip("langchain_groq")
+    monkeypatch.setenv("GROQ_API_KEY", "falsa")
+    servidor = ServidorFalso(latencia=0, modelos_fora=["principal"])
+    url = servidor.iniciar()
+    try:
+        llm = criar_llm(modelo="principal", reserva="reserva", base_url=url)
+        llm.espera_base = 0.001
+        assert llm.invoke(PERGUNTA).content.startswith("STATUS: REPROVADO")
+    finally:
+        servidor.parar()
+    assert servidor.respostas[("principal", 503)] == llm.max_tentativas
+    assert servidor.respostas[("reserva", 200)] == 1
+
+
+def _em_threads(funcao, n=2):
+    resultados = [None] * n
+
+    def rodar(i):
+        resultados[i] = funcao()
+
+    threads = [threading.Thread(target=rodar, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultados
+
+
+def test_invoke_identicos_em_andamento_viram_uma_chamada():
+    modelo = ChatRoteiro(latencia=0.2, horarios=[])
+    llm = _resiliente(modelo)
+    respostas = _em_threads(lambda: llm.invoke(PERGUNTA).content)
+    assert modelo.chamadas == 1
+    assert respostas[0] == respostas[1]
+    # Terminada a primeira, uma nova chamada idêntica vai de novo à API
+    llm.invoke(PERGUNTA)
+    assert modelo.chamadas == 2
+
+
+def test_ainvoke_identicos_em_andamento_viram_uma_chamada():
+    modelo = ChatRoteiro(latencia=0.2, horarios=[])
+    llm = _resiliente(modelo)
+
+    async def rodar():
+        return await asyncio.gather(llm.ainvoke(PERGUNTA), llm.ainvoke(PERGUNTA), llm.ainvoke("outra pergunta"))
+
+    primeira, segunda, outra = asyncio.run(rodar())
+    assert modelo.chamadas == 2
+    assert primeira.content == segunda.content
+    assert segunda.usage_metadata is None   # Os tokens só contam na chamada original
+
+
+def test_stream_identicos_em_andamento_viram_uma_chamada():
+    modelo = ChatRoteiro(latencia=0.1, latencia_token=0.02, horarios=[])
+    llm = _resiliente(modelo)
+    textos = _em_threads(lambda: "".join(p.content for p in llm.stream(PERGUNTA)))
+    assert modelo.chamadas == 1
+    assert textos[0] == textos[1] == modelo._responder(PERGUNTA)
+
+
+def test_astream_identicos_em_andamento_viram_uma_chamada():
+    modelo = ChatRoteiro(latencia=0.1, latencia_token=0.02, horarios=[])
+    llm = _resiliente(modelo)
+
+    async def ler():
+        return "".join([p.content async for p in llm.astream(PERGUNTA)])
+
+    async def rodar():
+        return await asyncio.gather(ler(), ler())
+
+    assert asyncio.run(rodar()) == [modelo._responder(PERGUNTA)] * 2
+    assert modelo.chamadas == 1
+
+
+def test_quem_espera_recebe_llm_indisponivel_se_o_primeiro_for_cancelado():
+    modelo = ChatRoteiro(latencia=0.5, horarios=[])
+    llm = _resiliente(modelo)
+
+    async def rodar():
+        primeiro = asyncio.create_task(llm.ainvoke(PERGUNTA))
+        await asyncio.sleep(0.05)
+        carona = asyncio.create_task(llm.ainvoke(PERGUNTA))
+        await asyncio.sleep(0.05)
+        primeiro.cancel()
+        with pytest.raises(LLMIndisponivel):
+            await carona
+        with pytest.raises(asyncio.CancelledError):
+            await primeiro
+
+    asyncio.run(rodar())
+    assert modelo.chamadas == 1
@@ -0,0 +1,101 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+from regras_compliance import (  # noqa: E402
+    SITUACAO_CONFORME,
+    SITUACAO_VIOLACAO,
+    carregar_regras,
+    limite_alcada,
+    triar_transacoes,
+)
+
+REGRAS = carregar_regras(os.path.join(RAIZ, "politica_compliance.txt"))
+
+
+def test_alcadas_e_tetos_da_politica():
+    tabela = REGRAS[REGRAS["tipo"] != "proibicao"][["secao", "tipo", "categoria", "minimo", "maximo"]]
+    assert tabela.values.tolist() == [
+        ["1.1", "alcada", "C", 0.0, 50.0],
+        ["1.2", "alcada", "B", 50.01, 500.0],
+        ["1.3", "alcada", "A", 500.0, np.inf],
+        ["2", "teto_categoria", "Outros", 0.0, 5.0],
+        ["2", "teto_categoria", "Diversos", 0.0, 5.0],
+        ["2.3", "teto_categoria", "TI", 0.0, 100.0],
+    ]
+    assert limite_alcada(REGRAS) == 500.0
+
+
+def test_termos_proibidos_da_politica():
+    proibidos = REGRAS[REGRAS["tipo"] == "proibicao"]
+    assert proibidos.groupby("secao")["termo"].apply(list).to_dict() == {
+        "2.1": ["hooter"],
+        "2.2": ["frigobar", "pay-per-view", "spa", "conversivei", "chrysler", "sebring"],
+        "3.1": ["magica", "algema", "escape", "corrente", "fumaca", "pombo", "baralho", "stripper"],
+        "3.2": ["armas", "airsoft", "espada", "katana", "estrela", "ninja", "nunchaku", "spray", "pimenta",
+                "camuflagem"],
+        "3.3": ["startup", "wuphf", "infinity", "velas", "agroturismo", "beterraba"],
+    }
+
+
+def _triar(linhas, regras=REGRAS):
+    df = pd.DataFrame(linhas, columns=["id_transacao", "data", "funcionario", "categoria", "descricao", "valor"])
+    df["data"] = pd.to_datetime(df["data"])
+    # Estatísticas de um arquivo grande em que todas as descrições/categorias são comuns
+    estatisticas = {
+        "freq_descricao": {d: 100 for d in df["descricao"]},
+        "freq_categoria": {c: 100 for c in df["categoria"]},
+        "media_categoria": {c: 100.0 for c in df["categoria"]},
+        "desvio_categoria": {c: 1000.0 for c in df["categoria"]},
+    }
+    return triar_transacoes(df, regras, estatisticas).set_index(df["id_transacao"])
+
+
+def test_triagem():
+    triagem = _triar([
+        ("limpa", "2008-04-01", "Pam Beesly", "Copa", "Café", 25.50),
+        ("teto", "2008-04-01", "Creed Bratton", "Outros", "Lanche", 20.00),
+        ("alcada", "2008-04-01", "Michael Scott", "Eventos", "Festa", 750.00),
+        ("proibido", "2008-04-01", "Dwight Schrute", "Segurança", "Algemas de pelúcia", 30.00),
+        ("parte1", "2008-04-02", "Kevin Malone", "Copa", "Doces", 300.00),
+        ("parte2", "2008-04-02", "Kevin Malone", "Copa", "Doces", 250.00),
+    ])
+
+    assert triagem.loc["limpa", "situacao"] == SITUACAO_CONFORME
+    assert triagem.loc["limpa", "motivos"] == ""
+    assert (triagem.drop("limpa")["situacao"] == SITUACAO_VIOLACAO).all()
+    assert "'Outros' não é aceita" in triagem.loc["teto", "motivos"]
+    assert triagem.loc["alcada", "motivos"].startswith("Acima de US$ 500.00")
+    assert triagem.loc["proibido", "motivos"] == "Item proibido: algema"
+
+    # Fracionamento: 300 + 250 no mesmo dia passam da alçada; as duas notas formam um cluster
+    assert "fracionamento" in triagem.loc["parte1", "motivos"]
+    assert triagem.loc["parte1", "cluster_smurfing"] == triagem.loc["parte2", "cluster_smurfing"] >= 0
+    assert triagem.loc["parte1", "soma_cluster"] == 550.0
+    assert (triagem.drop(["parte1", "parte2"])["cluster_smurfing"] == -1).all()
+
+
+def test_fracionamento_usa_a_alcada_da_politica():
+    regras = REGRAS.copy()
+    regras.loc[regras["secao"] == "1.3", "minimo"] = 1000.0
+    triagem = _triar([
+        ("parte1", "2008-04-02", "Kevin Malone", "Copa", "Doces", 300.00),
+        ("parte2", "2008-04-02", "Kevin Malone", "Copa", "Doces", 250.00),
+    ], regras)
+    assert (triagem["situacao"] == SITUACAO_CONFORME).all()
+    assert (triagem["cluster_smurfing"] == -1).all()
+
+
+def test_politica_sem_alcadas_nao_marca_fracionamento():
+    regras = REGRAS[REGRAS["tipo"] != "alcada"]
+    assert limite_alcada(regras) is None
+    triagem = _triar([
+        ("parte1", "2008-04-02", "Kevin Malone", "Copa", "Doces", 300.00),
+        ("parte2", "2008-04-02", "Kevin Malone", "Copa", "Doces", 250.00),
+    ], regras)
+    assert (triagem["cluster_smurfing"] == -1).all()
+    assert (triagem["situacao"] == SITUACAO_CONFORME).all()
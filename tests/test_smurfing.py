@@ -0,0 +1,91 @@
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from smurfing import descrever_clusters, detectar_smurfing  # noqa: E402
+
+
+def _notas(*linhas):
+    # (funcionario, categoria, data, valor)
+    df = pd.DataFrame(linhas, columns=["funcionario", "categoria", "data", "valor"])
+    df.insert(0, "id_transacao", [f"T{i}" for i in range(len(df))])
+    df["descricao"] = "Nota"
+    df["data"] = pd.to_datetime(df["data"])
+    return df
+
+
+def _clusters(df, **opcoes):
+    return detectar_smurfing(df, limite=500.0, **opcoes)["cluster_smurfing"].tolist()
+
+
+def test_notas_do_mesmo_dia_formam_cluster():
+    df = _notas(("Kevin", "Copa", "2008-04-02", 300.0), ("Kevin", "Copa", "2008-04-02", 250.0))
+    resultado = detectar_smurfing(df, limite=500.0)
+    assert resultado["cluster_smurfing"].tolist() == [0, 0]
+    assert resultado["soma_cluster"].tolist() == [550.0, 550.0]
+    assert resultado["qtd_cluster"].tolist() == [2, 2]
+
+
+def test_dia_seguinte_so_entra_com_janela_maior():
+    df = _notas(("Kevin", "Copa", "2008-04-02", 300.0), ("Kevin", "Copa", "2008-04-03", 250.0))
+    assert _clusters(df, janela_dias=1) == [-1, -1]
+    assert _clusters(df, janela_dias=2) == [0, 0]
+
+
+def test_soma_no_limite_nao_e_fracionamento():
+    # A política proíbe passar de US$ 500,00; somar exatamente 500 é permitido
+    df = _notas(("Kevin", "Copa", "2008-04-02", 300.0), ("Kevin", "Copa", "2008-04-02", 200.0))
+    assert _clusters(df) == [-1, -1]
+
+
+def test_cluster_nao_atravessa_funcionario_nem_categoria():
+    df = _notas(
+        ("Kevin", "Copa", "2008-04-02", 300.0),
+        ("Oscar", "Copa", "2008-04-02", 300.0),
+        ("Kevin", "Eventos", "2008-04-02", 300.0),
+    )
+    assert _clusters(df) == [-1, -1, -1]
+
+
+def test_clusters_separados_por_funcionario():
+    df = _notas(
+        ("Kevin", "Copa", "2008-04-02", 300.0),
+        ("Oscar", "Copa", "2008-04-02", 400.0),
+        ("Kevin", "Copa", "2008-04-02", 250.0),
+        ("Oscar", "Copa", "2008-04-02", 150.0),
+    )
+    clusters = _clusters(df)
+    assert clusters[0] == clusters[2] >= 0
+    assert clusters[1] == clusters[3] >= 0
+    assert clusters[0] != clusters[1]
+
+
+def test_nota_acima_da_alcada_nao_entra_no_cluster():
+    # A nota grande já é violação de alçada sozinha; não conta como fração
+    df = _notas(("Kevin", "Copa", "2008-04-02", 300.0), ("Kevin", "Copa", "2008-04-02", 900.0))
+    assert _clusters(df) == [-1, -1]
+
+
+def test_minimo_de_notas():
+    df = _notas(("Kevin", "Copa", "2008-04-02", 300.0), ("Kevin", "Copa", "2008-04-02", 250.0))
+    assert _clusters(df, minimo_notas=3) == [-1, -1]
+    df = _notas(*[("Kevin", "Copa", "2008-04-02", 200.0)] * 3)
+    assert _clusters(df, minimo_notas=3) == [0, 0, 0]
+
+
+def test_datas_da_carga_tipada():
+    # date32 do Arrow (transacoes.py) dá o mesmo resultado que datetime64
+    df = _notas(("Kevin", "Copa", "2008-04-02", 300.0), ("Kevin", "Copa", "2008-04-03", 250.0))
+    tipada = df.assign(data=pd.array(df["data"].dt.date, dtype=pd.ArrowDtype(pa.date32())))
+    assert _clusters(tipada, janela_dias=2) == _clusters(df, janela_dias=2) == [0, 0]
+
+
+def test_descricao_do_cluster():
+    df = _notas(("Kevin", "Copa", "2008-04-02", 300.0), ("Kevin", "Copa", "2008-04-02", 250.0))
+    textos = descrever_clusters(df.join(detectar_smurfing(df, limite=500.0)), limite=500.0)
+    assert list(textos) == [0]
+    assert textos[0].startswith("POSSÍVEL FRACIONAMENTO (Smurfing): 2 notas de Kevin em 'Copa' somando $550.00")
+    assert "- T0 |" in textos[0] and "- T1 |" in textos[0]
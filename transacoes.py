@@ -0,0 +1,241 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# --- CARGA TIPADA DAS TRANSAÇÕES (cache colunar em Parquet) ---
+# Na primeira leitura o CSV é convertido, em streaming, para um dataset Parquet particionado
+# por mês (mes=AAAAMM/). Dentro de cada partição as linhas ficam ordenadas por funcionário,
+# então as estatísticas min/máx de cada grupo de linhas deixam a leitura pular quem não
+# interessa. Filtros por funcionário, categoria e período são empurrados para o leitor:
+# só as partições e grupos de linhas necessários saem do disco.
+#   funcionario, cargo, descricao, categoria, departamento -> category (strings repetidas)
+#   valor -> float32 · data -> date32 (datetime.date) · id_transacao -> string[pyarrow]
+# Na conversão também são gravados os agregados (contagem e soma por mês, funcionário e
+# categoria; frequência de cada descrição): os KPIs do painel e as estatísticas da triagem
+# saem deles, sem varrer o arquivo. O cache é refeito quando o CSV muda (tamanho/mtime).
+
+ARQUIVO_CSV = "transacoes_bancarias.csv"
+VERSAO_CACHE = 1
+COLUNAS_CATEGORICAS = ("funcionario", "cargo", "descricao", "categoria", "departamento")
+TAMANHO_BLOCO_CSV = 16 * 1024 * 1024   # bytes lidos do CSV por vez na conversão
+LINHAS_POR_GRUPO = 64 * 1024           # grupo de linhas do Parquet (unidade que o filtro pula)
+LINHAS_BUFFER_PARTICAO = 4096          # linhas juntadas por mês antes de ir ao disco na conversão
+
+TIPOS_CSV = {
+    "id_transacao": pa.string(),
+    "data": pa.date32(),
+    "valor": pa.float64(),   # float64 até os agregados serem calculados; gravado como float32
+    **{coluna: pa.dictionary(pa.int32(), pa.string()) for coluna in COLUNAS_CATEGORICAS},
+}
+TIPOS_PANDAS = {pa.string(): pd.StringDtype("pyarrow"), pa.date32(): pd.ArrowDtype(pa.date32())}
+
+
+def diretorio_cache(caminho=ARQUIVO_CSV):
+    # transacoes_bancarias.csv -> transacoes_bancarias_parquet/
+    return os.path.splitext(caminho)[0] + "_parquet"
+
+
+def _assinatura(caminho):
+    info = os.stat(caminho)
+    return {"versao": VERSAO_CACHE, "tamanho": info.st_size, "mtime_ns": info.st_mtime_ns}
+
+
+def _cache_valido(caminho, diretorio):
+    try:
+        with open(os.path.join(diretorio, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f) == _assinatura(caminho)
+    except (OSError, json.JSONDecodeError):
+        return False
+
+
+# --- CONVERSÃO ---
+def _lotes_csv(caminho):
+    # Lotes do CSV já tipados, com o número da linha original (_linha) e a partição (mes)
+    leitor = pacsv.open_csv(
+        caminho,
+        read_options=pacsv.ReadOptions(block_size=TAMANHO_BLOCO_CSV),
+        convert_options=pacsv.ConvertOptions(column_types=TIPOS_CSV),
+    )
+    esquema = leitor.schema.append(pa.field("_linha", pa.int64())).append(pa.field("mes", pa.int32()))
+
+    def lotes():
+        inicio = 0
+        for lote in leitor:
+            linhas = pa.array(np.arange(inicio, inicio + lote.num_rows, dtype=np.int64))
+            mes = pc.add(pc.multiply(pc.year(lote["data"]), 100), pc.month(lote["data"])).cast(pa.int32())
+            inicio += lote.num_rows
+            yield pa.RecordBatch.from_arrays(lote.columns + [linhas, mes], schema=esquema)
+
+    return esquema, lotes()
+
+
+def _ordenar_particao(arquivos, destino, mes):
+    # Uma partição (um mês) por vez na memória: ordena por funcionário, calcula os agregados
+    # com o valor ainda em float64 e regrava com valor em float32. Cada lote do CSV trouxe o
+    # próprio dicionário de strings, então eles são unificados antes de reordenar.
+    tabela = pa.concat_tables([pq.read_table(a) for a in arquivos]).unify_dictionaries().combine_chunks()
+    chaves = pa.table({"funcionario": tabela["funcionario"].cast(pa.string()), "_linha": tabela["_linha"]})
+    tabela = tabela.take(pc.sort_indices(chaves, sort_keys=[("funcionario", "ascending"), ("_linha", "ascending")]))
+
+    valor = tabela["valor"]
+    agregados = (
+        pa.table({
+            "funcionario": tabela["funcionario"], "categoria": tabela["categoria"],
+            "valor": valor, "quadrado": pc.multiply(valor, valor),
+        })
+        .group_by(["funcionario", "categoria"])
+        .aggregate([("valor", "count"), ("valor", "sum"), ("quadrado", "sum")])
+        .to_pandas()
+        .rename(columns={"valor_count": "transacoes", "valor_sum": "volume", "quadrado_sum": "volume_quadrados"})
+        .assign(mes=mes)
+    )
+    descricoes = tabela.group_by("descricao").aggregate([("_linha", "count")]).to_pandas()
+
+    tabela = tabela.set_column(tabela.schema.get_field_index("valor"), "valor", valor.cast(pa.float32()))
+    os.makedirs(destino)
+    pq.write_table(tabela, os.path.join(destino, "parte-0.parquet"), row_group_size=LINHAS_POR_GRUPO)
+    return agregados, descricoes
+
+
+def converter_csv(caminho=ARQUIVO_CSV, diretorio=None):
+    # CSV -> dataset Parquet particionado + agregados. Monta tudo numa pasta temporária e
+    # troca de uma vez: quem estiver lendo o cache antigo não vê um meio-termo.
+    diretorio = diretorio or diretorio_cache(caminho)
+    temporario = f"{diretorio}.tmp-{os.getpid()}"
+    shutil.rmtree(temporario, ignore_errors=True)
+
+    # 1. Streaming: CSV -> partições por mês. Cada bloco do CSV se espalha por vários meses;
+    # sem o buffer, cada pedacinho viraria um grupo de linhas (lento de gravar e de reler).
+    esquema, lotes = _lotes_csv(caminho)
+    bruto = os.path.join(temporario, "bruto")
+    ds.write_dataset(
+        lotes, bruto, schema=esquema, format="parquet",
+        partitioning=ds.partitioning(pa.schema([("mes", pa.int32())]), flavor="hive"),
+        min_rows_per_group=LINHAS_BUFFER_PARTICAO, max_rows_per_group=LINHAS_POR_GRUPO,
+    )
+
+    # 2. Cada partição é ordenada por funcionário e resumida
+    agregados, descricoes = [], []
+    os.makedirs(os.path.join(temporario, "dados"))
+    for pasta in sorted(os.listdir(bruto) if os.path.isdir(bruto) else []):
+        arquivos = [os.path.join(bruto, pasta, a) for a in sorted(os.listdir(os.path.join(bruto, pasta)))]
+        mes = int(pasta.split("=", 1)[1])
+        resumo, frequencias = _ordenar_particao(arquivos, os.path.join(temporario, "dados", pasta), mes)
+        agregados.append(resumo)
+        descricoes.append(frequencias)
+        shutil.rmtree(os.path.join(bruto, pasta))
+    shutil.rmtree(bruto, ignore_errors=True)
+
+    colunas_agregados = ["mes", "funcionario", "categoria", "transacoes", "volume", "volume_quadrados"]
+    agregados = pd.concat(agregados, ignore_index=True) if agregados else pd.DataFrame(columns=colunas_agregados)
+    agregados[colunas_agregados].astype({"funcionario": str, "categoria": str}).to_parquet(
+        os.path.join(temporario, "agregados.parquet"), index=False
+    )
+    descricoes = (
+        pd.concat(descricoes, ignore_index=True).astype({"descricao": str})
+        .groupby("descricao", as_index=False)["_linha_count"].sum()
+        .rename(columns={"_linha_count": "transacoes"})
+        if descricoes else pd.DataFrame({"descricao": [], "transacoes": []})
+    )
+    descricoes.to_parquet(os.path.join(temporario, "descricoes.parquet"), index=False)
+
+    # meta.json por último: sem ele o cache é considerado inválido
+    with open(os.path.join(temporario, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(_assinatura(caminho), f)
+
+    antigo = f"{diretorio}.antigo-{os.getpid()}"
+    if os.path.exists(diretorio):
+        os.replace(diretorio, antigo)
+    os.replace(temporario, diretorio)
+    shutil.rmtree(antigo, ignore_errors=True)
+    return diretorio
+
+
+def atualizar_cache(caminho=ARQUIVO_CSV):
+    diretorio = diretorio_cache(caminho)
+    if not _cache_valido(caminho, diretorio):
+        print(f"🗜️  Convertendo '{caminho}' para Parquet tipado (só quando o CSV muda)...")
+        converter_csv(caminho, diretorio)
+    return diretorio
+
+
+# --- LEITURA ---
+def _filtro(funcionarios=None, categorias=None, data_inicio=None, data_fim=None):
+    # Expressão do pyarrow: `mes` poda partições; as demais usam as estatísticas dos grupos
+    condicoes = []
+    if funcionarios is not None:
+        condicoes.append(ds.field("funcionario").isin(list(funcionarios)))
+    if categorias is not None:
+        condicoes.append(ds.field("categoria").isin(list(categorias)))
+    if data_inicio is not None:
+        inicio = pd.Timestamp(data_inicio)
+        condicoes.append(ds.field("mes") >= inicio.year * 100 + inicio.month)
+        condicoes.append(ds.field("data") >= pa.scalar(inicio.date(), pa.date32()))
+    if data_fim is not None:
+        fim = pd.Timestamp(data_fim)
+        condicoes.append(ds.field("mes") <= fim.year * 100 + fim.month)
+        condicoes.append(ds.field("data") <= pa.scalar(fim.date(), pa.date32()))
+    filtro = None
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+    return filtro
+
+
+def carregar_transacoes(caminho=ARQUIVO_CSV, funcionarios=None, categorias=None, data_inicio=None, data_fim=None,
+                        colunas=None):
+    # DataFrame tipado, na ordem e com o índice (número da linha) do CSV original.
+    # `data_inicio`/`data_fim` são inclusivos ("2008-04-01"); `colunas` limita o que é lido.
+    diretorio = atualizar_cache(caminho)
+    dataset = ds.dataset(os.path.join(diretorio, "dados"), format="parquet", partitioning="hive")
+    leitura = None if colunas is None else list(dict.fromkeys([*colunas, "_linha"]))
+    tabela = dataset.to_table(columns=leitura, filter=_filtro(funcionarios, categorias, data_inicio, data_fim))
+    df = tabela.to_pandas(types_mapper=TIPOS_PANDAS.get)
+    df = df.sort_values("_linha").set_index("_linha").rename_axis(None)
+    return df.drop(columns=["mes"], errors="ignore")
+
+
+def _agregados(caminho, funcionarios=None, categorias=None, data_inicio=None, data_fim=None):
+    agregados = pd.read_parquet(os.path.join(atualizar_cache(caminho), "agregados.parquet"))
+    if funcionarios is not None:
+        agregados = agregados[agregados["funcionario"].isin(list(funcionarios))]
+    if categorias is not None:
+        agregados = agregados[agregados["categoria"].isin(list(categorias))]
+    if data_inicio is not None:
+        inicio = pd.Timestamp(data_inicio)
+        agregados = agregados[agregados["mes"] >= inicio.year * 100 + inicio.month]
+    if data_fim is not None:
+        fim = pd.Timestamp(data_fim)
+        agregados = agregados[agregados["mes"] <= fim.year * 100 + fim.month]
+    return agregados
+
+
+def kpis(caminho=ARQUIVO_CSV, funcionarios=None, categorias=None, data_inicio=None, data_fim=None):
+    # {"transacoes", "volume"} dos agregados (granularidade de mês: datas no meio do mês
+    # contam o mês inteiro)
+    agregados = _agregados(caminho, funcionarios, categorias, data_inicio, data_fim)
+    return {"transacoes": int(agregados["transacoes"].sum()), "volume": float(agregados["volume"].sum())}
+
+
+def estatisticas_triagem(caminho=ARQUIVO_CSV):
+    # Estatísticas do arquivo inteiro que a triagem usa para "fora do padrão": com elas,
+    # regras_compliance.triar_transacoes dá o mesmo resultado numa fatia (ex: um funcionário)
+    # que no arquivo todo. Desvio amostral (ddof=1), como o pandas.
+    por_categoria = _agregados(caminho).groupby("categoria")[["transacoes", "volume", "volume_quadrados"]].sum()
+    n = por_categoria["transacoes"]
+    media = por_categoria["volume"] / n
+    variancia = ((por_categoria["volume_quadrados"] - n * media ** 2) / (n - 1)).clip(lower=0)
+    descricoes = pd.read_parquet(os.path.join(atualizar_cache(caminho), "descricoes.parquet"))
+    return {
+        "freq_descricao": descricoes.set_index("descricao")["transacoes"],
+        "freq_categoria": n,
+        "media_categoria": media,
+        "desvio_categoria": np.sqrt(variancia).where(n > 1),
+    }